@@ -0,0 +1,110 @@
+"""
+BK 树（Burkhard-Keller tree）编辑距离索引
+
+用于任务关键词的错别字 / 同音字容错匹配：
+- 在书库加载时构建，插入 N 个关键词
+- 查询时利用三角不等式剪枝，只访问距离区间 [d - k, d + k] 内的子树
+- 关键词规模很小（几十个）时单次查询远小于 1 毫秒
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def levenshtein_distance(source: str, target: str, max_distance: Optional[int] = None) -> int:
+    """
+    计算两个字符串的编辑距离（插入 / 删除 / 替换各计 1）。
+
+    Args:
+        max_distance: 可选的提前终止阈值；当某一行的最小值已超过阈值时
+                      直接返回 max_distance + 1
+    """
+    if source == target:
+        return 0
+    if len(source) < len(target):
+        source, target = target, source
+    if not target:
+        return len(source)
+    if max_distance is not None and len(source) - len(target) > max_distance:
+        return max_distance + 1
+
+    previous_row: List[int] = list(range(len(target) + 1))
+    for i, source_char in enumerate(source, start=1):
+        current_row: List[int] = [i]
+        for j, target_char in enumerate(target, start=1):
+            current_row.append(min(
+                previous_row[j] + 1,
+                current_row[j - 1] + 1,
+                previous_row[j - 1] + (source_char != target_char),
+            ))
+        if max_distance is not None and min(current_row) > max_distance:
+            return max_distance + 1
+        previous_row = current_row
+    return previous_row[-1]
+
+
+class _BKNode:
+    """BK 树节点：一个词及其按编辑距离索引的子节点"""
+
+    __slots__ = ("word", "children")
+
+    def __init__(self, word: str) -> None:
+        self.word: str = word
+        self.children: Dict[int, "_BKNode"] = {}
+
+
+class BKTree:
+    """按编辑距离组织的 BK 树"""
+
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        self._root: Optional[_BKNode] = None
+        self._size: int = 0
+        for word in words:
+            self.add(word)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, word: str) -> None:
+        """插入一个词（重复插入会被忽略）"""
+        if self._root is None:
+            self._root = _BKNode(word)
+            self._size = 1
+            return
+
+        node: _BKNode = self._root
+        while True:
+            distance: int = levenshtein_distance(word, node.word)
+            if distance == 0:
+                return
+            child: Optional[_BKNode] = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _BKNode(word)
+                self._size += 1
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[str, int]]:
+        """
+        查找与 word 编辑距离不超过 max_distance 的所有词。
+
+        Returns:
+            (词, 距离) 列表，按距离升序
+        """
+        if self._root is None:
+            return []
+
+        results: List[Tuple[str, int]] = []
+        stack: List[_BKNode] = [self._root]
+        while stack:
+            node: _BKNode = stack.pop()
+            distance: int = levenshtein_distance(word, node.word)
+            if distance <= max_distance:
+                results.append((node.word, distance))
+            low: int = distance - max_distance
+            high: int = distance + max_distance
+            for child_distance, child in node.children.items():
+                if low <= child_distance <= high:
+                    stack.append(child)
+
+        results.sort(key=lambda item: item[1])
+        return results
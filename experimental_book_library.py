@@ -850,12 +850,197 @@ BOOK_LIBRARY = {
         
 }
 
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+import ast
+import sys
+import threading
+import time
 import jieba
+from semantic_matcher import HAS_NUMPY, CharNgramTfidfIndex, build_task_document
+from bk_tree import BKTree
 
 
 from typing import Set
 
+# ===========================================
+# 紧凑的书籍记录（驻留 / 不可变 / 跨任务共享）
+# ===========================================
+
+# 院系借阅率：(院系名称, 借阅率)
+DepartmentRate = Tuple[str, float]
+
+
+class BookRecord(Mapping):
+    """
+    实验书库中单本书的紧凑只读记录。
+
+    - 使用 __slots__ 存储字段，不再为每本书保留完整 dict 与嵌套的 social_reason dict
+    - 不可变：创建后禁止修改，因此可以安全地在多个任务之间共享同一实例
+    - 实现 Mapping 接口（get / [] / in），兼容原有按 dict 读取书籍字段的代码
+    - 只有在 JSON 边界（返回给前端 / 写日志）时才通过 to_dict() 转换为普通 dict
+    """
+
+    __slots__ = (
+        "title", "author", "isbn", "match_stars", "role_type",
+        "fault_type", "trap_focus", "departments", "trend",
+    )
+
+    _FIELDS: Tuple[str, ...] = (
+        "title", "author", "isbn", "match_stars", "role_type", "fault_type", "trap_focus",
+    )
+
+    title: str
+    author: str
+    isbn: str
+    match_stars: int
+    role_type: str
+    fault_type: str
+    trap_focus: str
+    departments: Tuple[DepartmentRate, ...]
+    trend: Optional[str]
+
+    def __init__(
+        self,
+        title: str,
+        author: str,
+        isbn: str,
+        match_stars: int,
+        role_type: str,
+        fault_type: str,
+        trap_focus: str,
+        departments: Tuple[DepartmentRate, ...],
+        trend: Optional[str],
+    ) -> None:
+        values: Dict[str, Any] = {
+            "title": title,
+            "author": author,
+            "isbn": isbn,
+            "match_stars": match_stars,
+            "role_type": role_type,
+            "fault_type": fault_type,
+            "trap_focus": trap_focus,
+            "departments": departments,
+            "trend": trend,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("BookRecord 为只读记录，不能修改字段")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("BookRecord 为只读记录，不能删除字段")
+
+    def _key(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, BookRecord):
+            return self._key() == other._key()
+        return Mapping.__eq__(self, other)
+
+    def __repr__(self) -> str:
+        return f"BookRecord(title={self.title!r}, isbn={self.isbn!r})"
+
+    # ---- Mapping 接口：按需构建 social_reason，其余字段直接读取 ----
+    def _has_social_reason(self) -> bool:
+        return bool(self.departments) or self.trend is not None
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "social_reason":
+            if not self._has_social_reason():
+                raise KeyError(key)
+            return self.social_reason_dict()
+        if key in self._FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._FIELDS
+        if self._has_social_reason():
+            yield "social_reason"
+
+    def __len__(self) -> int:
+        return len(self._FIELDS) + (1 if self._has_social_reason() else 0)
+
+    def social_reason_dict(self) -> Dict[str, Any]:
+        """构建 social_reason 的 dict 表示（每次返回新对象，调用方可自由修改）"""
+        social_reason: Dict[str, Any] = {
+            "departments": [{"name": name, "rate": rate} for name, rate in self.departments]
+        }
+        if self.trend is not None:
+            social_reason["trend"] = self.trend
+        return social_reason
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为普通 dict，仅在 JSON 边界使用"""
+        return {key: self[key] for key in self}
+
+
+# 驻留池：内容完全相同的书籍只保留一个实例
+# 注意：按完整内容而不是 ISBN 驻留——书库中存在 ISBN 相同但标题不同的条目（如 9787511569684）
+_BOOK_INTERN_POOL: Dict[Tuple[Any, ...], BookRecord] = {}
+
+
+def _intern_text(text: Any) -> Any:
+    """对字符串做驻留，非字符串原样返回"""
+    return sys.intern(text) if isinstance(text, str) else text
+
+
+def intern_book(raw_book: Mapping) -> BookRecord:
+    """
+    将书库中的原始书籍 dict（或已有的 BookRecord）转换为驻留的 BookRecord。
+    同一内容的书籍（即使出现在多个任务下）只会创建一个实例。
+    """
+    social_reason: Mapping = raw_book.get("social_reason") or {}
+    departments: Tuple[DepartmentRate, ...] = tuple(
+        (_intern_text(dept.get("name", "")), float(dept.get("rate", 0)))
+        for dept in social_reason.get("departments", [])
+    )
+    record = BookRecord(
+        title=_intern_text(raw_book.get("title", "")),
+        author=_intern_text(raw_book.get("author", "")),
+        isbn=_intern_text(raw_book.get("isbn", "")),
+        match_stars=int(raw_book.get("match_stars", 0)),
+        role_type=_intern_text(raw_book.get("role_type", "")),
+        fault_type=_intern_text(raw_book.get("fault_type", "none")),
+        trap_focus=_intern_text(raw_book.get("trap_focus", "none")),
+        departments=departments,
+        trend=_intern_text(social_reason.get("trend")),
+    )
+    return _BOOK_INTERN_POOL.setdefault(record._key(), record)
+
+
+def book_to_dict(book: Mapping) -> Dict[str, Any]:
+    """
+    将书籍（BookRecord 或普通 dict）转换为可修改的普通 dict。
+    供 LLM 模块在组合推荐理由时使用，替代原来的 book.copy()。
+    """
+    if isinstance(book, BookRecord):
+        return book.to_dict()
+    return dict(book)
+
+
+def _build_task_records(library: Mapping) -> Dict[str, Tuple[BookRecord, ...]]:
+    """任务关键词 -> 驻留书籍记录元组"""
+    return {
+        task_keyword: tuple(intern_book(book) for book in books)
+        for task_keyword, books in library.items()
+    }
+
+
+# 任务关键词 -> 共享的书籍记录元组（不可变，任务之间无需复制）
+TASK_BOOK_RECORDS: Dict[str, Tuple[BookRecord, ...]] = _build_task_records(BOOK_LIBRARY)
+# 记录建好后不再保留原始 dict：BOOK_LIBRARY 改为指向同一份只读记录
+# （BookRecord 实现 Mapping，按 dict 读取字段的代码不受影响），书库在内存中只有一份
+BOOK_LIBRARY = TASK_BOOK_RECORDS
+
 def _tokenize_to_set(text: str) -> Set[str]:
     """
     使用 jieba 对文本进行智能分词，去除停用词、空字符与常见无效 token。
@@ -895,13 +1080,305 @@ def _normalize_keyword(text: str) -> str:
     return "".join(ch.lower() for ch in text if not ch.isspace())
 
 # 预构建严格匹配索引，降低每次检索的延迟
-NORMALIZED_TASK_INDEX: Dict[str, List[Dict[str, Any]]] = {
+NORMALIZED_TASK_INDEX: Dict[str, Tuple[BookRecord, ...]] = {
     _normalize_keyword(task_keyword): books
-    for task_keyword, books in BOOK_LIBRARY.items()
+    for task_keyword, books in TASK_BOOK_RECORDS.items()
 }
 
+# 第三阶段：错别字 / 同音字容错匹配（BK 树编辑距离索引）
+ENABLE_TYPO_MATCH: bool = True
+
+
+def _typo_max_distance(length: int) -> int:
+    """按关键词长度给出允许的最大编辑距离：过短的词不做容错，避免误纠正"""
+    if length <= 2:
+        return 0
+    if length <= 5:
+        return 1
+    return 2
+
+
+def _build_typo_index(
+    normalized_index: Dict[str, Tuple[BookRecord, ...]]
+) -> Tuple[BKTree, Dict[str, int]]:
+    """
+    在书库加载时构建规范化任务关键词的 BK 树，
+    同时返回关键词在书库中的顺序，用于同距离候选的稳定排序。
+    """
+    keywords: List[str] = [keyword for keyword in normalized_index if _chars_to_set(keyword)]
+    return BKTree(keywords), {keyword: position for position, keyword in enumerate(keywords)}
+
+
+TYPO_TASK_INDEX, _TYPO_KEYWORD_ORDER = _build_typo_index(NORMALIZED_TASK_INDEX)
+
+
+def find_task_typo_corrections(query: str) -> List[Tuple[str, int]]:
+    """
+    容错匹配：返回与规范化 query 编辑距离在允许范围内的规范化任务关键词及距离，
+    按（距离, 书库顺序）升序排列。
+    """
+    normalized_query: str = _normalize_keyword(query)
+    max_distance: int = _typo_max_distance(len(normalized_query))
+    if max_distance == 0:
+        return []
+    candidates: List[Tuple[str, int]] = TYPO_TASK_INDEX.search(normalized_query, max_distance)
+    # 候选关键词本身也不能太短，否则任意短 query 都会被「纠正」
+    candidates = [
+        (keyword, distance) for keyword, distance in candidates
+        if distance <= _typo_max_distance(len(keyword))
+    ]
+    candidates.sort(key=lambda item: (item[1], _TYPO_KEYWORD_ORDER.get(item[0], 0)))
+    return candidates
+
+
+# 第四阶段：本地语义匹配（可选，需要 numpy；纯 CPU 离线运行）
+ENABLE_SEMANTIC_MATCH: bool = True
+# 只用二元字符 n-gram：单字特征会让只共享一个字的无关查询越过阈值（「物理」-> 别名「物联网」）
+SEMANTIC_NGRAM_RANGE: Tuple[int, int] = (2, 2)
+# 余弦相似度阈值：低于该值视为未匹配（由 bench_semantic_matcher.py 评估得出：
+# 无关查询最高约 0.08，最低的正确命中约 0.13）
+SEMANTIC_MATCH_MIN_SCORE: float = 0.10
+
+# 任务别名：与任务关键词、书名、trend 没有公共字符的常见同义表达，
+# 加入语义索引的任务文档（字符 n-gram 本身无法关联「焦虑」与「心理健康」这类近义词）
+TASK_KEYWORD_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "未来教育": ("教育趋势", "教育创新"),
+    "教育变革": ("教育改革", "课程改革"),
+    "人工智能伦理": ("AI治理", "算法偏见", "隐私", "科技伦理"),
+    "智慧校园": ("数字校园", "物联网", "大数据"),
+    "教师能力": ("教学能力", "课堂教学", "师范"),
+    "人工智能教育": ("机器学习", "编程"),
+    "AI教育": ("机器学习", "编程"),
+    "职业发展": ("求职", "就业", "面试", "简历", "职场", "实习"),
+    "高效学习": ("学习方法", "记忆", "专注", "考试", "自律"),
+    "心理健康": ("焦虑", "抑郁", "情绪", "压力", "失眠", "疗愈"),
+    "健康生活": ("运动", "饮食", "营养", "健身", "养生"),
+    "高情商沟通": ("人际关系", "表达", "说话", "社交"),
+    "创造力": ("创新", "灵感", "想象力", "创意"),
+}
+
+
+def _build_semantic_index(
+    task_books: Dict[str, Tuple[BookRecord, ...]]
+) -> Optional[CharNgramTfidfIndex]:
+    """
+    在书库加载时预计算任务语义索引：每个任务的文档为「关键词 + 书名 + trend」。
+    未安装 numpy 时返回 None，语义匹配阶段自动跳过。
+    """
+    if not HAS_NUMPY:
+        return None
+
+    documents: Dict[str, str] = {}
+    for task_keyword, books in task_books.items():
+        # 与字符包含匹配保持一致：跳过没有有效字符的占位任务
+        if not _chars_to_set(task_keyword):
+            continue
+        documents[task_keyword] = build_task_document(
+            task_keyword,
+            [book.title for book in books],
+            [book.trend for book in books if book.trend],
+            aliases=TASK_KEYWORD_ALIASES.get(task_keyword, ()),
+        )
+    return CharNgramTfidfIndex(documents, ngram_range=SEMANTIC_NGRAM_RANGE)
+
+
+SEMANTIC_TASK_INDEX: Optional[CharNgramTfidfIndex] = _build_semantic_index(TASK_BOOK_RECORDS)
+
+
+def find_tasks_semantic(query: str, top_k: int = 3,
+                        min_score: Optional[float] = None) -> List[Tuple[str, float]]:
+    """
+    语义匹配：返回与 query 最相似的任务关键词及得分（降序）。
+    语义索引不可用时返回空列表。
+    """
+    if SEMANTIC_TASK_INDEX is None:
+        return []
+    threshold: float = SEMANTIC_MATCH_MIN_SCORE if min_score is None else min_score
+    return SEMANTIC_TASK_INDEX.query(query, top_k=top_k, min_score=threshold)
+
+
+# ===========================================
+# 匹配结果记忆化（含负缓存）
+# ===========================================
+
+# 记忆化开关与容量
+ENABLE_MATCH_MEMO: bool = True
+MATCH_MEMO_MAX_ENTRIES: int = 2048
+# 未命中结果（负缓存）的存活时间；命中结果只会在书库重载时失效
+MATCH_MEMO_NEGATIVE_TTL_SECONDS: int = 60
+
+
+class MatchResultMemo:
+    """
+    有界 LRU 记忆化缓存：规范化 query -> 匹配结果元组（书籍元组或任务得分元组）。
+
+    - 命中（非空结果）一直有效，直到书库重载调用 clear()
+    - 未命中（空元组）作为负缓存保存，超过 negative_ttl_seconds 后重新计算
+    - 线程安全：Flask 多线程请求共享同一实例
+    - 记录命中/未命中计数，便于观察缓存效果
+    """
+
+    def __init__(self, max_entries: int, negative_ttl_seconds: float) -> None:
+        self.max_entries: int = max_entries
+        self.negative_ttl_seconds: float = negative_ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[Tuple[Any, ...], float]]" = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+        self.hits: int = 0
+        self.negative_hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
 
-def find_books_by_task(query: str) -> List[Dict[str, Any]]:
+    def get(self, key: str) -> Optional[Tuple[Any, ...]]:
+        """返回缓存的结果；不存在或负缓存已过期时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            result, stored_at = entry
+            if not result and time.monotonic() - stored_at > self.negative_ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            if result:
+                self.hits += 1
+            else:
+                self.negative_hits += 1
+            return result
+
+    def put(self, key: str, result: Tuple[Any, ...]) -> None:
+        """写入结果（空元组即负缓存），超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._entries[key] = (result, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """清空缓存（书库重载时调用），计数器保留"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中率等统计信息"""
+        with self._lock:
+            lookups: int = self.hits + self.negative_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+                "catalog_version": CATALOG_VERSION,
+            }
+
+
+MATCH_RESULT_MEMO: MatchResultMemo = MatchResultMemo(
+    MATCH_MEMO_MAX_ENTRIES, MATCH_MEMO_NEGATIVE_TTL_SECONDS
+)
+
+# 书库版本号：每次 reload_catalog() 自增
+CATALOG_VERSION: int = 1
+
+
+def load_catalog_source(source_path: Optional[Path] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    从书库源文件（默认即本文件）中读取 BOOK_LIBRARY 字面量，不执行模块中的其他代码。
+    实验期间修改本文件中的书目后，无需重启服务即可通过 reload_catalog() 生效。
+    """
+    path: Path = source_path or Path(__file__)
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name) and node.targets[0].id == "BOOK_LIBRARY"
+                and isinstance(node.value, ast.Dict)):
+            library = ast.literal_eval(node.value)
+            if isinstance(library, dict):
+                return library
+    raise ValueError(f"书库源文件中没有 BOOK_LIBRARY 字面量: {path}")
+
+
+# 串行化重载：并发的两次重载不会交错地重建索引
+_CATALOG_RELOAD_LOCK: threading.Lock = threading.Lock()
+
+
+def reload_catalog(library: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> int:
+    """
+    重新加载书库并重建所有派生索引，同时使匹配记忆化缓存失效。
+    由 /api/catalog/reload 调用。
+
+    Args:
+        library: 新的书库数据（格式同 BOOK_LIBRARY）；为 None 时从书库源文件重新读取
+
+    Returns:
+        新的书库版本号
+    """
+    global BOOK_LIBRARY, TASK_BOOK_RECORDS, NORMALIZED_TASK_INDEX, SEMANTIC_TASK_INDEX, CATALOG_VERSION
+    global TYPO_TASK_INDEX, _TYPO_KEYWORD_ORDER
+
+    if library is None:
+        # 先解析源文件：解析失败时抛出异常，当前书库保持不变
+        library = load_catalog_source()
+
+    with _CATALOG_RELOAD_LOCK:
+        _BOOK_INTERN_POOL.clear()
+        TASK_BOOK_RECORDS = _build_task_records(library)
+        BOOK_LIBRARY = TASK_BOOK_RECORDS
+        NORMALIZED_TASK_INDEX = {
+            _normalize_keyword(task_keyword): books
+            for task_keyword, books in TASK_BOOK_RECORDS.items()
+        }
+        TYPO_TASK_INDEX, _TYPO_KEYWORD_ORDER = _build_typo_index(NORMALIZED_TASK_INDEX)
+        SEMANTIC_TASK_INDEX = _build_semantic_index(TASK_BOOK_RECORDS)
+        CATALOG_VERSION += 1
+        MATCH_RESULT_MEMO.clear()
+        return CATALOG_VERSION
+
+
+def get_match_memo_stats() -> Dict[str, Any]:
+    """返回匹配记忆化缓存的命中率统计"""
+    return MATCH_RESULT_MEMO.stats()
+
+
+# 可用于分组比较图书的字段："task" 为书库中的任务关键词，其余为图书记录字段
+BOOK_GROUP_FIELDS: Tuple[str, ...] = ('task', 'role_type', 'fault_type')
+# (书库版本号, 分组字段) -> 分组，书库重新加载后自动失效
+_BOOK_GROUPS_CACHE: Dict[Tuple[int, str], Dict[str, List[str]]] = {}
+
+
+def get_book_groups(group_by: str) -> Dict[str, List[str]]:
+    """
+    按任务 / role_type / fault_type 对书库中的图书分组：分组值 -> ISBN 列表（去重，保持书库顺序）
+
+    Args:
+        group_by: BOOK_GROUP_FIELDS 之一
+    """
+    if group_by not in BOOK_GROUP_FIELDS:
+        raise ValueError(f"不支持的分组字段: {group_by}")
+    cache_key = (CATALOG_VERSION, group_by)
+    groups = _BOOK_GROUPS_CACHE.get(cache_key)
+    if groups is None:
+        groups = {}
+        for task_keyword, books in TASK_BOOK_RECORDS.items():
+            for book in books:
+                if not book.get('isbn'):
+                    continue
+                name = task_keyword if group_by == 'task' else book.get(group_by)
+                isbns = groups.setdefault(str(name), [])
+                if book['isbn'] not in isbns:
+                    isbns.append(book['isbn'])
+        _BOOK_GROUPS_CACHE.clear()
+        _BOOK_GROUPS_CACHE[cache_key] = groups
+    return groups
+
+
+def find_books_by_task(query: str) -> Tuple[BookRecord, ...]:
     """
     根据用户查询在实验书库中匹配任务，并返回对应的书籍列表。
 
@@ -914,29 +1391,179 @@ def find_books_by_task(query: str) -> List[Dict[str, Any]]:
          - 允许 query 比关键词更长（如「职业发展与就业」 命中 「职业发展」）
          - 允许字符顺序不同（如「发展职业」 命中 「职业发展」）
        - 不做更宽松的模糊匹配，保证传给后端大模型的是「已知的标准任务关键词」而不是任意字符串
+    3. 容错匹配（ENABLE_TYPO_MATCH）：
+       - 用 BK 树查找编辑距离 1~2 以内的任务关键词，纠正单字错别字 / 同音字（如「智慧校圆」）
+       - 允许的距离随关键词长度增加，2 个字以内的 query 不做容错
+    4. 语义匹配（可选，ENABLE_SEMANTIC_MATCH 且已安装 numpy）：
+       - 用字符 n-gram TF-IDF 向量计算 query 与「任务关键词 + 书名 + trend」的余弦相似度
+       - 取得分最高且不低于 SEMANTIC_MATCH_MIN_SCORE 的任务，结果仍然是标准任务关键词对应的书籍
+       - 与任务没有公共字符的近义词只能通过 TASK_KEYWORD_ALIASES 中登记的别名命中
+
+    返回值为任务共享的 BookRecord 元组（只读），调用方不应也无法修改其中的书籍；
+    需要组合推荐理由时请使用 book_to_dict() 转换。
+
+    结果按规范化 query 记忆化（含未命中的负缓存），书库重载时失效。
     """
     if not query:
-        return []
+        return ()
 
     # 1) 严格规范化：去掉空白，全部转小写
     normalized_query: str = _normalize_keyword(query)
     if not normalized_query:
-        return []
+        return ()
+
+    if not ENABLE_MATCH_MEMO:
+        return _match_books(normalized_query)
+
+    cached = MATCH_RESULT_MEMO.get(normalized_query)
+    if cached is not None:
+        return cached
 
+    catalog_version: int = CATALOG_VERSION
+    books: Tuple[BookRecord, ...] = _match_books(normalized_query)
+    # 匹配期间书库被重载时不写入，避免旧书库的结果污染新缓存
+    if catalog_version == CATALOG_VERSION:
+        MATCH_RESULT_MEMO.put(normalized_query, books)
+    return books
+
+
+def _match_books(normalized_query: str) -> Tuple[BookRecord, ...]:
+    """
+    执行 find_books_by_task 的逐级匹配（不经过记忆化缓存）
+
+    各阶段都只使用规范化 query：结果按规范化 query 缓存，
+    只有空白 / 大小写不同的 query 变体必须得到相同的结果
+    """
     # 1. 严格 O(1) 匹配：命中标准任务关键词就直接返回
     strict_hit = NORMALIZED_TASK_INDEX.get(normalized_query)
     if strict_hit is not None:
         return strict_hit
 
     # 2. 字符包含 / 乱序匹配：满足「每一个字符都包含、空格顺序不管」
-    query_char_set: Set[str] = _chars_to_set(query)
+    query_char_set: Set[str] = _chars_to_set(normalized_query)
     if not query_char_set:
-        return []
+        return ()
 
-    for task_keyword, books in BOOK_LIBRARY.items():
+    for task_keyword, books in TASK_BOOK_RECORDS.items():
         kw_char_set: Set[str] = _chars_to_set(task_keyword)
         # 关键：任务关键词的每个字符都必须出现在用户 query 中
         if kw_char_set and kw_char_set.issubset(query_char_set):
             return books
 
-    return []
\ No newline at end of file
+    # 3. 容错匹配：BK 树编辑距离检索，只在前两级都未命中时使用
+    if ENABLE_TYPO_MATCH:
+        corrections: List[Tuple[str, int]] = find_task_typo_corrections(normalized_query)
+        if corrections:
+            return NORMALIZED_TASK_INDEX[corrections[0][0]]
+
+    # 4. 语义匹配：一次矩阵乘法 + top-1
+    if ENABLE_SEMANTIC_MATCH:
+        semantic_hits: List[Tuple[str, float]] = find_tasks_semantic(normalized_query, top_k=1)
+        if semantic_hits:
+            return TASK_BOOK_RECORDS[semantic_hits[0][0]]
+
+    return ()
+
+
+# ===========================================
+# 多任务匹配：合并多个命中任务的书籍
+# ===========================================
+
+# 多任务模式下合并后的书籍数量上限
+MULTI_TASK_MAX_BOOKS: int = 6
+
+# 记忆化缓存中多任务匹配结果的键前缀（与单任务的规范化 query 键区分）
+_MULTI_TASK_MEMO_PREFIX: str = "tasks:"
+
+
+def find_matching_tasks(query: str) -> Tuple[Tuple[str, float], ...]:
+    """
+    收集 query 命中的所有任务关键词及得分（降序），而不是在第一个命中处停止。
+
+    得分规则：
+    - 严格匹配：1.0
+    - 字符包含匹配：任务关键词字符数 / query 有效字符数（关键词覆盖 query 越多得分越高）
+    - 以上都没有命中时，先尝试容错匹配（得分为 1 - 距离 / 关键词长度），
+      再回退到语义匹配的 top-k 结果（得分为余弦相似度）
+
+    结果同样经过记忆化缓存（含负缓存）。
+    """
+    if not query:
+        return ()
+
+    normalized_query: str = _normalize_keyword(query)
+    if not normalized_query:
+        return ()
+
+    memo_key: str = _MULTI_TASK_MEMO_PREFIX + normalized_query
+    if ENABLE_MATCH_MEMO:
+        cached = MATCH_RESULT_MEMO.get(memo_key)
+        if cached is not None:
+            return cached
+
+    catalog_version: int = CATALOG_VERSION
+    tasks: Tuple[Tuple[str, float], ...] = _match_tasks(normalized_query)
+    if ENABLE_MATCH_MEMO and catalog_version == CATALOG_VERSION:
+        MATCH_RESULT_MEMO.put(memo_key, tasks)
+    return tasks
+
+
+def _match_tasks(normalized_query: str) -> Tuple[Tuple[str, float], ...]:
+    """执行 find_matching_tasks 的打分匹配（不经过记忆化缓存，同样只使用规范化 query）"""
+    scores: Dict[str, float] = {}
+
+    query_char_set: Set[str] = _chars_to_set(normalized_query)
+    for task_keyword in TASK_BOOK_RECORDS:
+        if _normalize_keyword(task_keyword) == normalized_query:
+            scores[task_keyword] = 1.0
+            continue
+        kw_char_set: Set[str] = _chars_to_set(task_keyword)
+        if query_char_set and kw_char_set and kw_char_set.issubset(query_char_set):
+            scores[task_keyword] = len(kw_char_set) / len(query_char_set)
+
+    if not scores and ENABLE_TYPO_MATCH:
+        normalized_to_keyword: Dict[str, str] = {
+            _normalize_keyword(task_keyword): task_keyword for task_keyword in TASK_BOOK_RECORDS
+        }
+        for normalized_keyword, distance in find_task_typo_corrections(normalized_query):
+            task_keyword = normalized_to_keyword[normalized_keyword]
+            scores[task_keyword] = 1.0 - distance / len(normalized_keyword)
+
+    if not scores and ENABLE_SEMANTIC_MATCH:
+        for task_keyword, score in find_tasks_semantic(normalized_query, top_k=3):
+            scores[task_keyword] = score
+
+    # 稳定排序：同分时保持书库中的任务顺序
+    return tuple(sorted(scores.items(), key=lambda item: item[1], reverse=True))
+
+
+def find_books_by_tasks(query: str, max_books: int = MULTI_TASK_MAX_BOOKS) -> Tuple[BookRecord, ...]:
+    """
+    多任务模式：合并 query 命中的所有任务的书籍，按 ISBN 去重并截断到 max_books 本。
+
+    合并顺序为按任务得分轮转取书（第一轮取每个任务的第一本，依此类推），
+    保证截断后的结果仍覆盖尽可能多的命中任务。
+    返回的书籍集合可直接用于生成唯一的书集签名，从而只启动一次 LLM 任务。
+    """
+    tasks: Tuple[Tuple[str, float], ...] = find_matching_tasks(query)
+    if not tasks or max_books <= 0:
+        return ()
+
+    task_books: List[Tuple[BookRecord, ...]] = [TASK_BOOK_RECORDS[keyword] for keyword, _ in tasks]
+    merged: List[BookRecord] = []
+    seen_isbns: Set[str] = set()
+    max_len: int = max(len(books) for books in task_books)
+
+    for position in range(max_len):
+        for books in task_books:
+            if position >= len(books):
+                continue
+            book: BookRecord = books[position]
+            if book.isbn in seen_isbns:
+                continue
+            seen_isbns.add(book.isbn)
+            merged.append(book)
+            if len(merged) >= max_books:
+                return tuple(merged)
+
+    return tuple(merged)
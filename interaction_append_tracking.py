@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+会话JSONL派生存储的累加进度跟踪
+会话摘要 / 偏移索引、SQLite存储后端、日汇总、图书聚合和检索索引都由追加写入监听器增量维护，
+遵循同一套进度规则，由 AppendProgressTracker 统一实现：
+
+- 只处理本存储负责的会话目录下的 .jsonl 文件
+- 进度按逻辑偏移记录（已轮转的分段 + 活跃文件），轮转前后同一条记录的逻辑偏移不变
+- 追加写入的起点恰好等于已累加的进度时才直接累加，否则（其他进程写入 / 进度过期）留待补齐
+- 补齐时只对比逻辑长度：比进度长则从进度处读取新增的完整行，比进度短（文件被截断 / 改写）则重建
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+from interaction_session_segments import SEGMENT_IO_CHUNK_SIZE, SessionSegmentStore
+
+
+def iter_logical_chunks(session_file: Path, start: int, segments: Optional[SessionSegmentStore],
+                        chunk_size: int = SEGMENT_IO_CHUNK_SIZE) -> Iterator[Tuple[int, bytes]]:
+    """
+    读取逻辑偏移 start 之后的全部完整行；没有分段存储时只读取活跃文件
+
+    Yields:
+        (块的逻辑起始偏移, 以换行结尾的字节块)
+    """
+    if segments is not None:
+        yield from segments.iter_logical_chunks(session_file, start, chunk_size)
+        return
+    with open(session_file, 'rb') as f:
+        f.seek(start)
+        pending = b''
+        position = start
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            pending += chunk
+            cut = pending.rfind(b'\n') + 1
+            if cut:
+                yield position, pending[:cut]
+                position += cut
+                pending = pending[cut:]
+
+
+class AppendProgressTracker:
+    """
+    按逻辑偏移增量维护的派生存储基类
+    子类在构造时设置 session_dir 和 segments（没有分段存储时为 None，逻辑偏移即活跃文件偏移）
+    """
+
+    session_dir: Path
+    segments: Optional[SessionSegmentStore] = None
+
+    def _owns(self, session_file: Path) -> bool:
+        """只处理本存储负责的会话目录下的JSONL文件"""
+        return (session_file.suffix == '.jsonl'
+                and os.path.abspath(str(session_file.parent)) == os.path.abspath(str(self.session_dir)))
+
+    def _rotated_bytes(self, session_file: Path) -> int:
+        """活跃文件在逻辑字节流中的起点"""
+        return self.segments.rotated(session_file)[0] if self.segments else 0
+
+    def _logical_offset(self, session_file: Path, active_offset: int) -> int:
+        """活跃文件内的偏移（或大小）换算为逻辑偏移（或逻辑长度）"""
+        return self._rotated_bytes(session_file) + active_offset
+
+    def _append_start(self, session_file: Path, start_offset: int) -> Optional[int]:
+        """追加写入的逻辑起点；不是本存储负责的文件时返回 None"""
+        if not self._owns(session_file):
+            return None
+        return self._logical_offset(session_file, start_offset)
+
+    def _iter_logical_chunks(self, session_file: Path, start: int,
+                             chunk_size: int = SEGMENT_IO_CHUNK_SIZE) -> Iterator[Tuple[int, bytes]]:
+        return iter_logical_chunks(session_file, start, self.segments, chunk_size)
+
+    def _logical_sizes(self) -> Dict[Path, int]:
+        """会话目录下各会话的逻辑长度（按文件名排序，只 stat 不读取）"""
+        sizes: Dict[Path, int] = {}
+        for session_file in sorted(self.session_dir.glob("*.jsonl")):
+            try:
+                sizes[session_file] = self._logical_offset(session_file, session_file.stat().st_size)
+            except FileNotFoundError:
+                continue
+        return sizes
+
+    @staticmethod
+    def _shrunk(progress: Mapping[str, int], sizes: Mapping[Path, int]) -> bool:
+        """是否有会话比已累加的进度短（需要整体重建）"""
+        return any(progress.get(session_file.stem, 0) > size for session_file, size in sizes.items())
+
+    @staticmethod
+    def _pending_ranges(progress: Mapping[str, int], sizes: Mapping[Path, int]
+                        ) -> List[Tuple[Path, int, int]]:
+        """需要补齐的会话：[(会话文件, 已累加的进度, 逻辑长度)]"""
+        return [(session_file, progress.get(session_file.stem, 0), size)
+                for session_file, size in sizes.items() if progress.get(session_file.stem, 0) < size]
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+按 ISBN 增量维护的图书交互聚合
+会话记录每次追加写入时（通过写入监听器）把新记录累加到对应图书的聚合中，
+比较图书（点击率、悬停时长、评分分布）时直接读取聚合，不再重读所有会话文件。
+
+两类记录分别计数（两个前端脚本可能同时上报同一次交互，合并计数会重复）：
+- 聚合检索日志（suggestion_display.js -> save_query_log_record）：每本图书一次曝光，
+  以及该次检索中的悬停次数、悬停时长、点击次数和评分
+- 会话事件（session_manager.js -> save_session_events）：book_clicked、
+  book_hover_start / book_hover_end / 合并后的 book_hover，计入 events 子项
+
+按任务 / role_type / fault_type 的聚合不单独存储：调用方按书库中的 ISBN 列表用 merge_book_stats 合并，
+书库调整后分组自然随之更新。
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from interaction_append_tracking import AppendProgressTracker
+from interaction_event_writer import locked_file
+from interaction_session_segments import SessionSegmentStore
+from interaction_storage import HOVER_END_EVENT_TYPES, HOVER_START_EVENT_TYPES
+
+# 状态文件格式版本，结构变化时递增以触发重建
+BOOK_STATS_VERSION = 1
+BOOK_STATS_FILE = "book_stats.json"
+BOOK_STATS_LOCK_FILE = ".lock"
+# 追加写入后最多间隔多少秒把内存中的聚合写回磁盘（聚合与累加进度一起原子写出，
+# 进程崩溃时只会丢失未写出的累加进度，下次启动从进度处补齐）
+BOOK_STATS_PERSIST_INTERVAL_SECONDS: float = 5.0
+
+
+def new_book_stats() -> Dict[str, Any]:
+    """空的单本图书聚合"""
+    return {
+        'title': None,
+        'impressions': 0,
+        'hovers': 0,
+        'hover_ms': 0,
+        'clicks': 0,
+        'ratings': {},        # 评分 -> 次数
+        'events': {'hovers': 0, 'hover_ms': 0, 'clicks': 0},
+    }
+
+
+def _number(value: Any) -> int:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+def merge_book_stats(entries: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """合并多本图书的聚合（按任务 / 角色类型等分组时使用），并附带派生指标"""
+    merged = new_book_stats()
+    merged.pop('title')
+    for entry in entries:
+        for field in ('impressions', 'hovers', 'hover_ms', 'clicks'):
+            merged[field] += entry[field]
+        for rating, count in entry['ratings'].items():
+            merged['ratings'][rating] = merged['ratings'].get(rating, 0) + count
+        for field in ('hovers', 'hover_ms', 'clicks'):
+            merged['events'][field] += entry['events'][field]
+    return with_derived_metrics(merged)
+
+
+def with_derived_metrics(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """附加点击率、平均悬停时长、平均评分（不存储，读取时计算）"""
+    impressions = entry['impressions']
+    rating_count = sum(entry['ratings'].values())
+    rating_sum = 0.0
+    for rating, count in entry['ratings'].items():
+        try:
+            rating_sum += float(rating) * count
+        except ValueError:
+            rating_count -= count
+    return {
+        **entry,
+        'ctr': entry['clicks'] / impressions if impressions else None,
+        'avg_hover_ms': entry['hover_ms'] / entry['hovers'] if entry['hovers'] else None,
+        'avg_rating': rating_sum / rating_count if rating_count else None,
+    }
+
+
+class BookStatsStore(AppendProgressTracker):
+    """
+    图书交互聚合存储
+
+    - stats_dir/book_stats.json 保存全部图书的聚合以及各会话已累加的逻辑字节数
+      （已轮转分段 + 活跃文件），两者一起原子写出，始终一致
+    - 追加写入起点与累加进度相符才直接累加；其他进程写入或已有的历史数据由 sync_all 补齐；
+      会话文件变短时整体重建
+    - 更新持有 stats_dir/.lock 的文件锁；其他进程写出过新的状态时先重新加载
+    """
+
+    def __init__(self, session_dir: Path, stats_dir: Path,
+                 segments: Optional[SessionSegmentStore] = None):
+        self.session_dir = session_dir
+        self.stats_dir = stats_dir
+        self.segments = segments
+        self.stats_dir.mkdir(parents=True, exist_ok=True)
+        self._state_path = self.stats_dir / BOOK_STATS_FILE
+        self._lock_path = self.stats_dir / BOOK_STATS_LOCK_FILE
+        self._lock_path.touch(exist_ok=True)
+        self._lock = threading.Lock()
+        self._books: Dict[str, Dict[str, Any]] = {}
+        self._sources: Dict[str, int] = {}
+        self._state_stamp: Optional[Tuple[int, int]] = None
+        self._dirty = False
+        self._last_persist = 0.0
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self._state_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh_locked(self) -> None:
+        """状态文件被其他进程更新过时重新加载（需持有锁；本进程未写出的累加随之丢弃，稍后补齐）"""
+        stamp = self._file_stamp()
+        if stamp is not None and stamp == self._state_stamp:
+            return
+        self._books, self._sources = {}, {}
+        self._state_stamp = stamp
+        self._dirty = False
+        try:
+            with open(self._state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('version') == BOOK_STATS_VERSION:
+                self._books, self._sources = state['books'], state['sources']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _persist_locked(self) -> None:
+        tmp_path = self._state_path.with_name(self._state_path.name + f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': BOOK_STATS_VERSION, 'sources': self._sources, 'books': self._books},
+                      f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self._state_path)
+        self._state_stamp = self._file_stamp()
+        self._dirty = False
+        self._last_persist = time.monotonic()
+
+    def flush(self) -> None:
+        """把内存中尚未写出的聚合写回磁盘"""
+        with self._lock, locked_file(self._lock_path):
+            if self._dirty and self._file_stamp() == self._state_stamp:
+                self._persist_locked()
+
+    # ------------------------------------------------------------------
+    # 累加
+    # ------------------------------------------------------------------
+
+    def _book(self, isbn: str, title: Any) -> Dict[str, Any]:
+        entry = self._books.get(isbn)
+        if entry is None:
+            entry = self._books[isbn] = new_book_stats()
+        if title:
+            entry['title'] = title
+        return entry
+
+    def _fold_record(self, record: Dict[str, Any]) -> None:
+        event_type = record.get('event_type')
+        if event_type is None and isinstance(record.get('books'), list):
+            for book in record['books']:
+                if not isinstance(book, dict) or not book.get('isbn'):
+                    continue
+                entry = self._book(str(book['isbn']), book.get('title'))
+                entry['impressions'] += 1
+                entry['hovers'] += _number(book.get('hover_count'))
+                entry['hover_ms'] += _number(book.get('total_hover_time_ms'))
+                entry['clicks'] += _number(book.get('click_count'))
+                if book.get('rating') is not None:
+                    rating = str(book['rating'])
+                    entry['ratings'][rating] = entry['ratings'].get(rating, 0) + 1
+            return
+
+        isbn = record.get('book_isbn')
+        if not isbn or event_type not in ('book_clicked',) + HOVER_START_EVENT_TYPES + HOVER_END_EVENT_TYPES:
+            return
+        events = self._book(str(isbn), record.get('book_title'))['events']
+        if event_type == 'book_clicked':
+            events['clicks'] += 1
+        if event_type in HOVER_START_EVENT_TYPES:
+            events['hovers'] += 1
+        if event_type in HOVER_END_EVENT_TYPES:
+            events['hover_ms'] += _number(record.get('hover_duration_ms'))
+
+    def _fold_bytes(self, data: bytes) -> int:
+        """累加一段JSONL字节中的完整行，返回实际消费的字节数"""
+        consumed = data.rfind(b'\n') + 1
+        for raw_line in data[:consumed].splitlines():
+            line = raw_line.strip()
+            # 快速跳过与图书无关的记录
+            if not line or (b'"books"' not in line and b'"book_isbn"' not in line):
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                self._fold_record(record)
+        return consumed
+
+    def on_append(self, session_file: Path, start_offset: int, data: bytes) -> None:
+        """追加写入监听器：累加进度恰好覆盖到写入起点时直接累加，按间隔写回磁盘"""
+        logical_start = self._append_start(session_file, start_offset)
+        if logical_start is None:
+            return
+        with self._lock, locked_file(self._lock_path):
+            self._refresh_locked()
+            if self._sources.get(session_file.stem, 0) != logical_start:
+                return
+            self._sources[session_file.stem] = logical_start + self._fold_bytes(data)
+            self._dirty = True
+            if time.monotonic() - self._last_persist >= BOOK_STATS_PERSIST_INTERVAL_SECONDS:
+                self._persist_locked()
+
+    def _catch_up_locked(self, session_file: Path, start: int) -> None:
+        covered = start
+        for position, chunk in self._iter_logical_chunks(session_file, start):
+            covered = position + self._fold_bytes(chunk)
+        self._sources[session_file.stem] = covered
+
+    def sync_all(self) -> None:
+        """补齐所有会话（只对比逻辑长度，未变化的会话不读取）；有会话变短时整体重建"""
+        sizes = self._logical_sizes()
+        with self._lock, locked_file(self._lock_path):
+            self._refresh_locked()
+            if self._shrunk(self._sources, sizes):
+                self._books, self._sources = {}, {}
+                self._dirty = True
+            for session_file, covered, _ in self._pending_ranges(self._sources, sizes):
+                try:
+                    self._catch_up_locked(session_file, covered)
+                    self._dirty = True
+                except Exception as e:
+                    print(f"补齐图书聚合失败 {session_file}: {str(e)}")
+            if self._dirty:
+                self._persist_locked()
+
+    def rebuild(self) -> None:
+        """从全部会话记录重建聚合"""
+        with self._lock, locked_file(self._lock_path):
+            self._books, self._sources = {}, {}
+            self._persist_locked()
+        self.sync_all()
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def get(self, isbns: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        读取图书聚合（副本）
+
+        Args:
+            isbns: 只读取这些 ISBN（每本一次字典查找），None 表示全部
+        """
+        with self._lock:
+            self._refresh_locked()
+            if isbns is None:
+                selected: List[Tuple[str, Dict[str, Any]]] = list(self._books.items())
+            else:
+                selected = [(isbn, self._books[isbn]) for isbn in dict.fromkeys(isbns) if isbn in self._books]
+            return {isbn: json.loads(json.dumps(entry)) for isbn, entry in selected}
+
+    def tracked_sessions(self) -> Set[str]:
+        with self._lock:
+            return set(self._sources)
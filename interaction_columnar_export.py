@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+会话记录导出为列式文件（供 pandas / pyarrow / DuckDB 等直接按列读取，不再逐行解析JSON）
+
+导出三张表（每张表一个文件）：
+- queries:      聚合检索日志（QueryLogRecord），每次检索一行，query_id 为本次导出内的序号
+- query_books:  检索日志中的图书，每本一行，按 query_id 关联到 queries
+- events:       会话事件，常用字段为独立的类型化列，其余字段以JSON字符串放在 extra 列
+
+格式：
+- parquet: 每张表一个 .parquet 文件，每 chunk_rows 行写出一个行组
+- arrow:   Arrow IPC 文件（.arrow），每 chunk_rows 行写出一个记录批次，可直接内存映射读取
+- csv:     标准库 csv 写出，不需要 pyarrow
+
+记录按流式逐条处理，每张表最多缓存 chunk_rows 行，内存占用与导出的数据量无关。
+pyarrow 为可选依赖：未安装时 HAS_PYARROW 为 False，只能导出 csv。
+"""
+
+import csv
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+    HAS_PYARROW: bool = True
+except ImportError:  # pragma: no cover - 取决于运行环境
+    pa = pa_ipc = pq = None  # type: ignore[assignment]
+    HAS_PYARROW = False
+
+EXPORT_FORMATS: Tuple[str, ...] = ('parquet', 'arrow', 'csv')
+# 每张表缓存多少行后写出一个行组 / 记录批次
+EXPORT_CHUNK_ROWS: int = 50_000
+
+# 列定义：(列名, 类型)，类型为 string / int64 / float64
+Schema = List[Tuple[str, str]]
+
+QUERY_SCHEMA: Schema = [
+    ('query_id', 'int64'),
+    ('session_id', 'string'),
+    ('timestamp', 'string'),
+    ('saved_timestamp', 'string'),
+    ('query_text', 'string'),
+    ('book_count', 'int64'),
+]
+QUERY_BOOK_SCHEMA: Schema = [
+    ('query_id', 'int64'),
+    ('position', 'int64'),
+    ('title', 'string'),
+    ('author', 'string'),
+    ('isbn', 'string'),
+    ('hover_count', 'int64'),
+    ('total_hover_time_ms', 'int64'),
+    ('click_count', 'int64'),
+    ('rating', 'float64'),
+    # 理由以内容寻址方式存储时的哈希引用（内联写入的理由不导出）
+    ('logical_reason_ref', 'string'),
+    ('social_reason_ref', 'string'),
+]
+EVENT_SCHEMA: Schema = [
+    ('session_id', 'string'),
+    ('event_type', 'string'),
+    ('timestamp', 'string'),
+    ('saved_timestamp', 'string'),
+    ('event_id', 'string'),
+    ('batch_id', 'string'),
+    ('search_id', 'string'),
+    ('query', 'string'),
+    ('book_title', 'string'),
+    ('book_isbn', 'string'),
+    ('hover_duration_ms', 'int64'),
+    ('duration_ms', 'int64'),
+    ('extra', 'string'),
+]
+EXPORT_TABLES: Dict[str, Schema] = {
+    'queries': QUERY_SCHEMA,
+    'query_books': QUERY_BOOK_SCHEMA,
+    'events': EVENT_SCHEMA,
+}
+_EVENT_COLUMNS = {name for name, _ in EVENT_SCHEMA}
+_FILE_SUFFIXES = {'parquet': '.parquet', 'arrow': '.arrow', 'csv': '.csv'}
+
+
+def _coerce(value: Any, column_type: str) -> Any:
+    """按列类型转换值，无法转换时为空值"""
+    if value is None:
+        return None
+    if column_type == 'int64':
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, int):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return None
+    if column_type == 'float64':
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+class _TableWriter:
+    """单张表的分块写出器"""
+
+    def __init__(self, path: Path, schema: Schema, fmt: str):
+        self.path = path
+        self.schema = schema
+        self.fmt = fmt
+        self.rows = 0
+        self._csv_file = None
+        self._writer: Any = None
+        if fmt == 'csv':
+            self._csv_file = open(path, 'w', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._csv_file)
+            self._writer.writerow([name for name, _ in schema])
+        else:
+            types = {'string': pa.string(), 'int64': pa.int64(), 'float64': pa.float64()}
+            self._arrow_schema = pa.schema([(name, types[column_type]) for name, column_type in schema])
+            if fmt == 'parquet':
+                self._writer = pq.ParquetWriter(str(path), self._arrow_schema)
+            else:
+                self._writer = pa_ipc.new_file(str(path), self._arrow_schema)
+
+    def write(self, rows: List[List[Any]]) -> None:
+        """写出一块行（每行按列定义的顺序给出已转换的值）"""
+        if not rows:
+            return
+        self.rows += len(rows)
+        if self.fmt == 'csv':
+            self._writer.writerows(rows)
+            return
+        columns = list(zip(*rows))
+        batch = pa.record_batch(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self._arrow_schema)],
+            schema=self._arrow_schema,
+        )
+        if self.fmt == 'parquet':
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self) -> None:
+        if self._csv_file is not None:
+            self._csv_file.close()
+        elif self._writer is not None:
+            self._writer.close()
+        self._writer = None
+
+
+class ColumnarExporter:
+    """
+    把会话记录逐条写入列式表
+
+    Args:
+        output_dir: 输出目录（三张表各一个文件）
+        fmt: parquet / arrow / csv
+        chunk_rows: 每张表缓存多少行后写出一块
+    """
+
+    def __init__(self, output_dir: Path, fmt: str = 'parquet', chunk_rows: int = EXPORT_CHUNK_ROWS):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        if fmt != 'csv' and not HAS_PYARROW:
+            raise RuntimeError(f"导出 {fmt} 需要安装 pyarrow（pip install pyarrow），或改用 csv 格式")
+        self.output_dir = output_dir
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.chunk_rows = max(chunk_rows, 1)
+        self._writers = {
+            table: _TableWriter(output_dir / f"{table}{_FILE_SUFFIXES[fmt]}", schema, fmt)
+            for table, schema in EXPORT_TABLES.items()
+        }
+        self._buffers: Dict[str, List[List[Any]]] = {table: [] for table in EXPORT_TABLES}
+        self._next_query_id = 0
+
+    def _append(self, table: str, values: Dict[str, Any]) -> None:
+        buffer = self._buffers[table]
+        buffer.append([_coerce(values.get(name), column_type) for name, column_type in EXPORT_TABLES[table]])
+        if len(buffer) >= self.chunk_rows:
+            self._writers[table].write(buffer)
+            self._buffers[table] = []
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """导出一条会话记录"""
+        if record.get('event_type') is None and record.get('query_text') is not None:
+            query_id = self._next_query_id
+            self._next_query_id += 1
+            books = record.get('books') if isinstance(record.get('books'), list) else []
+            self._append('queries', {**record, 'query_id': query_id, 'book_count': len(books)})
+            for position, book in enumerate(books):
+                if isinstance(book, dict):
+                    self._append('query_books', {**book, 'query_id': query_id, 'position': position})
+            return
+
+        extra = {key: value for key, value in record.items() if key not in _EVENT_COLUMNS}
+        self._append('events', {**record, 'extra': extra or None})
+
+    def close(self) -> Dict[str, Dict[str, Any]]:
+        """写出剩余的行并关闭文件，返回 {表名: {'path': 文件路径, 'rows': 行数}}"""
+        summary = {}
+        for table, writer in self._writers.items():
+            writer.write(self._buffers[table])
+            self._buffers[table] = []
+            writer.close()
+            summary[table] = {'path': writer.path, 'rows': writer.rows}
+        return summary
+
+
+def export_session_records(records: Iterable[Dict[str, Any]], output_dir: Path, fmt: str = 'parquet',
+                           chunk_rows: int = EXPORT_CHUNK_ROWS) -> Dict[str, Dict[str, Any]]:
+    """流式导出会话记录，返回各表的文件路径和行数"""
+    exporter = ColumnarExporter(output_dir, fmt, chunk_rows)
+    try:
+        for record in records:
+            exporter.add(record)
+    finally:
+        summary = exporter.close()
+    return summary
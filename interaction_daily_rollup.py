@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+按天增量维护的统计汇总
+会话记录每次追加写入时（通过写入监听器）把新记录累加到对应日期的汇总中，
+日统计和综合报告只需读取对应日期的汇总，耗时与天数成正比，而不是与数据量成正比。
+
+统计口径与 SQLite 存储后端的日统计一致（均按服务器保存时间所在的日期归类）：
+- 检索：聚合检索日志 + search_session_start 事件，耗时取同一检索的 search_session_end
+- 面板交互：book_hover_end / book_hover 事件（悬停展开图书详情面板），耗时为悬停时长
+- 会话：当天有记录的会话数
+
+补齐 / 重建大量数据时可按会话文件分组交给进程池并行累加，每组得到按天的部分汇总，
+再按文件顺序逐天合并，结果与串行累加完全相同
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from interaction_append_tracking import AppendProgressTracker, iter_logical_chunks
+from interaction_event_writer import locked_file
+from interaction_session_segments import SessionSegmentStore
+from interaction_storage import HOVER_END_EVENT_TYPES, record_time
+
+# 汇总文件格式版本，结构变化时递增以触发重建
+ROLLUP_VERSION = 1
+# 日统计中保留的明细条数
+ROLLUP_DETAILS_LIMIT = 10
+# 各会话已累加到汇总中的逻辑字节数
+ROLLUP_SOURCES_FILE = "_sources.json"
+# 多个进程（Web服务、命令行工具）更新汇总时互斥用的锁文件
+ROLLUP_LOCK_FILE = ".lock"
+# 追加写入时累加结果写回磁盘的最小间隔（秒）；未写出的累加在退出 / close 时写出，
+# 进程异常退出时丢失的进度由下次补齐重新累加
+ROLLUP_PERSIST_INTERVAL_SECONDS: float = 5.0
+# 并行累加时每个进程平均分到的文件组数（组越多负载越均衡，合并开销也越大）
+ROLLUP_GROUPS_PER_WORKER = 4
+
+# 未能在本组内配对的检索结束事件：(会话|search_id, 日期, 耗时)
+UnmatchedEnd = Tuple[str, str, int]
+
+
+def _new_rollup(day: str) -> Dict[str, Any]:
+    """空的日汇总"""
+    return {
+        'version': ROLLUP_VERSION,
+        'date': day,
+        'total_searches': 0,
+        'total_search_duration_ms': 0,
+        'queries': {},            # 查询文本 -> 次数（用于唯一查询数）
+        'search_details': [],
+        'open_searches': {},      # "会话|search_id" -> search_details 下标（-1 表示未保留明细）
+        'total_panel_interactions': 0,
+        'total_panel_duration_ms': 0,
+        'books': {},              # 书名 -> 面板交互次数（用于查看的书籍数）
+        'panel_details': [],
+        'sessions': {},           # 会话 -> 当天记录数
+    }
+
+
+def _number(value: Any) -> int:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+class _RollupFolder:
+    """
+    把会话记录累加为按天的汇总（仅在内存中），并行累加时在工作进程中使用
+    配对不到开始事件的检索结束事件记入 unmatched_ends，由合并方在完整的汇总中配对
+    """
+
+    def __init__(self):
+        self._rollups: Dict[str, Dict[str, Any]] = {}
+        self.unmatched_ends: Optional[List[UnmatchedEnd]] = []
+
+    def _rollup(self, day: str) -> Dict[str, Any]:
+        rollup = self._rollups.get(day)
+        if rollup is None:
+            rollup = self._rollups[day] = _new_rollup(day)
+        return rollup
+
+
+    def _fold_record(self, session_key: str, record: Dict[str, Any], touched: Set[str]) -> None:
+        """将一条会话记录累加到其日期的汇总中，涉及的日期加入 touched"""
+        time_key = record_time(record)
+        if not time_key:
+            return
+        day = time_key[:10]
+        try:
+            date.fromisoformat(day)
+        except ValueError:
+            return
+        touched.add(day)
+        rollup = self._rollup(day)
+        rollup['sessions'][session_key] = rollup['sessions'].get(session_key, 0) + 1
+
+        event_type = record.get('event_type')
+        is_query_log = event_type is None and 'query_text' in record
+        if is_query_log or event_type == 'search_session_start':
+            query = (record.get('query_text') if is_query_log else record.get('query')) or ''
+            rollup['total_searches'] += 1
+            rollup['queries'][query] = rollup['queries'].get(query, 0) + 1
+            detail_index = -1
+            if len(rollup['search_details']) < ROLLUP_DETAILS_LIMIT:
+                rollup['search_details'].append({'query': query, 'duration_ms': 0})
+                detail_index = len(rollup['search_details']) - 1
+            if event_type == 'search_session_start' and record.get('search_id'):
+                rollup['open_searches'][f"{session_key}|{record['search_id']}"] = detail_index
+        elif event_type == 'search_session_end':
+            search_key = f"{session_key}|{record.get('search_id')}"
+            duration = _number(record.get('duration_ms'))
+            if not self._close_search(search_key, day, duration, touched) and self.unmatched_ends is not None:
+                self.unmatched_ends.append((search_key, day, duration))
+        elif event_type in HOVER_END_EVENT_TYPES:
+            duration = _number(record.get('hover_duration_ms'))
+            title = record.get('book_title') or ''
+            rollup['total_panel_interactions'] += 1
+            rollup['total_panel_duration_ms'] += duration
+            rollup['books'][title] = rollup['books'].get(title, 0) + 1
+            if len(rollup['panel_details']) < ROLLUP_DETAILS_LIMIT:
+                rollup['panel_details'].append({'book_title': title, 'duration_ms': duration})
+
+    def _close_search(self, search_key: str, day: str, duration: int, touched: Set[str]) -> bool:
+        """把检索耗时记到对应的检索上；检索可能跨越午夜：先找当天，再找前一天开始的检索"""
+        previous_day = (date.fromisoformat(day) - timedelta(days=1)).isoformat()
+        for start_day in (day, previous_day):
+            start_rollup = self._rollup(start_day)
+            if search_key in start_rollup['open_searches']:
+                detail_index = start_rollup['open_searches'].pop(search_key)
+                start_rollup['total_search_duration_ms'] += duration
+                if detail_index >= 0:
+                    start_rollup['search_details'][detail_index]['duration_ms'] = duration
+                touched.add(start_day)
+                return True
+        return False
+
+    def _fold_bytes(self, session_key: str, data: bytes, touched: Set[str]) -> int:
+        """累加一段JSONL字节中的完整行，返回实际消费的字节数"""
+        consumed = data.rfind(b'\n') + 1
+        for raw_line in data[:consumed].splitlines():
+            line = raw_line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                self._fold_record(session_key, record, touched)
+        return consumed
+
+    def _fold_file(self, session_file: Path, start: int,
+                   segments: Optional[SessionSegmentStore], touched: Set[str]) -> int:
+        """从逻辑偏移 start 起累加一个会话（含已轮转的分段），返回累加到的逻辑偏移"""
+        covered = start
+        for position, chunk in iter_logical_chunks(session_file, start, segments):
+            covered = position + self._fold_bytes(session_file.stem, chunk, touched)
+        return covered
+
+
+def _fold_session_group(session_dir: str, use_segments: bool, tasks: List[Tuple[str, int]]
+                        ) -> Tuple[Dict[str, int], Dict[str, Dict[str, Any]], List[UnmatchedEnd]]:
+    """
+    进程池工作函数：累加一组会话 [(文件名, 起始逻辑偏移)]
+    返回 (各会话累加到的逻辑偏移, 按天的部分汇总, 未配对的检索结束事件)
+    """
+    directory = Path(session_dir)
+    segments = SessionSegmentStore(directory) if use_segments else None
+    folder = _RollupFolder()
+    covered: Dict[str, int] = {}
+    touched: Set[str] = set()
+    for file_name, start in tasks:
+        session_file = directory / file_name
+        try:
+            covered[session_file.stem] = folder._fold_file(session_file, start, segments, touched)
+        except Exception as e:
+            print(f"补齐日汇总失败 {session_file}: {str(e)}")
+    return covered, folder._rollups, folder.unmatched_ends or []
+
+
+def _group_tasks(tasks: List[Tuple[str, int, int]], group_count: int) -> List[List[Tuple[str, int]]]:
+    """按待累加的字节数把 [(文件名, 起点, 终点)] 切分为至多 group_count 个连续的文件组"""
+    target = max(sum(end - start for _, start, end in tasks) // max(group_count, 1), 1)
+    groups: List[List[Tuple[str, int]]] = [[]]
+    group_bytes = 0
+    for file_name, start, end in tasks:
+        if group_bytes >= target and len(groups) < group_count:
+            groups.append([])
+            group_bytes = 0
+        groups[-1].append((file_name, start))
+        group_bytes += end - start
+    return groups
+
+
+def _merge_rollup(total: Dict[str, Any], partial: Dict[str, Any]) -> None:
+    """把同一天的部分汇总合并到 total（partial 中的记录都在 total 已有记录之后）"""
+    for field in ('total_searches', 'total_search_duration_ms',
+                  'total_panel_interactions', 'total_panel_duration_ms'):
+        total[field] += partial[field]
+    for field in ('queries', 'books', 'sessions'):
+        counts = total[field]
+        for key, count in partial[field].items():
+            counts[key] = counts.get(key, 0) + count
+
+    remapped: Dict[int, int] = {}
+    for index, detail in enumerate(partial['search_details']):
+        if len(total['search_details']) >= ROLLUP_DETAILS_LIMIT:
+            break
+        total['search_details'].append(detail)
+        remapped[index] = len(total['search_details']) - 1
+    for search_key, index in partial['open_searches'].items():
+        total['open_searches'][search_key] = remapped.get(index, -1)
+    room = ROLLUP_DETAILS_LIMIT - len(total['panel_details'])
+    total['panel_details'].extend(partial['panel_details'][:max(room, 0)])
+
+
+class DailyRollupStore(_RollupFolder, AppendProgressTracker):
+    """
+    日汇总存储
+    - rollup_dir/<YYYY-MM-DD>.json 每天一个汇总文件，只重写本次写入涉及的日期
+    - rollup_dir/_sources.json 记录各会话已累加的逻辑字节数（已轮转分段 + 活跃文件），
+      追加写入起点与之相符才直接累加；其他进程写入或已有的历史数据在读取前补齐；
+      会话文件变短（被截断 / 改写）时整体重建
+    - 更新持有 rollup_dir/.lock 的文件锁；其他进程写出过新的累加进度时，
+      先丢弃内存中的汇总并重新加载，避免重复累加
+    - 追加写入的累加先留在内存中，按 ROLLUP_PERSIST_INTERVAL_SECONDS 间隔写回，flush() 立即写回
+    """
+
+    def __init__(self, session_dir: Path, rollup_dir: Path,
+                 segments: Optional[SessionSegmentStore] = None):
+        self.session_dir = session_dir
+        self.rollup_dir = rollup_dir
+        self.segments = segments
+        self.rollup_dir.mkdir(parents=True, exist_ok=True)
+        self._lock_path = self.rollup_dir / ROLLUP_LOCK_FILE
+        self._lock_path.touch(exist_ok=True)
+        self._rollups: Dict[str, Dict[str, Any]] = {}
+        # 串行累加时所有开始事件都在汇总中，配对不到的结束事件直接忽略
+        self.unmatched_ends = None
+        self._lock = threading.Lock()
+        self._sources_stamp: Optional[Tuple[int, int]] = None
+        self._sources: Dict[str, int] = {}
+        # 尚未写回磁盘的累加：是否有变化、涉及的日期
+        self._dirty = False
+        self._dirty_days: Set[str] = set()
+        self._last_persist = 0.0
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def _sources_file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = (self.rollup_dir / ROLLUP_SOURCES_FILE).stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh_locked(self) -> None:
+        """
+        累加进度文件被其他进程更新过时，重新加载进度并丢弃内存中的日汇总（需持有锁；
+        本进程未写出的累加随之丢弃，稍后补齐）
+        """
+        stamp = self._sources_file_stamp()
+        if stamp is not None and stamp == self._sources_stamp:
+            return
+        self._rollups = {}
+        self._sources = {}
+        self._sources_stamp = stamp
+        self._dirty, self._dirty_days = False, set()
+        try:
+            with open(self.rollup_dir / ROLLUP_SOURCES_FILE, 'r', encoding='utf-8') as f:
+                sources = json.load(f)
+            if sources.get('version') == ROLLUP_VERSION:
+                self._sources = sources['sessions']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _write_json(self, path: Path, data: Dict[str, Any]) -> None:
+        """原子地写出JSON文件（先写临时文件再替换）"""
+        tmp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _persist(self, days: Iterable[str]) -> None:
+        """写出发生变化的日汇总（含此前未写出的），最后写出累加进度"""
+        for day in self._dirty_days.union(days):
+            self._write_json(self.rollup_dir / f"{day}.json", self._rollups[day])
+        self._write_json(self.rollup_dir / ROLLUP_SOURCES_FILE,
+                         {'version': ROLLUP_VERSION, 'sessions': self._sources})
+        self._sources_stamp = self._sources_file_stamp()
+        self._dirty, self._dirty_days = False, set()
+        self._last_persist = time.monotonic()
+
+    def flush(self) -> None:
+        """把内存中尚未写出的累加写回磁盘"""
+        with self._lock, locked_file(self._lock_path):
+            if self._dirty and self._sources_file_stamp() == self._sources_stamp:
+                self._persist(())
+
+    def _rollup(self, day: str) -> Dict[str, Any]:
+        """从内存或汇总文件加载日汇总；不存在或版本不符时返回空汇总"""
+        rollup = self._rollups.get(day)
+        if rollup is not None:
+            return rollup
+        try:
+            with open(self.rollup_dir / f"{day}.json", 'r', encoding='utf-8') as f:
+                rollup = json.load(f)
+            if rollup.get('version') != ROLLUP_VERSION:
+                rollup = _new_rollup(day)
+        except (OSError, ValueError):
+            rollup = _new_rollup(day)
+        self._rollups[day] = rollup
+        return rollup
+
+    # ------------------------------------------------------------------
+    # 累加
+    # ------------------------------------------------------------------
+
+    def on_append(self, session_file: Path, start_offset: int, data: bytes) -> None:
+        """追加写入监听器：累加进度恰好覆盖到写入起点时，直接累加新写入的行，按间隔写回磁盘"""
+        logical_start = self._append_start(session_file, start_offset)
+        if logical_start is None:
+            return
+        session_key = session_file.stem
+        with self._lock, locked_file(self._lock_path):
+            self._refresh_locked()
+            if self._sources.get(session_key, 0) != logical_start:
+                return
+            self._sources[session_key] = logical_start + self._fold_bytes(session_key, data, self._dirty_days)
+            self._dirty = True
+            if time.monotonic() - self._last_persist >= ROLLUP_PERSIST_INTERVAL_SECONDS:
+                self._persist(())
+
+    def _catch_up_locked(self, session_file: Path, start: int, touched: Set[str]) -> None:
+        """从逻辑偏移 start 起补齐一个会话（需持有 self._lock）"""
+        self._sources[session_file.stem] = self._fold_file(session_file, start, self.segments, touched)
+
+    def _fold_parallel_locked(self, tasks: List[Tuple[Path, int, int]], workers: int,
+                              touched: Set[str]) -> None:
+        """
+        用进程池补齐多个会话（需持有 self._lock）
+        会话按文件顺序切分为若干连续的文件组，各组的部分汇总按组的顺序逐天合并，
+        同一会话总在同一组内，因此合并结果与按同样顺序串行累加相同
+        """
+        groups = _group_tasks([(f.name, start, end) for f, start, end in tasks],
+                              workers * ROLLUP_GROUPS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=min(workers, len(groups))) as executor:
+            results = executor.map(_fold_session_group,
+                                   [str(self.session_dir)] * len(groups),
+                                   [self.segments is not None] * len(groups),
+                                   groups)
+            for covered, partial, unmatched in results:
+                # 本组之前写入的开始事件只在已有汇总中：先配对结束事件，再合并本组新开始的检索
+                for search_key, day, duration in unmatched:
+                    self._close_search(search_key, day, duration, touched)
+                for day in sorted(partial):
+                    _merge_rollup(self._rollup(day), partial[day])
+                    touched.add(day)
+                self._sources.update(covered)
+
+    def sync_all(self, workers: int = 1) -> None:
+        """
+        补齐所有会话（只对比逻辑长度，未变化的会话不读取）；有会话变短时整体重建
+        workers > 1 且有多个会话需要补齐时，用进程池并行累加
+        """
+        sizes = self._logical_sizes()
+        with self._lock, locked_file(self._lock_path):
+            self._refresh_locked()
+            touched: Set[str] = set()
+            if self._shrunk(self._sources, sizes):
+                touched = self._reset_locked()
+            tasks = self._pending_ranges(self._sources, sizes)
+            if workers > 1 and len(tasks) > 1:
+                self._fold_parallel_locked(tasks, workers, touched)
+            else:
+                for session_file, covered, _ in tasks:
+                    try:
+                        self._catch_up_locked(session_file, covered, touched)
+                    except Exception as e:
+                        print(f"补齐日汇总失败 {session_file}: {str(e)}")
+            if touched:
+                self._persist(touched)
+
+    def _reset_locked(self) -> Set[str]:
+        """清空全部汇总，返回需要重写的日期（原有日期写出为空汇总）"""
+        days = {path.stem for path in self.rollup_dir.glob("????-??-??.json")}
+        self._rollups = {day: _new_rollup(day) for day in days}
+        self._sources = {}
+        self._dirty, self._dirty_days = False, set()
+        return days
+
+    def rebuild(self, workers: int = 1) -> None:
+        """从全部会话记录重建汇总"""
+        with self._lock, locked_file(self._lock_path):
+            touched = self._reset_locked()
+            self._persist(touched)
+        self.sync_all(workers)
+
+    # ------------------------------------------------------------------
+    # 报告
+    # ------------------------------------------------------------------
+
+    def daily_data(self, target_date: date) -> Dict[str, Any]:
+        """指定日期的统计数据（结构与 StatsManager._collect_daily_data 相同）"""
+        day = target_date.strftime('%Y-%m-%d')
+        with self._lock:
+            self._refresh_locked()
+            rollup = self._rollup(day)
+            total_searches = rollup['total_searches']
+            total_search_duration = rollup['total_search_duration_ms']
+            return {
+                'date': day,
+                'daily_statistics': {
+                    'total_searches': total_searches,
+                    'total_panel_interactions': rollup['total_panel_interactions'],
+                    'total_sessions': len(rollup['sessions']),
+                    'search_details': [dict(detail) for detail in rollup['search_details']],
+                    'panel_details': [dict(detail) for detail in rollup['panel_details']],
+                    'summary': {
+                        'total_search_duration_ms': total_search_duration,
+                        'average_search_duration_ms': total_search_duration / max(total_searches, 1),
+                        'unique_queries': len(rollup['queries']),
+                        'total_panel_duration_ms': rollup['total_panel_duration_ms'],
+                        'unique_books_viewed': len(rollup['books'])
+                    }
+                }
+            }
+
+    def day_counts(self, days: List[date]) -> List[Dict[str, Any]]:
+        """多天的计数汇总（综合报告用）"""
+        counts = []
+        with self._lock:
+            self._refresh_locked()
+            for target_date in days:
+                day = target_date.strftime('%Y-%m-%d')
+                rollup = self._rollup(day)
+                counts.append({
+                    'date': day,
+                    'total_searches': rollup['total_searches'],
+                    'total_sessions': len(rollup['sessions']),
+                    'total_panel_interactions': rollup['total_panel_interactions'],
+                })
+        return counts
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+会话事件写入前的合并
+前端的心跳、悬停开始 / 结束事件各占一行JSONL，分析时还要逐条重新配对。写入前在内存中合并：
+
+- 连续的 heartbeat 合并为一条 activity_span（起止时间、心跳次数、期间活跃的检索）
+- 同一本书的 book_hover_start / book_hover_end 合并为一条 book_hover（含悬停起止时间和时长）
+- 其余事件原样通过，不打断活动区间；page_hidden / session_end 会结束当前的活动区间
+
+合并记录在闭合时才写出，而期间的其他事件已经先写出。为使会话文件仍按 timestamp 有序，
+暂存记录的 timestamp 取写出前会话中最晚事件的客户端时间（悬停即结束事件的时间），
+本身的起止时间见 span_start / span_end、hover_start_timestamp / hover_end_timestamp
+（未配对、按原始事件写出的悬停开始事件也把原时间移到 hover_start_timestamp）。
+
+尚未闭合的活动区间和悬停暂存在内存中，闭合、空闲超时或区间持续过久后写出（由调用方定期
+调用 drain()）；写出时 saved_timestamp 取实际写出的时间，保证会话文件仍按 saved_timestamp 顺序追加。
+合并后的记录在 coalesced_event_ids 中保留被合并事件的 event_id（用于幂等去重），没有时省略该字段。
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+HEARTBEAT_EVENT_TYPE = 'heartbeat'
+ACTIVITY_SPAN_EVENT_TYPE = 'activity_span'
+HOVER_START_EVENT_TYPE = 'book_hover_start'
+HOVER_END_EVENT_TYPE = 'book_hover_end'
+HOVER_EVENT_TYPE = 'book_hover'
+# 结束当前活动区间的事件
+SPAN_BREAKING_EVENT_TYPES = ('page_hidden', 'session_end')
+# 前端每30秒一次心跳，相邻心跳间隔超过该值视为活动中断，开始新的区间
+ACTIVITY_SPAN_MAX_GAP_SECONDS: float = 90
+# 持续有心跳的区间暂存超过该时长也会写出（之后的心跳开始新区间），限制进程被强制结束时丢失的心跳
+ACTIVITY_SPAN_MAX_PENDING_SECONDS: float = 300
+# 暂存的悬停开始事件超过该时长仍未等到结束事件时，按原始事件写出
+PENDING_HOVER_MAX_IDLE_SECONDS: float = 600
+
+# 心跳事件中只对单次心跳有意义、合并后丢弃的字段
+_HEARTBEAT_ONLY_FIELDS = ('event_id', 'active_search_session', 'pending_events_count',
+                          'timestamp_since_session_start')
+
+
+def _event_epoch(record: Dict[str, Any]) -> Optional[float]:
+    """事件的客户端时间（epoch 秒），无法解析时返回 None"""
+    value = record.get('timestamp')
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def _hover_key(record: Dict[str, Any]) -> str:
+    return str(record.get('book_isbn') or record.get('isbn') or record.get('book_title') or '')
+
+
+def _event_ids(*records: Dict[str, Any]) -> List[str]:
+    ids: List[str] = []
+    for record in records:
+        ids.extend(record.get('coalesced_event_ids') or [])
+        if record.get('event_id'):
+            ids.append(str(record['event_id']))
+    return ids
+
+
+class _SessionState:
+    """单个会话暂存的活动区间和悬停开始事件"""
+
+    def __init__(self):
+        self.span: Optional[Dict[str, Any]] = None
+        self.span_first_event: Optional[float] = None  # 区间第一次心跳的客户端时间（epoch 秒）
+        self.span_last_event: Optional[float] = None   # 区间最后一次心跳的客户端时间
+        self.span_opened = 0.0                          # 区间开始暂存的服务器时间（monotonic）
+        self.span_updated = 0.0                         # 区间最后一次更新的服务器时间（monotonic）
+        self.hovers: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        self.latest: Optional[Tuple[float, str]] = None  # 有暂存记录期间会话中最晚的事件 (epoch, timestamp)
+
+    def empty(self) -> bool:
+        return self.span is None and not self.hovers
+
+
+class EventCoalescer:
+    """按会话在写入前合并心跳和悬停事件（线程安全）"""
+
+    def __init__(self, span_max_gap_seconds: float = ACTIVITY_SPAN_MAX_GAP_SECONDS,
+                 hover_max_idle_seconds: float = PENDING_HOVER_MAX_IDLE_SECONDS,
+                 span_max_pending_seconds: float = ACTIVITY_SPAN_MAX_PENDING_SECONDS):
+        self.span_max_gap_seconds = span_max_gap_seconds
+        self.span_max_pending_seconds = span_max_pending_seconds
+        self.hover_max_idle_seconds = hover_max_idle_seconds
+        self._sessions: Dict[str, _SessionState] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(record: Dict[str, Any], saved_timestamp: str) -> Dict[str, Any]:
+        record['saved_timestamp'] = saved_timestamp
+        return record
+
+    @staticmethod
+    def _set_event_ids(record: Dict[str, Any], ids: List[str]) -> None:
+        if ids:
+            record['coalesced_event_ids'] = ids
+        else:
+            record.pop('coalesced_event_ids', None)
+
+    def _close_span(self, state: _SessionState, saved_timestamp: str) -> List[Dict[str, Any]]:
+        if state.span is None:
+            return []
+        span = self._stamp(state.span, saved_timestamp)
+        self._set_event_ids(span, span.get('coalesced_event_ids') or [])
+        if state.latest is not None:
+            span['timestamp'] = state.latest[1]
+        state.span = None
+        state.span_last_event = None
+        return [span]
+
+    def _add_heartbeat(self, state: _SessionState, record: Dict[str, Any],
+                       saved_timestamp: str) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        event_time = _event_epoch(record)
+        if state.span is not None and (
+                event_time is None or state.span_last_event is None
+                or event_time - state.span_last_event > self.span_max_gap_seconds):
+            out.extend(self._close_span(state, saved_timestamp))
+
+        active_search = record.get('active_search_session')
+        if state.span is None:
+            span = {key: value for key, value in record.items() if key not in _HEARTBEAT_ONLY_FIELDS}
+            span.update({
+                'event_type': ACTIVITY_SPAN_EVENT_TYPE,
+                'span_start': record.get('timestamp'),
+                'span_end': record.get('timestamp'),
+                'duration_ms': 0,
+                'heartbeat_count': 1,
+                'active_search_sessions': [active_search] if active_search else [],
+                'coalesced_event_ids': _event_ids(record),
+            })
+            state.span = span
+            state.span_first_event = event_time
+            state.span_opened = time.monotonic()
+        else:
+            span = state.span
+            span['span_end'] = record.get('timestamp')
+            span['heartbeat_count'] += 1
+            if event_time is not None and state.span_first_event is not None:
+                span['duration_ms'] = int((event_time - state.span_first_event) * 1000)
+            if active_search and active_search not in span['active_search_sessions']:
+                span['active_search_sessions'].append(active_search)
+            span['coalesced_event_ids'].extend(_event_ids(record))
+        state.span_last_event = event_time
+        state.span_updated = time.monotonic()
+        return out
+
+    @staticmethod
+    def _note_event(state: _SessionState, record: Dict[str, Any]) -> None:
+        """记录暂存期间会话中最晚的事件时间（作为暂存记录写出时的 timestamp）"""
+        event_time = _event_epoch(record)
+        if event_time is not None and (state.latest is None or event_time >= state.latest[0]):
+            state.latest = (event_time, record['timestamp'])
+
+    def _release_hover_start(self, state: _SessionState, record: Dict[str, Any],
+                             saved_timestamp: str) -> Dict[str, Any]:
+        """未配对的悬停开始事件按原始事件写出，原时间移到 hover_start_timestamp"""
+        if state.latest is not None and state.latest[1] != record.get('timestamp'):
+            record['hover_start_timestamp'] = record.get('timestamp')
+            record['timestamp'] = state.latest[1]
+        return self._stamp(record, saved_timestamp)
+
+    @staticmethod
+    def _merge_hover(start: Dict[str, Any], end: Dict[str, Any]) -> Dict[str, Any]:
+        """悬停开始 + 结束 -> 一条 book_hover（元数据和 timestamp 取结束事件，即本次写入）"""
+        merged = {**start, **end}
+        merged.pop('event_id', None)
+        duration = end.get('hover_duration_ms')
+        if not isinstance(duration, (int, float)) or isinstance(duration, bool):
+            start_time, end_time = _event_epoch(start), _event_epoch(end)
+            duration = int((end_time - start_time) * 1000) if start_time and end_time else 0
+        merged.update({
+            'event_type': HOVER_EVENT_TYPE,
+            'hover_start_timestamp': start.get('timestamp'),
+            'hover_end_timestamp': end.get('timestamp'),
+            'hover_duration_ms': duration,
+        })
+        EventCoalescer._set_event_ids(merged, _event_ids(start, end))
+        return merged
+
+    def process(self, session_id: str, records: List[Dict[str, Any]],
+                saved_timestamp: str) -> List[Dict[str, Any]]:
+        """
+        合并一批记录，返回本次需要写出的记录（按写出顺序）；未闭合的区间 / 悬停暂存到后续批次
+
+        Args:
+            session_id: 会话ID
+            records: 已附加元数据的事件记录
+            saved_timestamp: 本次写入的服务器保存时间（用于此前暂存、本次写出的记录）
+        """
+        with self._lock:
+            state = self._sessions.get(session_id) or _SessionState()
+            out: List[Dict[str, Any]] = []
+            for record in records:
+                event_type = record.get('event_type')
+                if event_type == HEARTBEAT_EVENT_TYPE:
+                    out.extend(self._add_heartbeat(state, record, saved_timestamp))
+                elif event_type == HOVER_START_EVENT_TYPE:
+                    key = _hover_key(record)
+                    if key in state.hovers:
+                        # 上一次悬停没有结束事件，按原始事件写出
+                        out.append(self._release_hover_start(state, state.hovers.pop(key)[0], saved_timestamp))
+                    state.hovers[key] = (record, time.monotonic())
+                elif event_type == HOVER_END_EVENT_TYPE:
+                    pending = state.hovers.pop(_hover_key(record), None)
+                    out.append(self._merge_hover(pending[0], record) if pending else record)
+                else:
+                    if event_type in SPAN_BREAKING_EVENT_TYPES:
+                        out.extend(self._close_span(state, saved_timestamp))
+                    if event_type == 'session_end':
+                        out.extend(self._release_hover_start(state, pending[0], saved_timestamp)
+                                   for pending in state.hovers.values())
+                        state.hovers.clear()
+                    out.append(record)
+                if not state.empty():
+                    self._note_event(state, record)
+            if state.empty():
+                self._sessions.pop(session_id, None)
+            else:
+                self._sessions[session_id] = state
+            return out
+
+    def drain(self, saved_timestamp: str, idle_only: bool = True) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        取出需要写出的暂存记录：{session_id: 记录列表}
+
+        Args:
+            saved_timestamp: 写出时的服务器保存时间
+            idle_only: 为 True 时只取出已超时（或暂存过久）的活动区间和悬停，否则全部取出（如服务退出时）
+        """
+        now = time.monotonic()
+        drained: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            for session_id, state in list(self._sessions.items()):
+                out: List[Dict[str, Any]] = []
+                if state.span is not None and (not idle_only
+                                               or now - state.span_updated > self.span_max_gap_seconds
+                                               or now - state.span_opened > self.span_max_pending_seconds):
+                    out.extend(self._close_span(state, saved_timestamp))
+                for key, (record, received) in list(state.hovers.items()):
+                    if not idle_only or now - received > self.hover_max_idle_seconds:
+                        out.append(self._release_hover_start(state, record, saved_timestamp))
+                        del state.hovers[key]
+                if out:
+                    drained[session_id] = out
+                if state.empty():
+                    del self._sessions[session_id]
+        return drained
+
+    def pending_count(self) -> int:
+        """暂存中的活动区间和悬停数量"""
+        with self._lock:
+            return sum((state.span is not None) + len(state.hovers) for state in self._sessions.values())
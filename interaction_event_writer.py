@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+交互事件缓冲写入器
+将会话 JSONL 追加写入从请求线程中移出：请求线程只负责把序列化好的行放入内存队列，
+后台线程按会话文件分组，一次打开、一次写入，按数量或时间触发刷新。
+
+JSONL 以换行为记录边界：一行只有写入了结尾的换行才算完整。进程在 write() 中途退出（或写入失败）时，
+文件末尾会留下没有换行的半行；下一次追加前（持有文件锁）先把半行移入同目录下的 quarantine/ 再截断，
+新记录总是从行首开始写入，不会与半行拼接成一条无法解析的记录。
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:  # Windows 下没有 fcntl，只保留进程内线程锁
+    fcntl = None  # type: ignore[assignment]
+    HAS_FCNTL = False
+
+# fsync 策略
+FSYNC_NEVER = "never"          # 只写入操作系统缓存，由系统决定落盘时机
+FSYNC_BATCH = "batch"          # 每次批量刷新后对写过的文件 fsync
+FSYNC_INTERVAL = "interval"    # 同一文件最多每 fsync_interval_seconds 秒 fsync 一次
+FSYNC_POLICIES = (FSYNC_NEVER, FSYNC_BATCH, FSYNC_INTERVAL)
+
+# 被截断的不完整末尾行的存放目录（位于被修复文件所在目录下）
+QUARANTINE_DIR_NAME = "quarantine"
+# 查找不完整末尾行的起点时每次向前读取的字节数
+TORN_TAIL_SCAN_CHUNK_SIZE = 64 * 1024
+
+
+class PartialAppendError(OSError):
+    """
+    追加写入中途失败：committed 为已完整写入文件的前缀字节数（总在行边界上），
+    这些行已经在文件中（并已通知监听器），调用方只应重试其后的部分；
+    committed 等于全部字节时说明数据已写入、只是 fsync 失败
+    """
+
+    def __init__(self, file_path: Path, start_offset: int, committed: int, cause: OSError):
+        super().__init__(cause.errno, f"追加写入 {file_path} 失败（已写入 {committed} 字节）: {cause}")
+        self.start_offset = start_offset
+        self.committed = committed
+
+
+# 进程内的文件锁：绝对路径 -> 线程锁
+_file_locks: Dict[str, threading.Lock] = {}
+_file_locks_guard = threading.Lock()
+
+
+def get_file_lock(file_path: Path) -> threading.Lock:
+    """获取指定文件的进程内线程锁（同一路径始终返回同一把锁）"""
+    key = os.path.abspath(str(file_path))
+    with _file_locks_guard:
+        lock = _file_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _file_locks[key] = lock
+        return lock
+
+
+def _open_locked_for_append(file_path: Path):
+    """
+    以追加模式打开文件并持有 flock
+    等待锁期间文件可能被轮转（改名为分段并重新创建），
+    加锁后若路径已指向另一个文件则重新打开，避免写入已被轮转走的旧文件
+    """
+    while True:
+        # a+b：写入总是追加到末尾，同时可以读取（检查末尾是否为不完整的行）
+        f = open(file_path, 'a+b')
+        if not HAS_FCNTL:
+            return f
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            if os.stat(file_path).st_ino == os.fstat(f.fileno()).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
+
+
+@contextmanager
+def locked_file(file_path: Path) -> Iterator[None]:
+    """
+    持有与 append_text 相同的文件锁（线程锁 + flock），
+    用于在不写入数据文件的情况下与写入者互斥（如补齐索引）
+    注意：不可在追加写入监听器内部调用，否则会死锁
+    """
+    with get_file_lock(file_path):
+        if not HAS_FCNTL or not os.path.exists(file_path):
+            yield
+            return
+        f = _open_locked_for_append(file_path)
+        with f:
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def find_torn_tail(f, size: int) -> int:
+    """
+    文件末尾不完整行（没有结尾换行）的起始偏移；文件为空或以换行结尾时返回 size
+
+    Args:
+        f: 以可读方式打开的二进制文件
+        size: 文件大小
+    """
+    if size == 0:
+        return size
+    f.seek(size - 1)
+    if f.read(1) == b'\n':
+        return size
+    position = size
+    while position > 0:
+        read_size = min(TORN_TAIL_SCAN_CHUNK_SIZE, position)
+        f.seek(position - read_size)
+        newline = f.read(read_size).rfind(b'\n')
+        if newline != -1:
+            return position - read_size + newline + 1
+        position -= read_size
+    return 0
+
+
+def _quarantine_torn_tail(file_path: Path, f, start: int, size: int) -> Path:
+    """把 [start, size) 的不完整行写入隔离目录后截断文件（需持有文件锁）"""
+    f.seek(start)
+    data = f.read(size - start)
+    quarantine_dir = file_path.parent / QUARANTINE_DIR_NAME
+    quarantine_dir.mkdir(parents=True, exist_ok=True)
+    target = quarantine_dir / f"{file_path.name}.{start}-{size}.{time.strftime('%Y%m%d%H%M%S')}.torn"
+    with open(target, 'wb') as q:
+        q.write(data)
+        q.flush()
+        os.fsync(q.fileno())
+    # 先保存再截断：截断前中断时只会多出一份隔离文件
+    f.truncate(start)
+    f.flush()
+    os.fsync(f.fileno())
+    print(f"已隔离不完整的末尾行 {file_path} [{start}, {size}) -> {target}")
+    return target
+
+
+def repair_torn_tail(file_path: Path) -> Optional[Path]:
+    """
+    持有文件锁检查文件末尾，有不完整的行时隔离并截断
+
+    Returns:
+        隔离文件路径；文件完整（或不存在）时返回 None
+    """
+    if not os.path.exists(file_path):
+        return None
+    with get_file_lock(file_path):
+        f = _open_locked_for_append(file_path)
+        with f:
+            try:
+                size = f.seek(0, os.SEEK_END)
+                torn_start = find_torn_tail(f, size)
+                if torn_start < size:
+                    return _quarantine_torn_tail(file_path, f, torn_start, size)
+                return None
+            finally:
+                if HAS_FCNTL:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+# 追加写入监听器：(文件路径, 起始偏移, 写入的字节) -> None
+AppendListener = Callable[[Path, int, bytes], None]
+
+
+class AppendListeners:
+    """
+    一组追加写入监听器（由使用者持有，如每个 StatsManager 一组，可随时移除）
+
+    - append_text 在持有文件锁时只把通知放入该文件的队列，释放锁之后才调用监听器，
+      监听器再慢也不会阻塞其他写入者拿锁写入
+    - 同一文件的通知按写入顺序送达：同一时刻只有一个线程在送达该文件的通知，
+      其他线程发现有人正在送达时直接返回，由正在送达的线程一并处理
+    - 文件被改名 / 截断前（持有文件锁）应先调用 drain()，保证监听器看到的偏移与写入时一致
+    - 监听器不可获取被写入文件的文件锁（locked_file），否则 drain() 会死锁
+    """
+
+    def __init__(self):
+        self._listeners: List[AppendListener] = []
+        self._guard = threading.Lock()
+        # 文件绝对路径 -> 待送达的 (文件路径, 起始偏移, 写入的字节)
+        self._queues: Dict[str, Deque[Tuple[Path, int, bytes]]] = {}
+        # 文件绝对路径 -> 送达锁
+        self._dispatch_locks: Dict[str, threading.Lock] = {}
+
+    def add(self, listener: AppendListener) -> None:
+        """注册监听器（重复注册同一监听器无效）"""
+        with self._guard:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove(self, listener: AppendListener) -> None:
+        """移除监听器（未注册时忽略）"""
+        with self._guard:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def clear(self) -> None:
+        """移除全部监听器并丢弃尚未送达的通知"""
+        with self._guard:
+            self._listeners = []
+            self._queues.clear()
+
+    def _enqueue(self, file_path: Path, start_offset: int, data: bytes) -> None:
+        """记录一次写入（由 append_text 在持有文件锁时调用）"""
+        key = os.path.abspath(str(file_path))
+        with self._guard:
+            if not self._listeners:
+                return
+            self._queues.setdefault(key, deque()).append((file_path, start_offset, data))
+            self._dispatch_locks.setdefault(key, threading.Lock())
+
+    def _pop(self, key: str) -> Optional[Tuple[List[AppendListener], Tuple[Path, int, bytes]]]:
+        with self._guard:
+            queue = self._queues.get(key)
+            if not queue:
+                return None
+            return list(self._listeners), queue.popleft()
+
+    def _has_pending(self, key: str) -> bool:
+        with self._guard:
+            return bool(self._queues.get(key))
+
+    def dispatch(self, file_path: Path, wait: bool = False) -> None:
+        """
+        送达该文件排队中的通知
+
+        Args:
+            wait: 为 False 时若其他线程正在送达则直接返回（由它一并送达）；
+                  为 True 时等待并确保返回前本文件的通知都已送达
+        """
+        key = os.path.abspath(str(file_path))
+        with self._guard:
+            dispatch_lock = self._dispatch_locks.get(key)
+        if dispatch_lock is None:
+            return
+        while True:
+            if not dispatch_lock.acquire(blocking=wait):
+                return
+            try:
+                while True:
+                    item = self._pop(key)
+                    if item is None:
+                        break
+                    listeners, (path, start_offset, data) = item
+                    for listener in listeners:
+                        try:
+                            listener(path, start_offset, data)
+                        except Exception as e:
+                            print(f"追加写入监听器执行失败 {path}: {str(e)}")
+            finally:
+                dispatch_lock.release()
+            # 释放送达锁之后再检查一次：释放前入队、拿锁失败而返回的线程的通知由本线程补送
+            if not self._has_pending(key):
+                return
+
+    def drain(self, file_path: Path) -> None:
+        """等待并送达该文件的全部通知"""
+        self.dispatch(file_path, wait=True)
+
+    def drain_all(self) -> None:
+        """等待并送达所有文件的通知（读取派生数据前调用，保证读到自己的写入）"""
+        with self._guard:
+            paths = [queue[0][0] for queue in self._queues.values() if queue]
+        for path in paths:
+            self.drain(path)
+
+
+def append_text(file_path: Path, text: str, fsync: bool = False,
+                listeners: Optional[AppendListeners] = None) -> int:
+    """
+    以追加模式将一段文本一次性写入文件，保证与其他写入者之间不会交错出现半行
+
+    - 进程内：同一文件的写入通过线程锁串行化（Flask线程、后台写入线程、线程池）
+    - 进程间：持有 fcntl.flock 排他的建议锁，多个服务进程写同一文件也不会交错
+    - 所有写入者都必须经过本函数，建议锁才有意义
+    - 写入完成后记录通知，释放锁之后再按写入顺序通知 listeners 中的监听器
+    - 写入中途失败时截掉未写完的半行，抛出 PartialAppendError 说明已写入的完整行（同样会通知）
+
+    Args:
+        file_path: 目标文件
+        text: 已序列化的文本（通常是若干完整的 JSONL 行）
+        fsync: 写入后是否强制落盘
+        listeners: 需要通知的追加写入监听器
+
+    Returns:
+        本次写入在文件中的起始字节偏移
+
+    Raises:
+        PartialAppendError: 写入或 fsync 失败
+    """
+    data = text.encode('utf-8')
+    error: Optional[PartialAppendError] = None
+    with get_file_lock(file_path):
+        f = _open_locked_for_append(file_path)
+        with f:
+            try:
+                # 加锁后再定位到文件末尾：其他进程可能在等待锁期间追加了数据
+                start_offset = f.seek(0, os.SEEK_END)
+                # 上一次写入中断留下的半行不与本次写入拼接（截断不影响监听器：它们只处理完整的行）
+                torn_start = find_torn_tail(f, start_offset)
+                if torn_start < start_offset:
+                    _quarantine_torn_tail(file_path, f, torn_start, start_offset)
+                    start_offset = torn_start
+                # 直接写文件描述符：失败时确切知道写入了多少字节，关闭时也不会再补写缓冲区
+                written = 0
+                try:
+                    view = memoryview(data)
+                    while written < len(data):
+                        written += os.write(f.fileno(), view[written:])
+                    if fsync:
+                        os.fsync(f.fileno())
+                    committed = len(data)
+                except OSError as e:
+                    committed = data.rfind(b'\n', 0, written) + 1
+                    if committed < written:
+                        try:
+                            os.ftruncate(f.fileno(), start_offset + committed)
+                        except OSError:
+                            pass  # 留下的半行在下一次追加前被隔离
+                    error = PartialAppendError(file_path, start_offset, committed, e)
+                if listeners is not None and committed:
+                    listeners._enqueue(file_path, start_offset, data[:committed])
+            finally:
+                if HAS_FCNTL:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    if listeners is not None:
+        listeners.dispatch(file_path)
+    if error is not None:
+        raise error
+    return start_offset
+
+
+def _uncommitted_chunks(chunks: List[Tuple[str, int]], committed: int) -> List[Tuple[str, int]]:
+    """去掉已写入文件的前 committed 字节（行边界）后剩余的待写片段；跨边界的片段按剩余行数计数"""
+    remaining: List[Tuple[str, int]] = []
+    for text, count in chunks:
+        if committed <= 0:
+            remaining.append((text, count))
+            continue
+        data = text.encode('utf-8')
+        if committed >= len(data):
+            committed -= len(data)
+            continue
+        rest = data[committed:].decode('utf-8')
+        remaining.append((rest, rest.count('\n')))
+        committed = 0
+    return remaining
+
+
+class BufferedEventWriter:
+    """
+    带内存队列和后台刷新线程的 JSONL 追加写入器
+
+    - submit() 只做入队，立即返回
+    - 队列中的行数达到 max_batch_events，或最早的待写数据已等待 flush_interval_seconds，
+      后台线程就会把所有待写数据按文件分组写出（每个文件一次 open + 一次 write）
+    - flush() 在调用线程中同步写出全部待写数据，供读取前保证「读到自己的写入」
+    - 写出后通知 listeners 中的追加写入监听器
+    - add_priority_file() 登记的文件每次都先于其他文件写出并落盘（除非策略为 never），
+      写出失败时本轮其他文件也放回队列，保证被引用的数据先于引用它的日志行写出
+    """
+
+    def __init__(self,
+                 max_batch_events: int = 200,
+                 flush_interval_seconds: float = 0.5,
+                 fsync_policy: str = FSYNC_BATCH,
+                 fsync_interval_seconds: float = 5.0,
+                 listeners: Optional[AppendListeners] = None):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"不支持的fsync策略: {fsync_policy}，支持的选项: {', '.join(FSYNC_POLICIES)}")
+
+        self.max_batch_events = max_batch_events
+        self.flush_interval_seconds = flush_interval_seconds
+        self.fsync_policy = fsync_policy
+        self.fsync_interval_seconds = fsync_interval_seconds
+        self.listeners = listeners
+
+        # 待写数据：文件路径 -> [(已序列化的文本片段, 其中的记录数)]（保持提交顺序）
+        self._pending: Dict[Path, List[Tuple[str, int]]] = {}
+        self._pending_count: int = 0
+        self._oldest_pending_at: Optional[float] = None
+        self._last_fsync_at: Dict[Path, float] = {}
+        self._priority_files: Set[Path] = set()
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # 保证同一时刻只有一个线程在写出，从而保持同一文件内的行顺序
+        self._drain_lock = threading.Lock()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, file_path: Path, text: str, count: int = 1) -> None:
+        """
+        提交待写文本（立即返回）
+
+        Args:
+            file_path: 目标JSONL文件
+            text: 一行或多行已序列化的JSONL文本
+            count: text 中包含的记录数，用于按数量触发刷新
+        """
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._pending.setdefault(file_path, []).append((text, count))
+                self._pending_count += count
+                if self._oldest_pending_at is None:
+                    # 队列由空变为非空：唤醒后台线程开始计时
+                    self._oldest_pending_at = time.monotonic()
+                    self._wakeup.notify()
+                elif self._pending_count >= self.max_batch_events:
+                    self._wakeup.notify()
+        if closed:
+            # 已关闭时退化为同步写入，避免丢数据
+            append_text(file_path, text, fsync=self.fsync_policy != FSYNC_NEVER, listeners=self.listeners)
+
+    def add_priority_file(self, file_path: Path) -> None:
+        """登记需要先于其他文件写出的文件（如被日志行引用的推荐理由存储）"""
+        with self._lock:
+            self._priority_files.add(file_path)
+
+    def pending_count(self) -> int:
+        """当前队列中尚未写出的记录数"""
+        with self._lock:
+            return self._pending_count
+
+    def flush(self) -> None:
+        """同步写出全部待写数据"""
+        self._drain()
+
+    def close(self) -> None:
+        """停止后台线程并写出剩余数据（进程退出时自动调用）"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join(timeout=max(self.flush_interval_seconds * 4, 1.0))
+        self._drain()
+        atexit.unregister(self.close)
+
+    def _run(self) -> None:
+        """后台刷新循环：按数量或时间触发"""
+        while True:
+            with self._lock:
+                while not self._closed:
+                    if self._pending_count >= self.max_batch_events:
+                        break
+                    if self._oldest_pending_at is not None:
+                        waited = time.monotonic() - self._oldest_pending_at
+                        if waited >= self.flush_interval_seconds:
+                            break
+                        self._wakeup.wait(self.flush_interval_seconds - waited)
+                    else:
+                        self._wakeup.wait()
+                closed = self._closed
+            self._drain()
+            if closed:
+                return
+
+    def _drain(self) -> None:
+        """取出全部待写数据，按文件分组各写一次"""
+        with self._drain_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = {}
+                self._pending_count = 0
+                self._oldest_pending_at = None
+
+            priority_failed = False
+            for file_path in sorted(pending, key=lambda path: path not in self._priority_files):
+                chunks = pending[file_path]
+                if priority_failed:
+                    self._requeue(file_path, chunks)
+                    continue
+                priority = file_path in self._priority_files
+                try:
+                    append_text(file_path, ''.join(text for text, _ in chunks),
+                                fsync=(self.fsync_policy != FSYNC_NEVER) if priority else self._should_fsync(file_path),
+                                listeners=self.listeners)
+                except PartialAppendError as e:
+                    # 已完整写入的行不再重写，只重试其后的部分
+                    remaining = _uncommitted_chunks(chunks, e.committed)
+                    if remaining:
+                        print(f"批量写入事件失败 {file_path}: {str(e)}，剩余部分将在下次刷新时重试")
+                        self._requeue(file_path, remaining)
+                        priority_failed = priority
+                    else:
+                        print(f"批量写入事件已写入但落盘失败 {file_path}: {str(e)}")
+                except Exception as e:
+                    print(f"批量写入事件失败 {file_path}: {str(e)}，将在下次刷新时重试")
+                    self._requeue(file_path, chunks)
+                    priority_failed = priority
+
+    def _should_fsync(self, file_path: Path) -> bool:
+        """根据fsync策略判断本次写出后是否需要落盘"""
+        if self.fsync_policy == FSYNC_BATCH:
+            return True
+        if self.fsync_policy == FSYNC_INTERVAL:
+            now = time.monotonic()
+            if now - self._last_fsync_at.get(file_path, 0.0) >= self.fsync_interval_seconds:
+                self._last_fsync_at[file_path] = now
+                return True
+        return False
+
+    def _requeue(self, file_path: Path, chunks: List[Tuple[str, int]]) -> None:
+        """写出失败的数据放回队首，保持顺序（按记录数而不是片段数恢复待写计数）"""
+        with self._lock:
+            self._pending[file_path] = chunks + self._pending.get(file_path, [])
+            self._pending_count += sum(count for _, count in chunks)
+            if self._oldest_pending_at is None:
+                self._oldest_pending_at = time.monotonic()
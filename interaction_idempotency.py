@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+事件批次的幂等写入
+前端发送失败时会把整批事件留待重发；如果服务器其实已经写入，重发就会产生重复记录。
+前端为每个事件附带 event_id、为每个批次附带 batch_id，服务器为每个会话维护一个
+有容量上限、按时间窗口过期的已见集合，重复的批次 / 事件直接确认而不再写入。
+
+已见集合常驻内存；两种键随事件一起写入会话JSONL（event_id / batch_id 字段），
+服务重启后某个会话第一次带着幂等键写入时，从该会话日志末尾恢复已见集合，
+因此不需要额外的持久化文件，集合也不会记住实际未写入的事件。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# 已见键保留的时间窗口（秒）
+IDEMPOTENCY_WINDOW_SECONDS: int = 24 * 3600
+# 每个会话最多保留的已见键数量（超出时淘汰最早的键）
+IDEMPOTENCY_MAX_KEYS_PER_SESSION: int = 4096
+# 常驻内存的会话数上限（淘汰最久未使用的会话，下次写入时再从会话日志恢复）
+IDEMPOTENCY_MAX_SESSIONS: int = 1024
+
+# 读取会话最后 n 条记录：(session_id, n) -> 记录列表
+RecentRecordsLoader = Callable[[str, int], List[Dict[str, Any]]]
+
+
+def batch_key(batch_id: str) -> str:
+    return f"b:{batch_id}"
+
+
+def event_key(event_id: str) -> str:
+    return f"e:{event_id}"
+
+
+def _record_epoch(record: Dict[str, Any]) -> Optional[float]:
+    """记录的服务器保存时间（epoch 秒）"""
+    saved = record.get('saved_timestamp')
+    if not isinstance(saved, str):
+        return None
+    try:
+        return datetime.strptime(saved, '%Y-%m-%d %H:%M:%S.%f').timestamp()
+    except ValueError:
+        return None
+
+
+class SessionSeenSet:
+    """单个会话的已见幂等键：键 -> 首次写入时间，按写入顺序排列"""
+
+    def __init__(self, window_seconds: float, max_keys: int):
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        # 是否已从会话日志恢复过
+        self.restored = False
+        self._keys: 'OrderedDict[str, float]' = OrderedDict()
+
+    def _prune(self, now: float) -> None:
+        expire_before = now - self.window_seconds
+        while self._keys:
+            key, seen_at = next(iter(self._keys.items()))
+            if seen_at >= expire_before and len(self._keys) <= self.max_keys:
+                break
+            self._keys.popitem(last=False)
+
+    def contains(self, key: str) -> bool:
+        now = time.time()
+        self._prune(now)
+        return key in self._keys
+
+    def add(self, key: str, seen_at: Optional[float] = None) -> None:
+        now = time.time()
+        self._keys[key] = now if seen_at is None else seen_at
+        self._keys.move_to_end(key)
+        self._prune(now)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class IdempotencyCache:
+    """
+    按会话划分的幂等键缓存
+    调用方在 session(session_id) 上下文内检查并登记键，同一会话的检查、写入、登记因此串行，
+    并发到达的重发请求也不会重复写入
+    """
+
+    def __init__(self, loader: RecentRecordsLoader,
+                 window_seconds: float = IDEMPOTENCY_WINDOW_SECONDS,
+                 max_keys_per_session: int = IDEMPOTENCY_MAX_KEYS_PER_SESSION,
+                 max_sessions: int = IDEMPOTENCY_MAX_SESSIONS):
+        self.loader = loader
+        self.window_seconds = window_seconds
+        self.max_keys_per_session = max_keys_per_session
+        self.max_sessions = max_sessions
+        self._sessions: 'OrderedDict[str, SessionSeenSet]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _seen_set(self, session_id: str) -> SessionSeenSet:
+        with self._lock:
+            seen = self._sessions.get(session_id)
+            if seen is None:
+                seen = SessionSeenSet(self.window_seconds, self.max_keys_per_session)
+                self._sessions[session_id] = seen
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            return seen
+
+    def _restore(self, session_id: str, seen: SessionSeenSet) -> None:
+        """从会话日志末尾恢复时间窗口内的已见键"""
+        try:
+            records = self.loader(session_id, self.max_keys_per_session)
+        except Exception as e:
+            print(f"恢复幂等键失败 {session_id}: {str(e)}")
+            return
+        expire_before = time.time() - self.window_seconds
+        for record in records:
+            seen_at = _record_epoch(record)
+            if seen_at is None or seen_at < expire_before:
+                continue
+            if record.get('batch_id'):
+                seen.add(batch_key(str(record['batch_id'])), seen_at)
+            if record.get('event_id'):
+                seen.add(event_key(str(record['event_id'])), seen_at)
+            # 写入前被合并的事件（见 interaction_event_coalescer）
+            for event_id in record.get('coalesced_event_ids') or []:
+                seen.add(event_key(str(event_id)), seen_at)
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[SessionSeenSet]:
+        """持有会话的已见集合（首次使用时从会话日志恢复）"""
+        seen = self._seen_set(session_id)
+        with seen.lock:
+            if not seen.restored:
+                self._restore(session_id, seen)
+                seen.restored = True
+            yield seen
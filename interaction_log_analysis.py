@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+会话日志的单遍流式分析
+逐条消费会话记录（见 StatsManager.iter_all_session_records），同时得到：
+
+- 每个会话的计数（事件数、检索次数、悬停 / 点击等），会话结束（下一个会话开始）时立即产出，不保留
+- 按检索词汇总的聚合检索日志（QueryLogRecord）：检索次数、涉及会话数、展示图书数、悬停次数 / 时长、点击
+
+内存只与检索词的种类数有关，与事件数量无关。
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from interaction_storage import BOOK_EVENT_TYPES
+
+# 检索词汇总的排序字段
+QUERY_SORT_FIELDS = ('searches', 'sessions', 'hovers', 'hover_ms', 'clicks', 'click_rate')
+
+
+def _number(value: Any) -> int:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+def normalize_query(text: Any) -> str:
+    """检索词汇总的键：去掉首尾空白、合并连续空白、英文小写"""
+    return ' '.join(str(text).split()).lower() if text is not None else ''
+
+
+def _new_session(session_id: str) -> Dict[str, Any]:
+    return {
+        'session_id': session_id,
+        'first_time': None,
+        'last_time': None,
+        'events': 0,
+        'query_logs': 0,
+        'unique_queries': 0,
+        'search_sessions': 0,
+        'books_shown': 0,
+        'hovers': 0,
+        'hover_ms': 0,
+        'clicks': 0,
+        'book_events': 0,
+    }
+
+
+def _new_query(text: str) -> Dict[str, Any]:
+    return {
+        'query': text,
+        'searches': 0,
+        'sessions': 0,
+        'books_shown': 0,
+        'hovers': 0,
+        'hover_ms': 0,
+        'clicks': 0,
+        'searches_with_click': 0,
+    }
+
+
+class SessionLogAnalyzer:
+    """单遍累加会话记录；feed() 产出已结束会话的计数，finish() 产出最后一个会话"""
+
+    def __init__(self):
+        self.queries: Dict[str, Dict[str, Any]] = {}
+        self._session: Optional[Dict[str, Any]] = None
+        self._session_queries: set = set()
+        self.total_records = 0
+
+    def _finish_session(self) -> Optional[Dict[str, Any]]:
+        session, self._session = self._session, None
+        if session is not None:
+            session['unique_queries'] = len(self._session_queries)
+            self._session_queries = set()
+        return session
+
+    def _add_query_log(self, session: Dict[str, Any], record: Dict[str, Any]) -> None:
+        key = normalize_query(record.get('query_text'))
+        query = self.queries.get(key)
+        if query is None:
+            query = self.queries[key] = _new_query(key)
+        query['searches'] += 1
+        if key not in self._session_queries:
+            self._session_queries.add(key)
+            query['sessions'] += 1
+
+        clicked = False
+        for book in record.get('books') or []:
+            if not isinstance(book, dict):
+                continue
+            hovers = _number(book.get('hover_count'))
+            hover_ms = _number(book.get('total_hover_time_ms'))
+            clicks = _number(book.get('click_count'))
+            clicked = clicked or clicks > 0
+            for target in (query, session):
+                target['books_shown'] += 1
+                target['hovers'] += hovers
+                target['hover_ms'] += hover_ms
+                target['clicks'] += clicks
+        query['searches_with_click'] += clicked
+        session['query_logs'] += 1
+
+    def feed(self, record: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """累加一条记录；记录属于新的会话时先产出上一个会话的计数"""
+        self.total_records += 1
+        session_id = str(record.get('session_id') or '')
+        if self._session is not None and self._session['session_id'] != session_id:
+            yield self._finish_session()
+        if self._session is None:
+            self._session = _new_session(session_id)
+        session = self._session
+
+        session['events'] += 1
+        when = record.get('saved_timestamp') or record.get('timestamp')
+        if when:
+            session['first_time'] = session['first_time'] or when
+            session['last_time'] = when
+
+        event_type = record.get('event_type')
+        if event_type is None:
+            if record.get('query_text') is not None:
+                self._add_query_log(session, record)
+        elif event_type == 'search_session_start':
+            session['search_sessions'] += 1
+        elif event_type in BOOK_EVENT_TYPES:
+            session['book_events'] += 1
+
+    def finish(self) -> Iterator[Dict[str, Any]]:
+        session = self._finish_session()
+        if session is not None:
+            yield session
+
+    def top_queries(self, top: int = 20, sort_by: str = 'searches', min_searches: int = 1) -> List[Dict[str, Any]]:
+        """按 sort_by 排序的前 top 个检索词（附带点击率、平均悬停时长）"""
+        rows = []
+        for query in self.queries.values():
+            if query['searches'] < min_searches:
+                continue
+            rows.append({
+                **query,
+                'click_rate': query['searches_with_click'] / query['searches'],
+                'avg_hover_ms': query['hover_ms'] / query['hovers'] if query['hovers'] else 0,
+            })
+        rows.sort(key=lambda row: (row[sort_by], row['searches']), reverse=True)
+        return rows[:top]
+
+
+def analyze_sessions(records: Iterable[Dict[str, Any]], analyzer: SessionLogAnalyzer) -> Iterator[Dict[str, Any]]:
+    """单遍消费 records，依次产出每个会话的计数；结束后 analyzer 中保留检索词汇总"""
+    for record in records:
+        yield from analyzer.feed(record)
+    yield from analyzer.finish()
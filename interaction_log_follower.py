@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+实时跟踪会话日志的新增行（类似 tail -F，覆盖 sessions/ 下全部会话文件）
+
+- Linux 下通过 inotify（ctypes 调用 libc，无需额外依赖）等待会话目录中的写入，
+  其他平台或 inotify 不可用时退回定时轮询 stat()
+- 每个会话文件记录已读到的逻辑偏移（已轮转字节数 + 活跃文件偏移），只读取新增的完整行，
+  从不从头重读；会话日志在跟踪期间被轮转时，从分段中补读轮转前尚未读到的部分
+- 默认从启动时各文件的末尾开始，启动后新建的会话文件从头开始
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from interaction_session_segments import SessionSegmentStore
+
+# 轮询模式下两次 stat() 之间的间隔（秒）
+FOLLOW_POLL_INTERVAL_SECONDS: float = 1.0
+
+# inotify 事件掩码（linux/inotify.h）
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class _Inotify:
+    """监视单个目录的 inotify 句柄；不可用时构造抛出 OSError"""
+
+    def __init__(self, directory: Path):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("找不到 libc")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("libc 不支持 inotify")
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch 失败: {directory}")
+
+    def wait(self, timeout: float) -> Optional[Set[str]]:
+        """
+        等待目录中的文件变化，返回发生变化的文件名集合（超时为空集合）；
+        内核事件队列溢出时返回 None，调用方应检查全部文件
+        """
+        ready, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if not ready:
+            return set()
+        names: Set[str] = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return names
+            position = 0
+            while position + _INOTIFY_EVENT.size <= len(data):
+                _, mask, _, name_length = _INOTIFY_EVENT.unpack_from(data, position)
+                position += _INOTIFY_EVENT.size
+                if mask & _IN_Q_OVERFLOW:
+                    return None
+                name = data[position:position + name_length].rstrip(b'\0')
+                position += name_length
+                if name:
+                    names.add(os.fsdecode(name))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class SessionLogFollower:
+    """
+    跟踪会话目录中全部会话文件新增的完整行
+
+    Args:
+        session_dir: 会话JSONL所在目录
+        segments: 会话分段存储（用于计算逻辑偏移、补读轮转前未读到的行）
+        from_start: 为 True 时从各文件开头读起
+        use_inotify: 为 False 时强制使用轮询
+    """
+
+    def __init__(self, session_dir: Path, segments: Optional[SessionSegmentStore] = None,
+                 from_start: bool = False, use_inotify: bool = True,
+                 poll_interval: float = FOLLOW_POLL_INTERVAL_SECONDS):
+        self.session_dir = session_dir
+        self.segments = segments or SessionSegmentStore(session_dir)
+        self.poll_interval = poll_interval
+        self._positions: Dict[str, int] = {}
+        # 轮询模式下各文件上次的 (inode, 大小, mtime_ns)，未变化的文件不读取
+        self._stamps: Dict[str, Tuple[int, int, int]] = {}
+        self._inotify: Optional[_Inotify] = None
+        if use_inotify:
+            try:
+                self._inotify = _Inotify(session_dir)
+            except (OSError, AttributeError):
+                self._inotify = None
+        for session_file in session_dir.glob("*.jsonl"):
+            self._positions[session_file.name] = 0 if from_start else self._logical_size(session_file)
+
+    @property
+    def mode(self) -> str:
+        return 'inotify' if self._inotify is not None else 'poll'
+
+    def _logical_size(self, session_file: Path) -> int:
+        try:
+            size = session_file.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        return self.segments.rotated(session_file)[0] + size
+
+    def _read_new(self, name: str) -> List[bytes]:
+        """读取单个会话文件自上次位置以来新增的完整行"""
+        session_file = self.session_dir / name
+        position = self._positions.get(name, 0)
+        lines: List[bytes] = []
+        for chunk_start, chunk in self.segments.iter_logical_chunks(session_file, position):
+            lines.extend(line for line in chunk.splitlines() if line.strip())
+            position = chunk_start + len(chunk)
+        self._positions[name] = position
+        return lines
+
+    def _changed_by_stat(self) -> Set[str]:
+        changed: Set[str] = set()
+        for session_file in self.session_dir.glob("*.jsonl"):
+            try:
+                stat = session_file.stat()
+            except FileNotFoundError:
+                continue
+            stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            if self._stamps.get(session_file.name) != stamp:
+                self._stamps[session_file.name] = stamp
+                changed.add(session_file.name)
+        return changed
+
+    def poll(self, timeout: float) -> List[Tuple[str, bytes]]:
+        """
+        最多等待 timeout 秒，返回期间新增的行：[(会话文件名（不含扩展名）, 原始行)]
+        """
+        if self._inotify is not None:
+            names = self._inotify.wait(timeout)
+            if names is None:
+                names = {f.name for f in self.session_dir.glob("*.jsonl")}
+        else:
+            deadline = time.monotonic() + timeout
+            names = self._changed_by_stat()
+            while not names and time.monotonic() < deadline:
+                time.sleep(min(self.poll_interval, max(deadline - time.monotonic(), 0)))
+                names = self._changed_by_stat()
+
+        new_lines: List[Tuple[str, bytes]] = []
+        for name in sorted(names):
+            if not name.endswith('.jsonl'):
+                continue
+            try:
+                new_lines.extend((name[:-len('.jsonl')], line) for line in self._read_new(name))
+            except OSError as e:
+                print(f"读取会话文件失败 {name}: {str(e)}")
+        return new_lines
+
+    def follow(self, timeout: float) -> Iterator[List[Tuple[str, bytes]]]:
+        """持续跟踪，每批新增行（或等待超时后的空列表）产出一次"""
+        try:
+            while True:
+                yield self.poll(timeout)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+
+class RollingMinuteCounter:
+    """按分钟分桶的滚动计数（只保留最近 window_minutes 分钟）"""
+
+    def __init__(self, window_minutes: int = 5, started: Optional[float] = None):
+        self.window_minutes = max(window_minutes, 1)
+        self.started = time.time() if started is None else started
+        # [分钟序号, 事件数, 检索数]
+        self._buckets: Deque[List[int]] = deque()
+
+    def _prune(self, minute: int) -> None:
+        while self._buckets and self._buckets[0][0] <= minute - self.window_minutes:
+            self._buckets.popleft()
+
+    def add(self, now: float, events: int, queries: int) -> None:
+        minute = int(now // 60)
+        if not self._buckets or self._buckets[-1][0] != minute:
+            self._buckets.append([minute, 0, 0])
+        self._buckets[-1][1] += events
+        self._buckets[-1][2] += queries
+        self._prune(minute)
+
+    def snapshot(self, now: float) -> Dict[str, float]:
+        """当前这一分钟的事件数、检索数，以及窗口内（跟踪不足一个窗口时按已跟踪时长）的每分钟平均值"""
+        minute = int(now // 60)
+        self._prune(minute)
+        current = self._buckets[-1] if self._buckets and self._buckets[-1][0] == minute else [minute, 0, 0]
+        span_minutes = min(self.window_minutes, max((now - self.started) / 60, 1))
+        return {
+            'minute_events': current[1],
+            'minute_queries': current[2],
+            'events_per_minute': sum(bucket[1] for bucket in self._buckets) / span_minutes,
+            'queries_per_minute': sum(bucket[2] for bucket in self._buckets) / span_minutes,
+        }
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+检索日志中推荐理由的内容寻址存储
+同一本书的 logical_reason / social_reason（生成的理由文本、静态的院系借阅表）
+会在一个被试的每次检索中重复出现，直接内联写入会话日志时绝大部分字节都是重复内容。
+
+理由以规范化JSON的哈希为键只写入一次，日志行中的图书只保留哈希引用：
+    {"logical_reason": {...}}  ->  {"logical_reason_ref": "<hash>"}
+读取时按需把引用还原为原内容。
+
+存储格式：reason_dir/reasons.pack，每行一条 {"hash": "<hash>", "blob": <理由>}，只追加，
+不同进程并发写入同一理由时可能出现重复行，内容相同，不影响读取
+
+提供缓冲写入器时新理由只入队，由写入器在后台写出：pack 文件登记为优先文件，
+每轮总是先于会话日志写出并落盘，因此引用先写出的理由不会出现在理由之前
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from interaction_event_writer import BufferedEventWriter, append_text
+
+# 以内容寻址方式存储的图书字段
+REASON_FIELDS: Tuple[str, ...] = ('logical_reason', 'social_reason')
+# 日志行中引用字段的后缀：logical_reason -> logical_reason_ref
+REASON_REF_SUFFIX = '_ref'
+REASON_PACK_FILE = "reasons.pack"
+# 内存中缓存的已解码理由数量
+REASON_CACHE_SIZE: int = 4096
+
+
+def reason_hash(canonical: bytes) -> str:
+    """理由的内容哈希（BLAKE2b-128，十六进制）"""
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
+def line_has_reason_refs(line: bytes) -> bool:
+    """原始日志行中是否含有理由引用（不解析JSON的快速判断）"""
+    return any(f'"{field}{REASON_REF_SUFFIX}"'.encode('ascii') in line for field in REASON_FIELDS)
+
+
+def _canonical(blob: Any) -> bytes:
+    return json.dumps(blob, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+class ReasonBlobStore:
+    """
+    推荐理由的内容寻址存储
+
+    - put() 返回理由的哈希，相同内容只写入一次：有缓冲写入器时入队（先于引用它的日志行写出），
+      否则同步写入并 fsync
+    - get() 按哈希读取理由；哈希 -> (偏移, 长度) 的索引常驻内存，
+      未命中时先补读其他进程追加的内容，仍未写出的理由直接从内存返回
+    """
+
+    def __init__(self, reason_dir: Path, cache_size: int = REASON_CACHE_SIZE,
+                 writer: Optional[BufferedEventWriter] = None):
+        self.reason_dir = reason_dir
+        self.reason_dir.mkdir(parents=True, exist_ok=True)
+        self.pack_file = self.reason_dir / REASON_PACK_FILE
+        self.cache_size = cache_size
+        self.writer = writer
+        if writer is not None:
+            writer.add_priority_file(self.pack_file)
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        # 已入队、尚未被索引到的理由行：哈希 -> 行
+        self._queued: Dict[str, bytes] = {}
+        self._indexed_bytes = 0
+        self._cache: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _catch_up_locked(self) -> None:
+        """把索引补齐到 pack 文件当前的末尾（只处理完整的行）"""
+        try:
+            size = self.pack_file.stat().st_size
+        except FileNotFoundError:
+            return
+        if size <= self._indexed_bytes:
+            return
+        with open(self.pack_file, 'rb') as f:
+            f.seek(self._indexed_bytes)
+            data = f.read(size - self._indexed_bytes)
+        position = self._indexed_bytes
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                break
+            try:
+                blob_hash = json.loads(line).get('hash')
+            except ValueError:
+                blob_hash = None
+            if blob_hash and blob_hash not in self._offsets:
+                self._offsets[blob_hash] = (position, len(line))
+                self._queued.pop(blob_hash, None)
+            position += len(line)
+        self._indexed_bytes = position
+
+    def put(self, blob: Any) -> str:
+        """写入理由（已存在时不重复写入），返回其哈希"""
+        canonical = _canonical(blob)
+        blob_hash = reason_hash(canonical)
+        with self._lock:
+            if blob_hash in self._offsets or blob_hash in self._queued:
+                return blob_hash
+            self._catch_up_locked()
+            if blob_hash in self._offsets:
+                return blob_hash
+            line = b'{"hash":"' + blob_hash.encode('ascii') + b'","blob":' + canonical + b'}\n'
+            if self.writer is not None:
+                self._queued[blob_hash] = line
+                self.writer.submit(self.pack_file, line.decode('utf-8'))
+                return blob_hash
+            start = append_text(self.pack_file, line.decode('utf-8'), fsync=True)
+            self._offsets[blob_hash] = (start, len(line))
+            if start == self._indexed_bytes:
+                self._indexed_bytes = start + len(line)
+        return blob_hash
+
+    def _read_line(self, blob_hash: str) -> Optional[bytes]:
+        with self._lock:
+            line = self._cache.get(blob_hash)
+            if line is not None:
+                self._cache.move_to_end(blob_hash)
+                return line
+            if blob_hash not in self._offsets:
+                self._catch_up_locked()
+            location = self._offsets.get(blob_hash)
+            if location is None:
+                return self._queued.get(blob_hash)
+            with open(self.pack_file, 'rb') as f:
+                f.seek(location[0])
+                line = f.read(location[1])
+            self._cache[blob_hash] = line
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return line
+
+    def get(self, blob_hash: str) -> Optional[Any]:
+        """按哈希读取理由（每次返回新解码的对象）；不存在时返回 None"""
+        line = self._read_line(blob_hash)
+        if line is None:
+            return None
+        try:
+            return json.loads(line)['blob']
+        except (ValueError, KeyError):
+            return None
+
+    def dehydrate_books(self, books: Any) -> Any:
+        """把图书列表中的理由写入存储，返回以哈希引用替换理由后的新列表"""
+        if not isinstance(books, list):
+            return books
+        stored = []
+        for book in books:
+            if isinstance(book, dict) and any(book.get(field) for field in REASON_FIELDS):
+                book = dict(book)
+                for field in REASON_FIELDS:
+                    if book.get(field):
+                        book[field + REASON_REF_SUFFIX] = self.put(book.pop(field))
+            stored.append(book)
+        return stored
+
+    def rehydrate_record(self, record: Any) -> Any:
+        """把记录中图书的理由引用就地还原为原内容（引用失效时还原为 None）"""
+        if not isinstance(record, dict) or not isinstance(record.get('books'), list):
+            return record
+        for book in record['books']:
+            if not isinstance(book, dict):
+                continue
+            for field in REASON_FIELDS:
+                ref = book.pop(field + REASON_REF_SUFFIX, None)
+                if ref is not None:
+                    book[field] = self.get(ref)
+        return record
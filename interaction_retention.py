@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+统计输出目录的保留策略与压实
+search_results / panel_interactions 中每次交互一个JSON文件，daily / summary_reports 中每次生成一份报告，
+长期运行后目录中的文件越来越多，列出 / glob 这些目录也越来越慢。
+
+- 原始输出（search_results、panel_interactions）：超过保留天数或超出目录大小预算的文件
+  按修改月份合并写入 <目录>/archive/<YYYY-MM>.jsonl.gz，写入成功后删除原文件
+- 派生报告（daily、summary_reports）：随时可以从日汇总重新生成，超过保留天数或超出预算的直接删除
+
+归档文件每行一条 {"name": 原文件名, "mtime": 修改时间, "data": 原JSON}（原文件不是合法JSON时为 "text"），
+每次压实追加一个完整的 gzip 成员（多成员 gzip 可被标准工具连续解压）；
+压实在写入成功、删除原文件之前中断时，同名文件可能被重复归档，读取时以最后一条为准
+（latest_archive_entries；StatsManager.list_archived_files / view_stats.py archive 据此读取归档）。
+"""
+
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TypedDict
+
+from interaction_event_writer import locked_file
+
+# 原始输出保留天数，更早的文件合并进归档
+RETENTION_ARCHIVE_AFTER_DAYS: int = 30
+# 派生报告保留天数，更早的直接删除
+RETENTION_REPORT_MAX_AGE_DAYS: int = 30
+# 每个目录中（不含归档）的JSON文件总大小预算，超出时从最早的文件开始归档 / 删除
+RETENTION_MAX_DIR_BYTES: int = 64 * 1024 * 1024
+
+ARCHIVE_DIR_NAME = "archive"
+ARCHIVE_LOCK_FILE = ".lock"
+
+# 处理方式："archive"（合并进归档）/ "delete"（直接删除）
+RETENTION_ARCHIVE = "archive"
+RETENTION_DELETE = "delete"
+
+
+class RetentionRule(TypedDict):
+    """单个目录的保留规则"""
+    directory: Path
+    action: str
+    max_age_days: Optional[float]
+    max_bytes: Optional[int]
+
+
+class RetentionResult(TypedDict):
+    """单个目录的压实结果"""
+    action: str
+    expired_files: int
+    expired_bytes: int
+    kept_files: int
+    kept_bytes: int
+    archives: List[str]
+
+
+def _scan_json_files(directory: Path) -> List[Tuple[Path, os.stat_result]]:
+    """目录中的JSON文件及其 stat 结果（每个文件只 stat 一次），按修改时间从早到晚排序"""
+    entries = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.json'):
+                    try:
+                        entries.append((Path(entry.path), entry.stat()))
+                    except FileNotFoundError:
+                        continue
+    except FileNotFoundError:
+        return []
+    entries.sort(key=lambda item: item[1].st_mtime)
+    return entries
+
+
+def select_expired(files: List[Tuple[Path, os.stat_result]], now: float,
+                   max_age_days: Optional[float], max_bytes: Optional[int]) -> int:
+    """
+    按保留规则需要处理的文件数：files 按修改时间排序，返回值 n 表示处理前 n 个文件
+    先按天数淘汰，剩余文件仍超出大小预算时继续从最早的文件开始淘汰
+    """
+    count = 0
+    if max_age_days is not None:
+        cutoff = now - max_age_days * 86400
+        while count < len(files) and files[count][1].st_mtime < cutoff:
+            count += 1
+    if max_bytes is not None:
+        remaining = sum(stat.st_size for _, stat in files[count:])
+        while count < len(files) and remaining > max_bytes:
+            remaining -= files[count][1].st_size
+            count += 1
+    return count
+
+
+def _archive_line(path: Path, stat: os.stat_result) -> bytes:
+    text = path.read_text(encoding='utf-8', errors='replace')
+    entry: Dict[str, Any] = {
+        'name': path.name,
+        'mtime': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    try:
+        entry['data'] = json.loads(text)
+    except ValueError:
+        entry['text'] = text
+    return json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def archive_files(directory: Path, files: List[Tuple[Path, os.stat_result]]) -> List[str]:
+    """把文件按修改月份合并进归档并删除原文件，返回写入的归档文件名"""
+    archive_dir = directory / ARCHIVE_DIR_NAME
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    by_month: Dict[str, List[Tuple[Path, os.stat_result]]] = {}
+    for path, stat in files:
+        by_month.setdefault(datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m'), []).append((path, stat))
+
+    written = []
+    for month, month_files in sorted(by_month.items()):
+        archive_path = archive_dir / f"{month}.jsonl.gz"
+        lines = []
+        archived = []
+        for path, stat in month_files:
+            try:
+                lines.append(_archive_line(path, stat))
+                archived.append(path)
+            except FileNotFoundError:
+                continue
+        if not lines:
+            continue
+        member = gzip.compress(b''.join(lines))
+        with locked_file(archive_path):
+            with open(archive_path, 'ab') as f:
+                f.write(member)
+                f.flush()
+                os.fsync(f.fileno())
+        # 归档落盘后才删除原文件
+        for path in archived:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        written.append(archive_path.name)
+    return written
+
+
+def iter_archive_entries(directory: Path) -> Iterator[Dict[str, Any]]:
+    """
+    依次读取目录归档中的全部条目（同名文件被重复归档时以最后一条为准，由调用方处理）
+    写入中断留下的不完整 gzip 成员之前的条目照常读取，之后的部分跳过
+    """
+    for archive_path in sorted((directory / ARCHIVE_DIR_NAME).glob("*.jsonl.gz")):
+        try:
+            with gzip.open(archive_path, 'rb') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except (OSError, EOFError) as e:
+            print(f"读取归档失败 {archive_path}: {str(e)}")
+
+
+def latest_archive_entries(directory: Path) -> List[Dict[str, Any]]:
+    """目录归档中的全部文件（同名文件只保留最后一条），按修改时间从早到晚排序"""
+    latest: Dict[str, Dict[str, Any]] = {}
+    for entry in iter_archive_entries(directory):
+        if isinstance(entry, dict) and entry.get('name'):
+            latest.pop(entry['name'], None)
+            latest[entry['name']] = entry
+    return sorted(latest.values(), key=lambda entry: entry.get('mtime') or '')
+
+
+def apply_retention(rules: List[RetentionRule], now: Optional[float] = None,
+                    dry_run: bool = False) -> Dict[str, RetentionResult]:
+    """
+    按规则压实各目录，返回 {目录名: 结果}
+
+    Args:
+        rules: 各目录的保留规则
+        now: 当前时间（epoch 秒），默认取系统时间
+        dry_run: 只统计将被处理的文件，不做任何修改
+    """
+    now = time.time() if now is None else now
+    results: Dict[str, RetentionResult] = {}
+    for rule in rules:
+        directory = rule['directory']
+        files = _scan_json_files(directory)
+        count = select_expired(files, now, rule['max_age_days'], rule['max_bytes'])
+        expired, kept = files[:count], files[count:]
+        archives: List[str] = []
+        if expired and not dry_run:
+            try:
+                if rule['action'] == RETENTION_ARCHIVE:
+                    archives = archive_files(directory, expired)
+                else:
+                    for path, _ in expired:
+                        try:
+                            path.unlink()
+                        except FileNotFoundError:
+                            pass
+            except OSError as e:
+                print(f"压实目录失败 {directory}: {str(e)}")
+                continue
+        results[directory.name] = {
+            'action': rule['action'],
+            'expired_files': len(expired),
+            'expired_bytes': sum(stat.st_size for _, stat in expired),
+            'kept_files': len(kept),
+            'kept_bytes': sum(stat.st_size for _, stat in kept),
+            'archives': archives,
+        }
+    return results
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+会话记录的增量倒排索引
+把检索词（query_text / 检索会话的 query，经 jieba 分词）、图书 ISBN、被点击的 ISBN 和事件类型
+映射到记录在会话日志中的位置 (会话文件名, 逻辑偏移)，"检索过某个词并点击过某本书的会话"
+这类查询只需求几个倒排列表的交集，不再逐个扫描会话文件。
+
+索引项：
+- q:<分词>        检索日志的 query_text、search_session_start / search_session_end 的 query
+- isbn:<ISBN>     检索日志中展示的图书、图书相关事件的 book_isbn
+- click:<ISBN>    检索日志中 click_count > 0 的图书、book_clicked 事件
+- type:<事件类型>  事件的 event_type；检索日志记为 type:query_log
+
+存储格式：index_dir/postings.log，只追加，第一行为 {"version": N}，之后每次累加写入一行
+    {"s": 会话文件名, "e": 已累加到的逻辑偏移, "p": [[记录偏移, [索引项...]], ...]}
+各会话的累加进度就是该会话最后一行的 e，倒排列表与进度写在同一行里，始终一致；
+加载时把整个日志读入内存（按会话文件名 + 偏移），其他进程追加的行在下次使用前补读。
+
+索引在写入时由追加写入监听器增量维护（分词在写入线程中进行），查询只读内存中的倒排列表：
+查询文本按索引中已有的 q: 词表做正向最长匹配切分，不需要加载 jieba，也不会补齐会话。
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from interaction_append_tracking import AppendProgressTracker
+from interaction_event_writer import locked_file
+from interaction_session_segments import SessionSegmentStore
+
+SEARCH_INDEX_VERSION = 1
+SEARCH_INDEX_POSTINGS_FILE = "postings.log"
+SEARCH_INDEX_LOCK_FILE = ".lock"
+# 没有 event_type 的聚合检索日志记录使用的类型索引项
+QUERY_LOG_TYPE = 'query_log'
+# 带检索词的事件类型
+QUERY_EVENT_TYPES = ('search_session_start', 'search_session_end')
+
+# 倒排列表中的一项：(会话文件名, 记录在会话逻辑字节流中的偏移)
+Posting = Tuple[str, int]
+
+# 检索词索引项的前缀
+QUERY_TERM_PREFIX = 'q:'
+# 写入时分词丢弃的停用词（与书库分词 _tokenize_to_set 一致），查询切分时同样跳过
+QUERY_STOPWORDS = frozenset({"的", "了", "和", "是", "在", "与", "及", "或"})
+
+
+def query_terms(text: Any) -> Set[str]:
+    """检索词的索引项（与书库匹配使用同一套 jieba 分词，延迟导入以免加载书库拖慢启动）"""
+    if not isinstance(text, str) or not text.strip():
+        return set()
+    from experimental_book_library import _tokenize_to_set
+    return {f"{QUERY_TERM_PREFIX}{token}" for token in _tokenize_to_set(text)}
+
+
+def record_terms(record: Dict[str, Any]) -> Set[str]:
+    """一条会话记录的全部索引项"""
+    event_type = record.get('event_type')
+    terms = {f"type:{event_type or QUERY_LOG_TYPE}"}
+    if event_type is None:
+        terms |= query_terms(record.get('query_text'))
+        for book in record.get('books') or []:
+            if isinstance(book, dict) and book.get('isbn'):
+                terms.add(f"isbn:{book['isbn']}")
+                if isinstance(book.get('click_count'), int) and book['click_count'] > 0:
+                    terms.add(f"click:{book['isbn']}")
+    elif event_type in QUERY_EVENT_TYPES:
+        terms |= query_terms(record.get('query'))
+    if record.get('book_isbn'):
+        terms.add(f"isbn:{record['book_isbn']}")
+        if event_type == 'book_clicked':
+            terms.add(f"click:{record['book_isbn']}")
+    return terms
+
+
+class SearchLogIndex(AppendProgressTracker):
+    """
+    会话记录倒排索引
+
+    - 追加写入起点与该会话的累加进度相符才直接索引；其他进程写入或已有的历史数据由 sync_all 补齐；
+      会话文件变短时整体重建
+    - 更新持有 index_dir/.lock 的文件锁
+    """
+
+    def __init__(self, session_dir: Path, index_dir: Path,
+                 segments: Optional[SessionSegmentStore] = None):
+        self.session_dir = session_dir
+        self.index_dir = index_dir
+        self.segments = segments
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.postings_file = self.index_dir / SEARCH_INDEX_POSTINGS_FILE
+        self._lock_path = self.index_dir / SEARCH_INDEX_LOCK_FILE
+        self._lock_path.touch(exist_ok=True)
+        self._lock = threading.Lock()
+        self._postings: Dict[str, List[Posting]] = {}
+        self._sources: Dict[str, int] = {}
+        self._loaded_bytes = 0
+        self._loaded_inode: Optional[int] = None
+        # 词表中最长检索词的长度（查询切分时的最大匹配长度）
+        self._max_query_token_len = 0
+
+    # ------------------------------------------------------------------
+    # 倒排日志
+    # ------------------------------------------------------------------
+
+    def _add_line(self, line: bytes) -> bool:
+        """把倒排日志中的一行加入内存索引，返回该行是否有效"""
+        try:
+            entry = json.loads(line)
+            stem, end = entry['s'], entry['e']
+        except (ValueError, KeyError, TypeError):
+            return False
+        for offset, terms in entry.get('p', ()):
+            posting = (stem, offset)
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = []
+                    if term.startswith(QUERY_TERM_PREFIX):
+                        self._max_query_token_len = max(self._max_query_token_len,
+                                                        len(term) - len(QUERY_TERM_PREFIX))
+                postings.append(posting)
+        self._sources[stem] = end
+        return True
+
+    def _refresh_locked(self) -> None:
+        """补读倒排日志中其他进程追加的行；日志被重建（换了文件）或版本不符时从头加载"""
+        try:
+            stat = self.postings_file.stat()
+        except FileNotFoundError:
+            self._postings, self._sources, self._max_query_token_len = {}, {}, 0
+            self._loaded_bytes, self._loaded_inode = 0, None
+            return
+        if stat.st_ino != self._loaded_inode or stat.st_size < self._loaded_bytes:
+            self._postings, self._sources, self._max_query_token_len = {}, {}, 0
+            self._loaded_bytes, self._loaded_inode = 0, stat.st_ino
+        if stat.st_size == self._loaded_bytes:
+            return
+
+        with open(self.postings_file, 'rb') as f:
+            f.seek(self._loaded_bytes)
+            data = f.read(stat.st_size - self._loaded_bytes)
+        consumed = data.rfind(b'\n') + 1
+        lines = data[:consumed].splitlines()
+        if self._loaded_bytes == 0:
+            try:
+                header = json.loads(lines[0]) if lines else {}
+            except ValueError:
+                header = {}
+            if header.get('version') != SEARCH_INDEX_VERSION:
+                # 旧版本 / 损坏的日志：视为空索引，下次 sync_all 重建
+                self._loaded_bytes, self._loaded_inode = 0, None
+                return
+            lines = lines[1:]
+        for line in lines:
+            if line.strip() and not self._add_line(line):
+                print(f"跳过损坏的倒排日志行 {self.postings_file}")
+        self._loaded_bytes += consumed
+
+    def _write_locked(self, lines: List[bytes], reset: bool = False) -> None:
+        """追加倒排日志行（reset 时以新文件替换整个日志）；需持有锁且已补读"""
+        if reset or self._loaded_inode is None:
+            tmp_path = self.postings_file.with_name(self.postings_file.name + f'.{os.getpid()}.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(json.dumps({'version': SEARCH_INDEX_VERSION}).encode('ascii') + b'\n')
+                f.writelines(lines)
+            os.replace(tmp_path, self.postings_file)
+            self._postings, self._sources, self._max_query_token_len = {}, {}, 0
+            self._loaded_bytes, self._loaded_inode = 0, None
+        else:
+            with open(self.postings_file, 'r+b') as f:
+                # 丢弃上次写入中断留下的不完整行
+                f.truncate(self._loaded_bytes)
+                f.seek(self._loaded_bytes)
+                f.writelines(lines)
+        self._refresh_locked()
+
+    # ------------------------------------------------------------------
+    # 累加
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _index_bytes(data: bytes, position: int) -> Tuple[List[Tuple[int, List[str]]], int]:
+        """为一段JSONL字节中的完整行生成倒排项，返回 ([(记录偏移, 索引项)], 消费的字节数)"""
+        consumed = data.rfind(b'\n') + 1
+        postings: List[Tuple[int, List[str]]] = []
+        offset = position
+        for raw_line in data[:consumed].splitlines(keepends=True):
+            line = raw_line.strip()
+            if line:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    postings.append((offset, sorted(record_terms(record))))
+            offset += len(raw_line)
+        return postings, consumed
+
+    @staticmethod
+    def _log_line(stem: str, end: int, postings: List[Tuple[int, List[str]]]) -> bytes:
+        return json.dumps({'s': stem, 'e': end, 'p': postings},
+                          ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+    def on_append(self, session_file: Path, start_offset: int, data: bytes) -> None:
+        """
+        追加写入监听器：累加进度恰好覆盖到写入起点时直接索引
+        （倒排日志还不存在时新建，其他会话的进度为 0，之后由 sync_all 补齐）
+        """
+        logical_start = self._append_start(session_file, start_offset)
+        if logical_start is None:
+            return
+        with self._lock, locked_file(self._lock_path):
+            self._refresh_locked()
+            if self._sources.get(session_file.stem, 0) != logical_start:
+                return
+            postings, consumed = self._index_bytes(data, logical_start)
+            self._write_locked([self._log_line(session_file.stem, logical_start + consumed, postings)])
+
+    def _catch_up_lines(self, session_file: Path, start: int) -> List[bytes]:
+        lines: List[bytes] = []
+        for position, chunk in self._iter_logical_chunks(session_file, start):
+            postings, consumed = self._index_bytes(chunk, position)
+            if consumed:
+                lines.append(self._log_line(session_file.stem, position + consumed, postings))
+        return lines
+
+    def sync_all(self) -> None:
+        """补齐所有会话（只对比逻辑长度，未变化的会话不读取）；有会话变短或索引不可用时整体重建"""
+        sizes = self._logical_sizes()
+        with self._lock, locked_file(self._lock_path):
+            self._refresh_locked()
+            reset = self._loaded_inode is None or self._shrunk(self._sources, sizes)
+            lines: List[bytes] = []
+            for session_file, covered, _ in self._pending_ranges({} if reset else self._sources, sizes):
+                try:
+                    lines.extend(self._catch_up_lines(session_file, covered))
+                except Exception as e:
+                    print(f"补齐检索索引失败 {session_file}: {str(e)}")
+            if lines or reset:
+                self._write_locked(lines, reset)
+
+    def rebuild(self) -> None:
+        """从全部会话记录重建索引"""
+        with self._lock, locked_file(self._lock_path):
+            self._write_locked([], reset=True)
+        self.sync_all()
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def lookup_query_terms(self, text: Any) -> List[str]:
+        """
+        查询文本 -> 检索词索引项（按出现顺序去重）
+
+        在索引词表上做正向最长匹配：每个位置取词表中最长的检索词，空白和停用词跳过；
+        词表覆盖不到的连续字符合为一个索引项，它没有倒排列表，查询结果为空
+        （写入时 jieba 切出的任何包含这些字符的词都不在索引中，结果与 jieba 分词一致）
+        """
+        if not isinstance(text, str) or not text.strip():
+            return []
+        text = text.lower()
+        terms: Dict[str, None] = {}
+        unmatched = ''
+        with self._lock:
+            self._refresh_locked()
+            position = 0
+            while position < len(text):
+                term = None
+                for length in range(min(self._max_query_token_len, len(text) - position), 0, -1):
+                    if QUERY_TERM_PREFIX + text[position:position + length] in self._postings:
+                        term = text[position:position + length]
+                        break
+                if term is None and not text[position].isspace() and text[position] not in QUERY_STOPWORDS:
+                    unmatched += text[position]
+                    position += 1
+                    continue
+                if unmatched:
+                    terms[QUERY_TERM_PREFIX + unmatched] = None
+                    unmatched = ''
+                if term is None:
+                    position += 1
+                else:
+                    if term not in QUERY_STOPWORDS:
+                        terms[QUERY_TERM_PREFIX + term] = None
+                    position += len(term)
+        if unmatched:
+            terms[QUERY_TERM_PREFIX + unmatched] = None
+        return list(terms)
+
+    def _lists(self, terms: Iterable[str]) -> List[List[Posting]]:
+        with self._lock:
+            self._refresh_locked()
+            return [list(self._postings.get(term, ())) for term in dict.fromkeys(terms)]
+
+    def search(self, terms: Iterable[str]) -> List[Posting]:
+        """同时含有全部索引项的记录，按 (会话文件名, 偏移) 排序"""
+        lists = sorted(self._lists(terms), key=len)
+        if not lists:
+            return []
+        matched = set(lists[0])
+        for postings in lists[1:]:
+            matched.intersection_update(postings)
+            if not matched:
+                break
+        return sorted(matched)
+
+    def search_sessions(self, terms: Iterable[str]) -> Dict[str, List[int]]:
+        """
+        每个索引项都出现过（不要求在同一条记录中）的会话：会话文件名 -> 命中任一索引项的记录偏移
+        """
+        lists = self._lists(terms)
+        if not lists:
+            return {}
+        sessions: Optional[Set[str]] = None
+        for postings in sorted(lists, key=len):
+            stems = {stem for stem, _ in postings}
+            sessions = stems if sessions is None else sessions & stems
+            if not sessions:
+                return {}
+        result: Dict[str, Set[int]] = {stem: set() for stem in sorted(sessions)}
+        for postings in lists:
+            for stem, offset in postings:
+                if stem in result:
+                    result[stem].add(offset)
+        return {stem: sorted(offsets) for stem, offsets in result.items()}
+
+    def term_count(self) -> int:
+        with self._lock:
+            return len(self._postings)
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+会话文件的旁路索引
+为 interaction_stats/sessions/*.jsonl 维护体积很小的摘要文件，
+使列出会话时无需重新读取和解析每个JSONL文件。
+"""
+
+import json
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from interaction_append_tracking import AppendProgressTracker
+from interaction_event_writer import locked_file
+from interaction_session_segments import SessionSegmentStore
+
+# 摘要文件格式版本，结构变化时递增以触发重建
+SUMMARY_VERSION = 1
+# 摘要中保留的检索会话数量上限
+SUMMARY_MAX_SEARCH_SESSIONS = 5
+# 偏移索引中每个条目的字节数（uint64，小端）
+OFFSET_ENTRY_SIZE = 8
+# 补齐偏移索引时每次读取的数据块大小
+OFFSET_SCAN_CHUNK_SIZE = 1024 * 1024
+
+
+def _new_summary() -> Dict[str, Any]:
+    """空的会话摘要"""
+    return {
+        'version': SUMMARY_VERSION,
+        'byte_length': 0,
+        'mtime': None,
+        'total_events': 0,
+        'corrupt_lines': 0,
+        'event_types': {},
+        'session_start': None,
+        'session_end': None,
+        'search_sessions_count': 0,
+        'search_sessions': [],
+    }
+
+
+def fold_record_into_summary(summary: Dict[str, Any], record: Dict[str, Any]) -> None:
+    """将一条会话记录（事件或聚合检索日志）累加到摘要中"""
+    event_type = record.get('event_type', 'unknown')
+    summary['total_events'] += 1
+    summary['event_types'][event_type] = summary['event_types'].get(event_type, 0) + 1
+
+    if event_type == 'session_start' and not summary['session_start']:
+        summary['session_start'] = record.get('timestamp')
+    elif event_type == 'session_end':
+        summary['session_end'] = record.get('timestamp')
+    elif event_type == 'search_session_start':
+        summary['search_sessions_count'] += 1
+        if len(summary['search_sessions']) < SUMMARY_MAX_SEARCH_SESSIONS:
+            summary['search_sessions'].append({
+                'search_id': record.get('search_id'),
+                'query': record.get('query'),
+                'timestamp': record.get('timestamp')
+            })
+
+
+def fold_bytes_into_summary(summary: Dict[str, Any], data: bytes) -> int:
+    """
+    将一段JSONL字节累加到摘要中，只处理以换行结尾的完整行
+
+    Returns:
+        实际消费的字节数（不包含末尾未写完的半行）
+    """
+    consumed = data.rfind(b'\n') + 1
+    for raw_line in data[:consumed].splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            summary['corrupt_lines'] += 1
+            continue
+        if isinstance(record, dict):
+            fold_record_into_summary(summary, record)
+        else:
+            summary['corrupt_lines'] += 1
+    summary['byte_length'] += consumed
+    return consumed
+
+
+class SessionSummaryIndex(AppendProgressTracker):
+    """
+    会话摘要索引
+
+    - 追加写入时（通过写入监听器）增量更新摘要，不重新读取文件
+    - 读取时用文件大小 / 修改时间校验摘要：
+      文件变大则只解析新增部分，变小或被改写则整体重建
+    - 摘要持久化到 index_dir/<会话文件名>.summary.json，服务重启后依然有效
+    - 提供分段存储时，byte_length 为逻辑偏移（已轮转的分段 + 活跃文件），
+      轮转不改变逻辑长度，摘要无需重建
+    """
+
+    def __init__(self, session_dir: Path, index_dir: Path,
+                 segments: Optional[SessionSegmentStore] = None):
+        self.session_dir = session_dir
+        self.index_dir = index_dir
+        self.segments = segments
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _summary_path(self, session_file: Path) -> Path:
+        return self.index_dir / (session_file.name + '.summary.json')
+
+    def _load(self, session_file: Path) -> Dict[str, Any]:
+        """从内存或摘要文件加载摘要；不存在或版本不符时返回空摘要"""
+        summary = self._summaries.get(session_file.name)
+        if summary is not None:
+            return summary
+        summary_path = self._summary_path(session_file)
+        try:
+            with open(summary_path, 'r', encoding='utf-8') as f:
+                summary = json.load(f)
+            if summary.get('version') != SUMMARY_VERSION:
+                summary = _new_summary()
+        except (OSError, ValueError):
+            summary = _new_summary()
+        self._summaries[session_file.name] = summary
+        return summary
+
+    def _persist(self, session_file: Path, summary: Dict[str, Any]) -> None:
+        """原子地写出摘要文件（先写临时文件再替换）"""
+        summary_path = self._summary_path(session_file)
+        tmp_path = summary_path.with_name(summary_path.name + f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False)
+        os.replace(tmp_path, summary_path)
+
+    def on_append(self, session_file: Path, start_offset: int, data: bytes) -> None:
+        """
+        追加写入监听器：若摘要恰好覆盖到本次写入的起点，直接累加新写入的行；
+        否则（其他进程写入过 / 摘要过期）留待下次读取时校验并补齐
+        """
+        logical_start = self._append_start(session_file, start_offset)
+        if logical_start is None:
+            return
+        with self._lock:
+            summary = self._load(session_file)
+            if summary['byte_length'] != logical_start:
+                return
+            fold_bytes_into_summary(summary, data)
+            summary['mtime'] = session_file.stat().st_mtime
+            self._persist(session_file, summary)
+
+    def get(self, session_file: Path, stat_result: Optional[os.stat_result] = None) -> Dict[str, Any]:
+        """
+        获取会话文件的最新摘要
+
+        Args:
+            session_file: 会话JSONL文件
+            stat_result: 调用方已经获取的 stat 结果（避免重复 stat）
+        """
+        if stat_result is None:
+            stat_result = session_file.stat()
+        size = self._logical_offset(session_file, stat_result.st_size)
+        with self._lock:
+            summary = self._load(session_file)
+            if summary['byte_length'] == size and summary['mtime'] == stat_result.st_mtime:
+                return summary
+
+            if size < summary['byte_length'] or (size == summary['byte_length'] and size > 0):
+                # 文件被截断或原地改写：整体重建
+                summary = _new_summary()
+                self._summaries[session_file.name] = summary
+
+            if size > summary['byte_length']:
+                for _, chunk in self._iter_logical_chunks(session_file, summary['byte_length']):
+                    fold_bytes_into_summary(summary, chunk)
+
+            summary['mtime'] = stat_result.st_mtime
+            self._persist(session_file, summary)
+            return summary
+
+    def invalidate(self, session_file: Path) -> None:
+        """丢弃会话文件的摘要（文件被删除或改写后调用）"""
+        with self._lock:
+            self._summaries.pop(session_file.name, None)
+            try:
+                self._summary_path(session_file).unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _line_ends(data: bytes, base_offset: int) -> List[int]:
+    """返回 data 中每个换行符之后的绝对偏移（即每个完整行的结束位置）"""
+    ends: List[int] = []
+    position = data.find(b'\n')
+    while position != -1:
+        ends.append(base_offset + position + 1)
+        position = data.find(b'\n', position + 1)
+    return ends
+
+
+class SessionOffsetIndex(AppendProgressTracker):
+    """
+    会话文件的字节偏移行索引
+
+    - index_dir/<会话文件名>.idx 顺序存放每个完整行的结束偏移（uint64，小端）
+    - 第 i 行的字节范围为 [ends[i-1], ends[i])，最后一个条目即索引已覆盖的字节数
+    - 追加写入时（通过写入监听器）只在索引末尾追加新行的偏移
+    - 读取前若发现文件比索引覆盖的范围更长（其他进程写入 / 索引缺失），只扫描未覆盖的部分
+    - 读取任意一页只需两次 seek，耗时和内存与会话总长度无关
+    - 只索引活跃文件（不设置分段存储），偏移即活跃文件内的偏移，轮转后由调用方废弃索引
+    """
+
+    def __init__(self, session_dir: Path, index_dir: Path):
+        self.session_dir = session_dir
+        self.index_dir = index_dir
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _idx_path(self, session_file: Path) -> Path:
+        return self.index_dir / (session_file.name + '.idx')
+
+    @staticmethod
+    def _read_entries(idx_path: Path, first: int, count: int) -> List[int]:
+        """读取第 first 个起的 count 个偏移条目"""
+        if count <= 0:
+            return []
+        with open(idx_path, 'rb') as f:
+            f.seek(first * OFFSET_ENTRY_SIZE)
+            data = f.read(count * OFFSET_ENTRY_SIZE)
+        entry_count = len(data) // OFFSET_ENTRY_SIZE
+        return list(struct.unpack(f'<{entry_count}Q', data[:entry_count * OFFSET_ENTRY_SIZE]))
+
+    def _state(self, idx_path: Path) -> Tuple[int, int]:
+        """返回（索引已覆盖的字节数, 已索引的行数）"""
+        try:
+            line_count = idx_path.stat().st_size // OFFSET_ENTRY_SIZE
+        except FileNotFoundError:
+            return 0, 0
+        if line_count == 0:
+            return 0, 0
+        return self._read_entries(idx_path, line_count - 1, 1)[0], line_count
+
+    @staticmethod
+    def _append_entries(idx_path: Path, ends: List[int]) -> None:
+        if ends:
+            with open(idx_path, 'ab') as f:
+                # 上次写入中断留下的不完整条目会让之后的条目全部错位，先截断到整条目边界
+                size = f.seek(0, os.SEEK_END)
+                if size % OFFSET_ENTRY_SIZE:
+                    f.truncate(size - size % OFFSET_ENTRY_SIZE)
+                f.write(struct.pack(f'<{len(ends)}Q', *ends))
+
+    def on_append(self, session_file: Path, start_offset: int, data: bytes) -> None:
+        """追加写入监听器：索引恰好覆盖到写入起点时，直接追加新行的结束偏移"""
+        logical_start = self._append_start(session_file, start_offset)
+        if logical_start is None:
+            return
+        with self._lock:
+            idx_path = self._idx_path(session_file)
+            covered, _ = self._state(idx_path)
+            if covered != logical_start:
+                return
+            self._append_entries(idx_path, _line_ends(data, start_offset))
+
+    def ensure_current(self, session_file: Path) -> int:
+        """
+        校验并补齐索引，返回已索引的完整行数
+        文件比索引覆盖范围短（被截断 / 轮转）时重建索引
+        """
+        idx_path = self._idx_path(session_file)
+        try:
+            size = session_file.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+        with self._lock:
+            covered, line_count = self._state(idx_path)
+        if covered == size:
+            return line_count
+
+        with locked_file(session_file):
+            with self._lock:
+                size = session_file.stat().st_size
+                covered, line_count = self._state(idx_path)
+                if covered > size:
+                    idx_path.unlink()
+                    covered, line_count = 0, 0
+                if covered < size:
+                    with open(session_file, 'rb') as f:
+                        f.seek(covered)
+                        pending = b''
+                        base = covered
+                        while True:
+                            chunk = f.read(OFFSET_SCAN_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            ends = _line_ends(pending + chunk, base)
+                            self._append_entries(idx_path, ends)
+                            line_count += len(ends)
+                            if ends:
+                                consumed = ends[-1] - base
+                                pending = (pending + chunk)[consumed:]
+                                base = ends[-1]
+                            else:
+                                pending += chunk
+                return line_count
+
+    def read_lines(self, session_file: Path, start: int, count: int) -> List[bytes]:
+        """按行号读取 [start, start + count) 范围内的原始行（不含换行符）"""
+        line_count = self.ensure_current(session_file)
+        return self._read_indexed_lines(session_file, line_count, start, count)
+
+    def _read_indexed_lines(self, session_file: Path, line_count: int, start: int, count: int) -> List[bytes]:
+        """在已补齐的索引上读取 [start, start + count) 范围内的原始行"""
+        start = max(start, 0)
+        count = min(count, line_count - start)
+        if count <= 0:
+            return []
+
+        idx_path = self._idx_path(session_file)
+        if start == 0:
+            ends = self._read_entries(idx_path, 0, count)
+            begin = 0
+        else:
+            entries = self._read_entries(idx_path, start - 1, count + 1)
+            begin, ends = entries[0], entries[1:]
+
+        with open(session_file, 'rb') as f:
+            f.seek(begin)
+            data = f.read(ends[-1] - begin)
+        return data.split(b'\n')[:-1]
+
+    def tail_lines(self, session_file: Path, n: int) -> List[bytes]:
+        """读取最后 n 行"""
+        line_count = self.ensure_current(session_file)
+        return self.read_lines(session_file, max(line_count - n, 0), n)
+
+    def line_start(self, session_file: Path, line_no: int) -> int:
+        """
+        返回第 line_no 行的起始字节偏移
+        line_no 不小于已索引的行数时返回索引已覆盖的字节数（即最后一个完整行的结束位置）
+        """
+        line_count = self.ensure_current(session_file)
+        if line_no <= 0 or line_count == 0:
+            return 0
+        entry = min(line_no, line_count) - 1
+        return self._read_entries(self._idx_path(session_file), entry, 1)[0]
+
+    def bisect_lines(self, session_file: Path, predicate: Callable[[bytes], bool]) -> int:
+        """
+        二分查找第一个满足 predicate 的行号（要求 predicate 对行序单调：前段为假、后段为真）
+        全部不满足时返回总行数；只读取 O(log n) 行
+        """
+        line_count = self.ensure_current(session_file)
+        low, high = 0, line_count
+        while low < high:
+            middle = (low + high) // 2
+            line = self._read_indexed_lines(session_file, line_count, middle, 1)
+            if line and predicate(line[0]):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def invalidate(self, session_file: Path) -> None:
+        """丢弃会话文件的偏移索引（文件被删除或改写后调用）"""
+        with self._lock:
+            try:
+                self._idx_path(session_file).unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""
+会话JSONL的分段轮转与压缩存储
+活跃会话文件（sessions/<会话>.jsonl）超过大小上限或长时间没有写入时，
+整体轮转为只读分段并 gzip 压缩，存放在 sessions/segments/<会话>/ 下，
+由 manifest.json 按顺序记录各分段。
+
+- 逻辑字节流 = 全部分段（按顺序）+ 活跃文件；分段之间、分段与活跃文件之间都以完整行为界
+- 逻辑偏移 = 已轮转的字节数 + 活跃文件内的偏移，摘要索引和存储后端都按逻辑偏移记录导入进度，
+  轮转前后同一条记录的逻辑偏移不变，因此轮转不会触发重建
+- 轮转：持有文件锁时登记清单并把活跃文件改名为未压缩的待压缩分段（瞬间完成），
+  压缩在锁外进行，完成后再更新清单并删除未压缩文件
+- 压实：把相邻的小分段合并重新压缩为一个分段
+- 读取者按清单顺序读取；读取期间分段被压缩 / 合并删除时，按最新清单从当前位置继续
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from interaction_event_writer import locked_file
+
+# 分段目录名（位于会话目录下）
+SEGMENT_DIR_NAME = "segments"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# gzip 压缩级别
+SEGMENT_COMPRESS_LEVEL = 6
+# 读取分段 / 压缩时每次处理的字节数
+SEGMENT_IO_CHUNK_SIZE = 1024 * 1024
+# 读取期间分段被替换时的最大重试次数
+SEGMENT_READ_RETRIES = 3
+
+# 轮转回调：(活跃会话文件) -> None，在持有文件锁、活跃文件已被替换为空文件后调用
+RotateListener = Callable[[Path], None]
+
+
+def _new_manifest() -> Dict[str, Any]:
+    """空的分段清单"""
+    return {
+        'version': MANIFEST_VERSION,
+        'rotated_bytes': 0,
+        'rotated_lines': 0,
+        'segments': [],
+    }
+
+
+def _segment_name(first_line: int, end_line: int, compressed: bool) -> str:
+    """分段文件名包含其覆盖的行号区间，合并后的分段名与原分段名不会冲突"""
+    prefix = 'seg' if compressed else 'raw'
+    suffix = '.jsonl.gz' if compressed else '.jsonl'
+    return f"{prefix}-{first_line:012d}-{end_line:012d}{suffix}"
+
+
+def _line_time(line: bytes) -> Optional[str]:
+    """一行记录的时间键（saved_timestamp 优先），无法解析时返回 None"""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    saved = record.get('saved_timestamp') or str(record.get('timestamp') or '').replace('T', ' ')
+    return saved or None
+
+
+class SessionSegmentStore:
+    """
+    会话分段存储
+
+    Args:
+        session_dir: 活跃会话JSONL所在目录
+    """
+
+    def __init__(self, session_dir: Path):
+        self.session_dir = session_dir
+        self.segments_root = session_dir / SEGMENT_DIR_NAME
+        # 清单缓存：会话文件名 -> (清单文件 mtime_ns, 清单)
+        self._manifests: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._rotate_listeners: List[RotateListener] = []
+        self._before_rotate_listeners: List[RotateListener] = []
+
+    def add_rotate_listener(self, listener: RotateListener) -> None:
+        """注册轮转回调（如使只覆盖活跃文件的偏移索引失效）"""
+        if listener not in self._rotate_listeners:
+            self._rotate_listeners.append(listener)
+
+    def add_before_rotate_listener(self, listener: RotateListener) -> None:
+        """
+        注册轮转前回调：持有文件锁、改名之前调用（如先送达尚未送达的追加写入通知，
+        使监听器按轮转前的已轮转字节数换算逻辑偏移）
+        """
+        if listener not in self._before_rotate_listeners:
+            self._before_rotate_listeners.append(listener)
+
+    def segment_dir(self, session_file: Path) -> Path:
+        return self.segments_root / session_file.stem
+
+    def _manifest_path(self, session_file: Path) -> Path:
+        return self.segment_dir(session_file) / MANIFEST_NAME
+
+    # ------------------------------------------------------------------
+    # 清单
+    # ------------------------------------------------------------------
+
+    def manifest(self, session_file: Path) -> Dict[str, Any]:
+        """读取分段清单（按清单文件修改时间缓存）；没有分段时返回空清单"""
+        manifest_path = self._manifest_path(session_file)
+        try:
+            mtime_ns = manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return _new_manifest()
+        with self._lock:
+            cached = self._manifests.get(session_file.name)
+            if cached is not None and cached[0] == mtime_ns:
+                return cached[1]
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取分段清单失败 {manifest_path}: {str(e)}")
+            return _new_manifest()
+        with self._lock:
+            self._manifests[session_file.name] = (mtime_ns, manifest)
+        return manifest
+
+    def _write_manifest(self, session_file: Path, manifest: Dict[str, Any]) -> None:
+        """原子地写出分段清单（需持有会话文件锁）"""
+        manifest_path = self._manifest_path(session_file)
+        tmp_path = manifest_path.with_name(manifest_path.name + f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, manifest_path)
+        with self._lock:
+            self._manifests.pop(session_file.name, None)
+
+    def rotated(self, session_file: Path) -> Tuple[int, int]:
+        """返回（已轮转的字节数, 已轮转的行数），即活跃文件在逻辑字节流中的起点"""
+        manifest = self.manifest(session_file)
+        return manifest['rotated_bytes'], manifest['rotated_lines']
+
+    def session_files_with_segments(self) -> List[Path]:
+        """有分段的会话（以活跃会话文件路径表示，活跃文件本身可能不存在）"""
+        if not self.segments_root.exists():
+            return []
+        return [
+            self.session_dir / (segment_dir.name + '.jsonl')
+            for segment_dir in sorted(self.segments_root.iterdir())
+            if (segment_dir / MANIFEST_NAME).exists()
+        ]
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def _open_segment(self, session_file: Path, segment: Dict[str, Any]):
+        path = self.segment_dir(session_file) / segment['name']
+        if segment.get('compressed'):
+            return gzip.open(path, 'rb')
+        return open(path, 'rb')
+
+    def _retrying(self, session_file: Path, read_from: Callable[[int], Iterator[Tuple[int, bytes]]],
+                  position: int) -> Iterator[bytes]:
+        """
+        从 position 开始读取；分段在读取期间被压缩 / 合并删除时，
+        清除清单缓存后按最新清单从当前位置继续
+        """
+        for attempt in range(SEGMENT_READ_RETRIES + 1):
+            try:
+                for advance, data in read_from(position):
+                    position += advance
+                    yield data
+                return
+            except FileNotFoundError:
+                if attempt == SEGMENT_READ_RETRIES:
+                    raise
+                with self._lock:
+                    self._manifests.pop(session_file.name, None)
+
+    def iter_segment_bytes(self, session_file: Path, start: int = 0,
+                           chunk_size: int = SEGMENT_IO_CHUNK_SIZE) -> Iterator[bytes]:
+        """按字节块读取逻辑偏移 start 之后的全部已轮转数据（解压后）"""
+        def read_from(position: int) -> Iterator[Tuple[int, bytes]]:
+            segment_start = 0
+            for segment in self.manifest(session_file)['segments']:
+                segment_end = segment_start + segment['raw_bytes']
+                if segment_end > position:
+                    with self._open_segment(session_file, segment) as f:
+                        if position > segment_start:
+                            f.seek(position - segment_start)
+                        while True:
+                            chunk = f.read(chunk_size)
+                            if not chunk:
+                                break
+                            yield len(chunk), chunk
+                segment_start = segment_end
+
+        yield from self._retrying(session_file, read_from, start)
+
+    def iter_segment_lines(self, session_file: Path, start_line: int = 0) -> Iterator[bytes]:
+        """逐行读取第 start_line 行之后的全部已轮转记录（不含换行符）"""
+        def read_from(line_no: int) -> Iterator[Tuple[int, bytes]]:
+            for segment in self.manifest(session_file)['segments']:
+                segment_end = segment['first_line'] + segment['lines']
+                if segment_end <= line_no:
+                    continue
+                skip = max(line_no - segment['first_line'], 0)
+                with self._open_segment(session_file, segment) as f:
+                    for index, line in enumerate(f):
+                        if index >= skip:
+                            yield 1, line.rstrip(b'\n')
+
+        yield from self._retrying(session_file, read_from, start_line)
+
+    def iter_logical_chunks(self, session_file: Path, start: int = 0,
+                            chunk_size: int = SEGMENT_IO_CHUNK_SIZE) -> Iterator[Tuple[int, bytes]]:
+        """
+        读取逻辑字节流中 start 之后的全部完整行（分段 + 活跃文件）
+
+        Yields:
+            (块的逻辑起始偏移, 以换行结尾的字节块)
+        """
+        rotated_bytes, _ = self.rotated(session_file)
+        position = start
+        pending = b''
+        if start < rotated_bytes:
+            for chunk in self.iter_segment_bytes(session_file, start, chunk_size):
+                pending += chunk
+                cut = pending.rfind(b'\n') + 1
+                if cut:
+                    yield position, pending[:cut]
+                    position += cut
+                    pending = pending[cut:]
+            if pending:
+                # 分段以完整行结尾，这里只可能是清单与文件不一致
+                print(f"分段数据不完整 {session_file}，已跳过 {len(pending)} 字节")
+                position += len(pending)
+                pending = b''
+            position = max(position, rotated_bytes)
+
+        try:
+            with open(session_file, 'rb') as f:
+                f.seek(position - rotated_bytes)
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    pending += chunk
+                    cut = pending.rfind(b'\n') + 1
+                    if cut:
+                        yield position, pending[:cut]
+                        position += cut
+                        pending = pending[cut:]
+        except FileNotFoundError:
+            return
+
+    def tail_segment_lines(self, session_file: Path, n: int) -> List[bytes]:
+        """读取已轮转数据的最后 n 行（只解压覆盖这 n 行的末尾分段）"""
+        if n <= 0:
+            return []
+        _, rotated_lines = self.rotated(session_file)
+        return list(self.iter_segment_lines(session_file, max(rotated_lines - n, 0)))
+
+    # ------------------------------------------------------------------
+    # 轮转与压实
+    # ------------------------------------------------------------------
+
+    def rotate(self, session_file: Path) -> Optional[Dict[str, Any]]:
+        """
+        将活跃会话文件轮转为新分段并压缩
+
+        Returns:
+            新分段的清单条目；活跃文件为空时返回 None
+        """
+        segment_dir = self.segment_dir(session_file)
+        with locked_file(session_file):
+            try:
+                stat_result = session_file.stat()
+            except FileNotFoundError:
+                return None
+            if stat_result.st_size == 0:
+                return None
+
+            for listener in self._before_rotate_listeners:
+                listener(session_file)
+
+            segment_dir.mkdir(parents=True, exist_ok=True)
+            with open(session_file, 'rb+') as f:
+                line_count = 0
+                last_byte = b''
+                while True:
+                    chunk = f.read(SEGMENT_IO_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    line_count += chunk.count(b'\n')
+                    last_byte = chunk[-1:]
+                if last_byte != b'\n':
+                    # 末尾被中断的半行单独成行，避免与下一段的第一行拼接
+                    f.write(b'\n')
+                    line_count += 1
+                raw_bytes = f.tell()
+
+            manifest = json.loads(json.dumps(self.manifest(session_file)))
+            first_line = manifest['rotated_lines']
+            segment = {
+                'name': _segment_name(first_line, first_line + line_count, compressed=False),
+                'compressed': False,
+                'first_line': first_line,
+                'lines': line_count,
+                'raw_bytes': raw_bytes,
+                'stored_bytes': raw_bytes,
+                'first_time': None,
+                'last_time': None,
+                'rotated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            manifest['segments'].append(segment)
+            manifest['rotated_bytes'] += raw_bytes
+            manifest['rotated_lines'] += line_count
+            # 先登记清单再改名：读取者看到的逻辑字节流始终连续
+            self._write_manifest(session_file, manifest)
+            os.rename(session_file, segment_dir / segment['name'])
+
+            # 重新创建空的活跃文件并保留原修改时间（会话列表按修改时间筛选）
+            open(session_file, 'ab').close()
+            os.utime(session_file, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns))
+
+            for listener in self._rotate_listeners:
+                try:
+                    listener(session_file)
+                except Exception as e:
+                    print(f"轮转回调执行失败 {session_file}: {str(e)}")
+
+        return self.compress_pending(session_file) or segment
+
+    def _write_compressed(self, target: Path, chunks: Iterator[bytes]) -> Tuple[int, Optional[str], Optional[str]]:
+        """
+        把字节块流压缩写入 target（先写临时文件再替换）
+
+        Returns:
+            (压缩后字节数, 第一行时间, 最后一行时间)
+        """
+        tmp_path = target.with_name(target.name + f'.{os.getpid()}.tmp')
+        first_time: Optional[str] = None
+        last_line = b''
+        pending = b''
+        with open(tmp_path, 'wb') as raw_file:
+            with gzip.GzipFile(fileobj=raw_file, mode='wb', compresslevel=SEGMENT_COMPRESS_LEVEL) as gz:
+                for chunk in chunks:
+                    gz.write(chunk)
+                    pending += chunk
+                    lines = pending.split(b'\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        if line.strip():
+                            if first_time is None:
+                                first_time = _line_time(line)
+                            last_line = line
+            raw_file.flush()
+            os.fsync(raw_file.fileno())
+        os.replace(tmp_path, target)
+        return target.stat().st_size, first_time, _line_time(last_line) if last_line else None
+
+    def compress_pending(self, session_file: Path) -> Optional[Dict[str, Any]]:
+        """
+        压缩清单中所有未压缩的分段（在文件锁外进行压缩，只在替换清单条目时持锁）
+
+        Returns:
+            最后一个被压缩的分段条目
+        """
+        segment_dir = self.segment_dir(session_file)
+        compressed_segment = None
+        for segment in list(self.manifest(session_file)['segments']):
+            if segment.get('compressed'):
+                continue
+            raw_path = segment_dir / segment['name']
+            target_name = _segment_name(segment['first_line'], segment['first_line'] + segment['lines'],
+                                        compressed=True)
+            try:
+                with open(raw_path, 'rb') as f:
+                    stored_bytes, first_time, last_time = self._write_compressed(
+                        segment_dir / target_name, iter(lambda: f.read(SEGMENT_IO_CHUNK_SIZE), b'')
+                    )
+            except FileNotFoundError:
+                # 其他进程已经完成压缩
+                continue
+
+            with locked_file(session_file):
+                manifest = json.loads(json.dumps(self.manifest(session_file)))
+                for index, current in enumerate(manifest['segments']):
+                    if current['name'] == segment['name']:
+                        manifest['segments'][index] = {
+                            **current,
+                            'name': target_name,
+                            'compressed': True,
+                            'stored_bytes': stored_bytes,
+                            'first_time': first_time,
+                            'last_time': last_time,
+                        }
+                        compressed_segment = manifest['segments'][index]
+                        self._write_manifest(session_file, manifest)
+                        break
+            try:
+                raw_path.unlink()
+            except FileNotFoundError:
+                pass
+        return compressed_segment
+
+    def compact(self, session_file: Path, min_segment_bytes: int, target_segment_bytes: int) -> int:
+        """
+        合并相邻的小分段（压缩后小于 min_segment_bytes），合并后的原始大小不超过 target_segment_bytes
+
+        Returns:
+            被合并掉的分段数
+        """
+        manifest = self.manifest(session_file)
+        groups: List[List[Dict[str, Any]]] = []
+        current: List[Dict[str, Any]] = []
+        current_raw = 0
+        for segment in manifest['segments']:
+            small = segment.get('compressed') and segment['stored_bytes'] < min_segment_bytes
+            if small and current_raw + segment['raw_bytes'] <= target_segment_bytes:
+                current.append(segment)
+                current_raw += segment['raw_bytes']
+                continue
+            if len(current) > 1:
+                groups.append(current)
+            current, current_raw = ([segment], segment['raw_bytes']) if small else ([], 0)
+        if len(current) > 1:
+            groups.append(current)
+
+        segment_dir = self.segment_dir(session_file)
+        merged_count = 0
+        for group in groups:
+            first_line = group[0]['first_line']
+            end_line = group[-1]['first_line'] + group[-1]['lines']
+            merged_name = _segment_name(first_line, end_line, compressed=True)
+
+            def group_chunks() -> Iterator[bytes]:
+                for segment in group:
+                    with self._open_segment(session_file, segment) as f:
+                        yield from iter(lambda: f.read(SEGMENT_IO_CHUNK_SIZE), b'')
+
+            try:
+                stored_bytes, first_time, last_time = self._write_compressed(segment_dir / merged_name,
+                                                                             group_chunks())
+            except FileNotFoundError:
+                continue
+
+            group_names = [segment['name'] for segment in group]
+            with locked_file(session_file):
+                manifest = json.loads(json.dumps(self.manifest(session_file)))
+                names = [segment['name'] for segment in manifest['segments']]
+                if not all(name in names for name in group_names):
+                    # 清单已被其他进程修改，放弃本组
+                    (segment_dir / merged_name).unlink()
+                    continue
+                start = names.index(group_names[0])
+                manifest['segments'][start:start + len(group)] = [{
+                    'name': merged_name,
+                    'compressed': True,
+                    'first_line': first_line,
+                    'lines': end_line - first_line,
+                    'raw_bytes': sum(segment['raw_bytes'] for segment in group),
+                    'stored_bytes': stored_bytes,
+                    'first_time': first_time,
+                    'last_time': last_time,
+                    'rotated_at': group[-1].get('rotated_at'),
+                }]
+                self._write_manifest(session_file, manifest)
+            for name in group_names:
+                try:
+                    (segment_dir / name).unlink()
+                except FileNotFoundError:
+                    pass
+            merged_count += len(group) - 1
+        return merged_count
+
+    def recover(self, session_file: Path) -> None:
+        """
+        处理轮转 / 压缩中途中断留下的状态：
+        - 清单已登记但改名未完成的待压缩分段：从清单移除（数据仍在活跃文件中）
+        - 未压缩的分段：重新压缩
+        - 不在清单中的残留文件（临时文件、已被合并的旧分段）：删除
+        """
+        segment_dir = self.segment_dir(session_file)
+        with locked_file(session_file):
+            manifest = json.loads(json.dumps(self.manifest(session_file)))
+            segments = manifest['segments']
+            if segments and not segments[-1].get('compressed') \
+                    and not (segment_dir / segments[-1]['name']).exists():
+                missing = segments.pop()
+                manifest['rotated_bytes'] -= missing['raw_bytes']
+                manifest['rotated_lines'] -= missing['lines']
+                self._write_manifest(session_file, manifest)
+
+        self.compress_pending(session_file)
+
+        known = {segment['name'] for segment in self.manifest(session_file)['segments']}
+        known.add(MANIFEST_NAME)
+        stale_before = time.time() - 60
+        for path in segment_dir.iterdir():
+            if path.name in known:
+                continue
+            try:
+                # 只清理一分钟前的残留文件，避免删除其他进程正在写入的临时文件
+                if path.stat().st_mtime < stale_before:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
@@ -37,6 +37,31 @@ interface StatCardProps {
   color?: string;
 }
 
+// web_monitor 服务地址：已轮转为压缩分段的会话需要通过其 NDJSON 接口读取完整记录
+const SESSION_API_BASE = 'http://localhost:5001';
+
+// 读取会话日志全文：活跃文件在轮转后只保留轮转之后的新记录，
+// 存在分段清单时改为从 /api/sessions/<id>/events.ndjson 读取（分段 + 活跃文件）
+const loadSessionText = async (fileName: string): Promise<string> => {
+  const sessionId = fileName.replace(/\.jsonl$/, '');
+  const manifestResponse = await fetch(`./sessions/segments/${encodeURIComponent(sessionId)}/manifest.json`);
+  if (manifestResponse.ok) {
+    const manifest = await manifestResponse.json().catch(() => null);
+    if (manifest && Array.isArray(manifest.segments) && manifest.segments.length > 0) {
+      const response = await fetch(`${SESSION_API_BASE}/api/sessions/${encodeURIComponent(sessionId)}/events.ndjson`);
+      if (!response.ok) {
+        throw new Error(`会话 ${sessionId} 已轮转为压缩分段，请先启动 web_monitor.py 再查看 (HTTP ${response.status})`);
+      }
+      return response.text();
+    }
+  }
+  const response = await fetch(`./sessions/${fileName}`);
+  if (!response.ok) {
+    throw new Error(`读取会话文件失败 (HTTP ${response.status})`);
+  }
+  return response.text();
+};
+
 const InteractionDashboard = () => {
   const [sessionFiles, setSessionFiles] = useState<string[]>([]);
   const [selectedSession, setSelectedSession] = useState<string>('');
@@ -74,8 +99,7 @@ const InteractionDashboard = () => {
 
     setIsLoading(true);
     // 读取并解析选中的聚合日志文件
-    fetch(`./sessions/${selectedSession}`)
-      .then(response => response.text())
+    loadSessionText(selectedSession)
       .then(rawData => {
         const parsedRecords = rawData.split('\n')
           .filter(line => line.trim())
@@ -93,6 +117,7 @@ const InteractionDashboard = () => {
       })
       .catch(error => {
         console.error('Error loading session data:', error);
+        setRecords([]);
         setIsLoading(false);
       });
   }, [selectedSession]);
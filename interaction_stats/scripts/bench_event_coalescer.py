@@ -0,0 +1,163 @@
+"""
+事件合并基准测试：按 session_manager.js 的发送方式（每5个事件一批，检索 / 会话事件立即发送）
+生成模拟会话的事件流，分别统计原始模式与合并模式写入的行数和字节数，并比较两种模式下
+会话文件中 timestamp 逆序的次数（检索事件立即发送、其他事件排队，原始模式本身就有少量逆序，
+合并不应再增加）。
+
+两种客户端配置：
+- shipped: 当前前端实际发送的事件（session_start / search_session_start / search_session_end / session_end），
+  心跳和可见性事件已暂停、悬停只在本地统计
+- full:    在 shipped 基础上发送每30秒一次的心跳、page_hidden / page_visible 和每次悬停的开始 / 结束事件
+
+用法：
+    python interaction_stats/scripts/bench_event_coalescer.py
+    python interaction_stats/scripts/bench_event_coalescer.py --sessions 50 --minutes 90
+"""
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from interaction_event_coalescer import (  # noqa: E402
+    ACTIVITY_SPAN_EVENT_TYPE, HEARTBEAT_EVENT_TYPE, EventCoalescer, _event_epoch,
+)
+
+QUERIES = ["人工智能导论", "机器学习", "心理健康", "数据结构与算法", "红楼梦", "经济学原理"]
+HEARTBEAT_INTERVAL_SECONDS = 30
+# 与前端一致：排队事件每5个发送一批，检索 / 会话事件立即发送
+CLIENT_BATCH_SIZE = 5
+IMMEDIATE_EVENT_TYPES = ('session_start', 'search_session_start', 'search_session_end', 'session_end')
+
+
+def _timestamp(moment: datetime) -> str:
+    """与 session_manager.js getFormattedTimestamp 相同的格式"""
+    return moment.strftime('%Y-%m-%d %H:%M:%S.') + f"{moment.microsecond // 1000:03d}"
+
+
+def generate_session(rng: random.Random, minutes: int, full: bool) -> List[Dict[str, Any]]:
+    """生成一个会话的事件流（按时间顺序）"""
+    start = datetime(2025, 10, 20, 9, 0, 0)
+    end = start + timedelta(minutes=minutes)
+    events: List[Tuple[datetime, Dict[str, Any]]] = [(start, {'event_type': 'session_start'})]
+    hidden: List[Tuple[datetime, datetime]] = []
+
+    moment = start + timedelta(seconds=rng.uniform(5, 30))
+    search_seq = 0
+    while moment < end - timedelta(minutes=2):
+        search_seq += 1
+        search_id = f"search_{search_seq}"
+        query = rng.choice(QUERIES)
+        events.append((moment, {'event_type': 'search_session_start', 'search_id': search_id, 'query': query}))
+        search_start = moment
+        for book in rng.sample(range(40), rng.randint(3, 12)):
+            moment += timedelta(seconds=rng.uniform(1, 10))
+            if full:
+                info = {'book_title': f"示例图书{book}", 'book_isbn': f"978-7-{book:05d}"}
+                events.append((moment, {'event_type': 'book_hover_start', **info}))
+                moment += timedelta(seconds=rng.uniform(0.5, 8))
+                events.append((moment, {'event_type': 'book_hover_end', **info}))
+        moment += timedelta(seconds=rng.uniform(5, 30))
+        events.append((moment, {'event_type': 'search_session_end', 'search_id': search_id, 'query': query,
+                                'duration_ms': int((moment - search_start).total_seconds() * 1000)}))
+        if full and rng.random() < 0.3:
+            # 切到其他标签页 1~5 分钟，期间没有心跳
+            away = moment + timedelta(seconds=rng.uniform(1, 5))
+            back = away + timedelta(minutes=rng.uniform(1, 5))
+            hidden.append((away, back))
+            events.append((away, {'event_type': 'page_hidden'}))
+            events.append((back, {'event_type': 'page_visible'}))
+            moment = back
+        moment += timedelta(seconds=rng.uniform(20, 180))
+    events.append((end, {'event_type': 'session_end'}))
+
+    if full:
+        beat = start + timedelta(seconds=HEARTBEAT_INTERVAL_SECONDS)
+        while beat < end:
+            if not any(away <= beat < back for away, back in hidden):
+                events.append((beat, {'event_type': HEARTBEAT_EVENT_TYPE}))
+            beat += timedelta(seconds=HEARTBEAT_INTERVAL_SECONDS)
+
+    events.sort(key=lambda item: item[0])
+    return [{'event_id': f"evt_{index}", 'timestamp': _timestamp(moment), **event}
+            for index, (moment, event) in enumerate(events)]
+
+
+def client_batches(events: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """按前端的发送方式切分批次"""
+    batches: List[List[Dict[str, Any]]] = []
+    pending: List[Dict[str, Any]] = []
+    for event in events:
+        if event['event_type'] in IMMEDIATE_EVENT_TYPES:
+            batches.append([event])
+        else:
+            pending.append(event)
+            if len(pending) >= CLIENT_BATCH_SIZE:
+                batches.append(pending)
+                pending = []
+    if pending:
+        batches.append(pending)
+    return batches
+
+
+def _inversions(records: List[Dict[str, Any]]) -> int:
+    times = [_event_epoch(record) for record in records]
+    return sum(1 for a, b in zip(times, times[1:]) if a is not None and b is not None and b < a)
+
+
+def run(sessions: int, minutes: int, full: bool, seed: int) -> Dict[str, float]:
+    rng = random.Random(seed)
+    coalescer = EventCoalescer()
+    raw_lines = raw_bytes = lines = size = heartbeats = spans = raw_inversions = inversions = 0
+    for index in range(sessions):
+        session_id = f"被试_{index:03d}"
+        events = generate_session(rng, minutes, full)
+        raw_lines += len(events)
+        raw_bytes += sum(len(json.dumps(event, ensure_ascii=False)) + 1 for event in events)
+        heartbeats += sum(event['event_type'] == HEARTBEAT_EVENT_TYPE for event in events)
+
+        written: List[Dict[str, Any]] = []
+        sent: List[Dict[str, Any]] = []
+        for batch in client_batches(events):
+            sent.extend(batch)
+            written.extend(coalescer.process(session_id, [dict(event) for event in batch], 'bench'))
+        written.extend(coalescer.drain('bench', idle_only=False).get(session_id, []))
+
+        lines += len(written)
+        size += sum(len(json.dumps(record, ensure_ascii=False)) + 1 for record in written)
+        spans += sum(record['event_type'] == ACTIVITY_SPAN_EVENT_TYPE for record in written)
+        raw_inversions += _inversions(sent)
+        inversions += _inversions(written)
+
+    return {
+        'raw_lines': raw_lines,
+        'coalesced_lines': lines,
+        'line_reduction': raw_lines / max(lines, 1),
+        'byte_reduction': raw_bytes / max(size, 1),
+        'heartbeats_per_span': heartbeats / max(spans, 1),
+        'raw_inversions': raw_inversions,
+        'inversions': inversions,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='事件合并基准测试')
+    parser.add_argument('--sessions', type=int, default=20, help='模拟会话数')
+    parser.add_argument('--minutes', type=int, default=60, help='每个会话的时长（分钟）')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    for profile, full in (('shipped', False), ('full', True)):
+        result = run(args.sessions, args.minutes, full, args.seed)
+        print(f"[{profile}] 原始 {result['raw_lines']} 行 -> 合并后 {result['coalesced_lines']} 行, "
+              f"行数 {result['line_reduction']:.2f}x, 字节 {result['byte_reduction']:.2f}x, "
+              f"每个区间 {result['heartbeats_per_span']:.1f} 次心跳, "
+              f"时间逆序 原始 {result['raw_inversions']} / 合并 {result['inversions']} 处")
+
+
+if __name__ == "__main__":
+    main()
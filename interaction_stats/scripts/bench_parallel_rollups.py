@@ -0,0 +1,106 @@
+"""
+日汇总并行累加基准测试：生成一个学期规模的模拟会话日志，
+分别以串行和多进程方式从头重建日汇总，比较耗时并校验两者生成的汇总文件完全相同。
+
+用法：
+    python interaction_stats/scripts/bench_parallel_rollups.py
+    python interaction_stats/scripts/bench_parallel_rollups.py --sessions 400 --events 3000 --workers 8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from interaction_daily_rollup import DailyRollupStore  # noqa: E402
+from interaction_session_segments import SessionSegmentStore  # noqa: E402
+
+QUERIES = ["人工智能导论", "机器学习", "深度学习入门", "数据结构与算法", "操作系统", "计算机网络",
+           "中国近代史", "红楼梦", "经济学原理", "线性代数", "概率论与数理统计", "数据库系统概论"]
+BOOKS = [f"示例图书{i}" for i in range(200)]
+
+
+def generate_sessions(session_dir: Path, sessions: int, events: int, days: int, seed: int) -> int:
+    """生成模拟会话日志，每个会话分布在学期内若干天，返回总字节数"""
+    rng = random.Random(seed)
+    semester_start = datetime(2025, 9, 1, 8, 0, 0)
+    total_bytes = 0
+    for index in range(sessions):
+        moment = semester_start + timedelta(days=rng.randrange(days), minutes=rng.randrange(600))
+        lines = []
+        search_seq = 0
+        while len(lines) < events:
+            search_seq += 1
+            search_id = f"s{search_seq}"
+            query = rng.choice(QUERIES)
+            batch = [{'event_type': 'search_session_start', 'search_id': search_id, 'query': query}]
+            for _ in range(rng.randrange(1, 6)):
+                book = rng.choice(BOOKS)
+                batch.append({'event_type': 'book_hover_start', 'book_title': book})
+                batch.append({'event_type': 'book_hover_end', 'book_title': book,
+                              'hover_duration_ms': rng.randrange(200, 8000)})
+            batch.append({'event_type': 'search_session_end', 'search_id': search_id,
+                          'duration_ms': rng.randrange(1000, 120000)})
+            for event in batch:
+                moment += timedelta(seconds=rng.randrange(1, 40))
+                event['timestamp'] = moment.isoformat(timespec='milliseconds')
+                event['saved_timestamp'] = moment.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+                lines.append(json.dumps(event, ensure_ascii=False))
+            # 偶尔跳到后面的某一天，模拟同一会话跨多天使用
+            if rng.random() < 0.05:
+                moment += timedelta(days=rng.randrange(1, 7))
+        data = ("\n".join(lines) + "\n").encode('utf-8')
+        (session_dir / f"会话 {index:04d}.jsonl").write_bytes(data)
+        total_bytes += len(data)
+    return total_bytes
+
+
+def read_rollups(rollup_dir: Path) -> Dict[str, str]:
+    return {path.name: path.read_text(encoding='utf-8')
+            for path in sorted(rollup_dir.glob("????-??-??.json"))}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="日汇总并行累加基准测试")
+    parser.add_argument("--sessions", type=int, default=200, help="会话文件数")
+    parser.add_argument("--events", type=int, default=2000, help="每个会话的事件数")
+    parser.add_argument("--days", type=int, default=120, help="学期天数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="并行进程数")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_rollups_") as tmp:
+        session_dir = Path(tmp) / "sessions"
+        session_dir.mkdir()
+        total_bytes = generate_sessions(session_dir, args.sessions, args.events, args.days, args.seed)
+        print(f"生成 {args.sessions} 个会话，共 {args.sessions * args.events} 条事件，"
+              f"{total_bytes / 1024 / 1024:.1f} MB")
+
+        results = {}
+        for workers in (1, args.workers):
+            rollup_dir = Path(tmp) / f"rollups_{workers}"
+            store = DailyRollupStore(session_dir, rollup_dir, SessionSegmentStore(session_dir))
+            start = time.perf_counter()
+            store.rebuild(workers)
+            elapsed = time.perf_counter() - start
+            results[workers] = (elapsed, read_rollups(rollup_dir))
+            print(f"workers={workers:<3d} 重建耗时 {elapsed:.2f}s，共 {len(results[workers][1])} 天的汇总")
+
+        serial_time, serial_rollups = results[1]
+        parallel_time, parallel_rollups = results[args.workers]
+        print(f"加速比: {serial_time / max(parallel_time, 1e-9):.2f}x")
+        if serial_rollups != parallel_rollups:
+            print("❌ 并行与串行生成的汇总不一致")
+            sys.exit(1)
+        print("✅ 并行与串行生成的汇总完全一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+语义匹配阶段基准测试：评估 find_books_by_task 第三阶段（字符 n-gram TF-IDF）的
+召回率、误命中与延迟。
+
+用法：
+    python interaction_stats/scripts/bench_semantic_matcher.py
+"""
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import experimental_book_library as library  # noqa: E402
+
+# 与任务关键词没有公共字符或仅部分重叠的查询 -> 期望命中的任务（None 表示期望不命中）
+# 与任务完全没有公共字符的近义词（如「焦虑」）依赖 TASK_KEYWORD_ALIASES 中登记的别名
+LABELED_QUERIES: List[Tuple[str, Optional[str]]] = [
+    ("求职技巧", "职业发展"),
+    ("就业指导", "职业发展"),
+    ("大学生创业", "职业发展"),
+    ("学习方法", "高效学习"),
+    ("脑科学", "高效学习"),
+    ("心理学", "心理健康"),
+    ("焦虑", "心理健康"),
+    ("AI伦理", "人工智能伦理"),
+    ("人工智能治理", "人工智能伦理"),
+    ("校园数字化", "智慧校园"),
+    ("物联网建设", "智慧校园"),
+    ("沟通技巧", "高情商沟通"),
+    ("说话", "高情商沟通"),
+    ("教师专业成长", "教师能力"),
+    ("信息化教学", "教师能力"),
+    ("设计教育", "教育变革"),
+    ("跳出盒子思考", "创造力"),
+    ("健康传播", "健康生活"),
+    # 只与任务别名部分重叠的改写（别名本身之外的表达）
+    ("情绪管理", "心理健康"),
+    ("面试准备", "职业发展"),
+    ("营养均衡", "健康生活"),
+    ("隐私保护", "人工智能伦理"),
+    ("创新思维", "创造力"),
+    # 不包含任何别名原文的改写
+    ("找工作", "职业发展"),
+    ("职业规划", "职业发展"),
+    ("提高学习效率", "高效学习"),
+    ("心理调适", "心理健康"),
+    ("心情不好", "心理健康"),
+    ("健康作息", "健康生活"),
+    ("锻炼身体", "健康生活"),
+    ("人际交往", "高情商沟通"),
+    ("沟通能力", "高情商沟通"),
+    ("教学设计", "教师能力"),
+    ("数字化校园建设", "智慧校园"),
+    ("算法公平", "人工智能伦理"),
+    ("头脑风暴", "创造力"),
+    ("课堂改革", "教育变革"),
+    # 无关查询
+    ("天气预报", None),
+    ("asdf", None),
+    ("股票投资", None),
+    ("旅游攻略", None),
+    # 只与任务文档共享单个字的无关查询（如「小说」与别名「说话」、「物理」与别名「物联网」）
+    ("小说", None),
+    ("物理", None),
+    ("美食", None),
+    ("历史", None),
+    ("法律", None),
+    ("音乐", None),
+    ("电影", None),
+    ("摄影", None),
+    ("篮球", None),
+    ("化学实验", None),
+    ("考研英语", None),
+    ("说明书", None),
+    ("小学数学", None),
+    ("心脏病", None),
+]
+
+
+def evaluate(top_k: int = 3) -> Dict[str, float]:
+    """计算 recall@1 / recall@k、无关查询的误命中数与命中错误任务的正例数"""
+    hit_at_1: int = 0
+    hit_at_k: int = 0
+    positives: int = 0
+    false_positives: int = 0
+    wrong_top1: int = 0
+
+    for query, expected in LABELED_QUERIES:
+        results = library.find_tasks_semantic(query, top_k=top_k)
+        keys: List[str] = [key for key, _ in results]
+        if expected is None:
+            false_positives += int(bool(keys))
+            continue
+        positives += 1
+        hit_at_1 += int(bool(keys) and keys[0] == expected)
+        wrong_top1 += int(bool(keys) and keys[0] != expected)
+        hit_at_k += int(expected in keys)
+
+    return {
+        "recall@1": hit_at_1 / max(positives, 1),
+        f"recall@{top_k}": hit_at_k / max(positives, 1),
+        "false_positives": float(false_positives),
+        "wrong_top1": float(wrong_top1),
+    }
+
+
+def measure_latency(rounds: int = 200) -> Dict[str, float]:
+    """测量语义阶段单次查询延迟（毫秒）"""
+    samples: List[float] = []
+    for _ in range(rounds):
+        for query, _ in LABELED_QUERIES:
+            start: float = time.perf_counter()
+            library.find_tasks_semantic(query, top_k=3)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": statistics.median(samples),
+        "p95_ms": samples[int(len(samples) * 0.95) - 1],
+        "max_ms": samples[-1],
+    }
+
+
+def main() -> None:
+    if library.SEMANTIC_TASK_INDEX is None:
+        print("未安装 numpy，语义匹配阶段不可用")
+        return
+
+    index = library.SEMANTIC_TASK_INDEX
+    print(f"任务数: {len(index.keys)}, 词表大小: {len(index.vocabulary)}, "
+          f"n-gram: {index.ngram_range}, 阈值: {library.SEMANTIC_MATCH_MIN_SCORE}")
+    print("-----")
+    for query, expected in LABELED_QUERIES:
+        results = library.find_tasks_semantic(query, top_k=3)
+        top = ", ".join(f"{key}({score:.2f})" for key, score in results) or "-"
+        print(f"{query:<10} 期望={expected or '无'}  结果={top}")
+    print("-----")
+    for name, value in evaluate().items():
+        print(f"{name}: {value:.2f}")
+    for name, value in measure_latency().items():
+        print(f"{name}: {value:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,20 @@ fs.readdir(sessionsDir, (err, files) => {
 
   const jsonlFiles = files.filter(file => file.endsWith('.jsonl') && !file.startsWith('.'));
 
+  // 已轮转的会话：较早的记录在 segments/<会话>/ 的压缩分段中，面板会改为通过 web_monitor 接口读取
+  const rotated = jsonlFiles.filter(file => {
+    const manifestPath = path.join(sessionsDir, 'segments', path.basename(file, '.jsonl'), 'manifest.json');
+    try {
+      const manifest = JSON.parse(fs.readFileSync(manifestPath, 'utf8'));
+      return Array.isArray(manifest.segments) && manifest.segments.length > 0;
+    } catch (e) {
+      return false;
+    }
+  });
+  if (rotated.length > 0) {
+    console.warn(`以下会话已轮转为压缩分段，查看时需要运行 web_monitor.py（/api/sessions/<id>/events.ndjson）: ${rotated.join(', ')}`);
+  }
+
   fs.writeFile(outputFile, JSON.stringify(jsonlFiles.sort(), null, 2), (err) => {
     if (err) {
       console.error('Error writing session list file:', err);
@@ -0,0 +1,114 @@
+"""
+会话JSONL并发追加压力测试：多进程 × 多线程同时向同一个文件追加大记录，
+校验每一行都是完整的JSON、没有交错或截断的行，且记录数量完全一致。
+
+用法：
+    python interaction_stats/scripts/stress_concurrent_appends.py
+    python interaction_stats/scripts/stress_concurrent_appends.py --processes 8 --threads 8 --records 500
+    python interaction_stats/scripts/stress_concurrent_appends.py --no-lock   # 对照组：不加锁的普通追加
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from interaction_event_writer import append_text  # noqa: E402
+
+
+def unlocked_append(file_path: Path, text: str) -> None:
+    """对照组：普通追加写入，不加任何锁"""
+    with open(file_path, 'a', encoding='utf-8') as f:
+        f.write(text)
+
+
+def writer_thread(file_path: Path, worker: str, records: int, payload_size: int, use_lock: bool) -> None:
+    padding: str = "事" * payload_size
+    for seq in range(records):
+        line: str = json.dumps({"worker": worker, "seq": seq, "padding": padding}, ensure_ascii=False) + "\n"
+        if use_lock:
+            append_text(file_path, line)
+        else:
+            unlocked_append(file_path, line)
+
+
+def writer_process(file_path: str, process_index: int, threads: int, records: int,
+                   payload_size: int, use_lock: bool) -> None:
+    workers: List[threading.Thread] = [
+        threading.Thread(
+            target=writer_thread,
+            args=(Path(file_path), f"p{process_index}-t{t}", records, payload_size, use_lock),
+        )
+        for t in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def verify(file_path: Path) -> Tuple[int, int, Dict[str, int]]:
+    """返回（有效行数, 损坏行数, 每个写入者的记录数）"""
+    valid: int = 0
+    torn: int = 0
+    per_worker: Dict[str, int] = {}
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                per_worker[record["worker"]] = per_worker.get(record["worker"], 0) + 1
+                valid += 1
+            except (json.JSONDecodeError, KeyError):
+                torn += 1
+    return valid, torn, per_worker
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='会话JSONL并发追加压力测试')
+    parser.add_argument('--processes', type=int, default=4, help='写入进程数')
+    parser.add_argument('--threads', type=int, default=4, help='每个进程的写入线程数')
+    parser.add_argument('--records', type=int, default=300, help='每个线程写入的记录数')
+    parser.add_argument('--payload-size', type=int, default=20000, help='每条记录的填充字符数（远大于PIPE_BUF）')
+    parser.add_argument('--no-lock', action='store_true', help='不加锁（对照组，预期出现损坏行）')
+    args = parser.parse_args()
+
+    use_lock: bool = not args.no_lock
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir) / "stress.jsonl"
+        start: float = time.perf_counter()
+        processes = [
+            multiprocessing.Process(
+                target=writer_process,
+                args=(str(file_path), p, args.threads, args.records, args.payload_size, use_lock),
+            )
+            for p in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed: float = time.perf_counter() - start
+
+        expected_workers: int = args.processes * args.threads
+        expected_total: int = expected_workers * args.records
+        valid, torn, per_worker = verify(file_path)
+        size_mb: float = file_path.stat().st_size / 1024 / 1024
+
+    print(f"加锁: {use_lock}, 写入者: {expected_workers}, 总记录: {expected_total}, "
+          f"数据量: {size_mb:.1f}MB, 耗时: {elapsed:.2f}s ({expected_total / elapsed:.0f} 行/秒)")
+    print(f"有效行: {valid}, 损坏行: {torn}")
+
+    incomplete: List[str] = [w for w, n in per_worker.items() if n != args.records]
+    ok: bool = torn == 0 and valid == expected_total and len(per_worker) == expected_workers and not incomplete
+    print("✅ 通过：没有交错或截断的行" if ok else "❌ 失败：检测到损坏或缺失的行")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
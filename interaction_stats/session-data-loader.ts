@@ -2,6 +2,10 @@
  * 会话数据加载器（新版本）
  * 负责加载和解析 interaction_stats/sessions 目录下的聚合检索JSONL文件
  * 一行对应一次检索请求（QueryLogRecord）
+ *
+ * 会话日志轮转后，较早的记录移入 sessions/segments/<会话>/ 下的 gzip 分段，
+ * 活跃文件只保留轮转之后的新记录；此时应解析 /api/sessions/<会话>/events.ndjson
+ * 导出的全文（格式与JSONL相同），而不是直接读取活跃文件
  */
 
 export interface BookLogEntry {
@@ -4,11 +4,72 @@
 用于管理交互统计文件的创建、读取和分析
 """
 
+import atexit
 import json
 import os
+import threading
+import time
+from itertools import islice
 from pathlib import Path
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Any, Optional, TypedDict
+from typing import List, Dict, Any, Iterator, Optional, Tuple, TypedDict
+
+from interaction_book_stats import BookStatsStore, merge_book_stats, with_derived_metrics
+from interaction_daily_rollup import DailyRollupStore
+from interaction_event_coalescer import EventCoalescer
+from interaction_event_writer import (
+    AppendListeners, BufferedEventWriter, FSYNC_BATCH, append_text, repair_torn_tail,
+)
+from interaction_idempotency import IdempotencyCache, SessionSeenSet, batch_key, event_key
+from interaction_reason_store import ReasonBlobStore, line_has_reason_refs
+from interaction_retention import (
+    RETENTION_ARCHIVE, RETENTION_ARCHIVE_AFTER_DAYS, RETENTION_DELETE, RETENTION_MAX_DIR_BYTES,
+    RETENTION_REPORT_MAX_AGE_DAYS, RetentionResult, RetentionRule, apply_retention, latest_archive_entries,
+)
+from interaction_session_index import SessionOffsetIndex, SessionSummaryIndex
+from interaction_search_index import SearchLogIndex
+from interaction_session_segments import SessionSegmentStore
+from interaction_storage import (
+    BOOK_EVENT_TYPES, HOVER_END_EVENT_TYPES, HOVER_START_EVENT_TYPES,
+    StatsStorageBackend, create_storage_backend,
+)
+
+# 会话事件写入配置
+# 为 True 时事件先进入内存队列，由后台线程按会话文件批量写出，接口无需等待磁盘IO
+BUFFERED_EVENT_WRITES: bool = True
+# 队列中累计多少条记录时立即刷新
+EVENT_FLUSH_MAX_EVENTS: int = 200
+# 最早的待写记录最多等待多少秒就刷新
+EVENT_FLUSH_INTERVAL_SECONDS: float = 0.5
+# fsync 策略："never" / "batch" / "interval"
+EVENT_FSYNC_POLICY: str = FSYNC_BATCH
+
+# 存储后端："jsonl"（直接扫描会话JSONL）/ "sqlite"（额外导入SQLite，按索引查询）
+# 任何后端下会话JSONL都照常写入
+STATS_STORAGE_BACKEND: str = "jsonl"
+SQLITE_DB_FILENAME: str = "interaction_stats.sqlite3"
+
+# 会话日志轮转：活跃会话文件超过该大小，或最后一次写入距今超过该时长时轮转为压缩分段
+SESSION_ROTATE_MAX_BYTES: int = 8 * 1024 * 1024
+SESSION_ROTATE_MAX_IDLE_SECONDS: int = 24 * 3600
+# 分段压实：压缩后小于该大小的相邻分段会被合并，合并后的原始大小不超过目标大小
+SEGMENT_COMPACT_MIN_BYTES: int = 256 * 1024
+SEGMENT_COMPACT_TARGET_BYTES: int = 64 * 1024 * 1024
+
+# 写入前合并心跳（-> activity_span）和悬停开始 / 结束（-> book_hover）；False 为原始模式，逐条写入
+COALESCE_SESSION_EVENTS: bool = True
+# 后台定期写出合并器中已空闲超时的活动区间和悬停的间隔（秒），避免它们只在读取或退出时落盘
+COALESCE_DRAIN_INTERVAL_SECONDS: float = 30
+
+# 检索日志中推荐理由的存储方式："blob"（内容寻址存储，日志行只保留哈希引用）/ "inline"（内联写入日志行）
+QUERY_LOG_REASON_STORAGE: str = "blob"
+
+# Session详情中时间线保留的最近事件数
+SESSION_TIMELINE_LENGTH: int = 20
+# /api/sessions/<id> 分页读取时单页最大行数
+SESSION_PAGE_MAX_COUNT: int = 1000
+# NDJSON 流式导出时每次从磁盘读取的字节数
+EXPORT_STREAM_CHUNK_SIZE: int = 64 * 1024
 
 class BookLogRecord(TypedDict, total=False):
     """单本图书在一次检索中的聚合交互记录"""
@@ -17,6 +78,9 @@ class BookLogRecord(TypedDict, total=False):
     isbn: Optional[str]
     logical_reason: Optional[Dict[str, Any]]
     social_reason: Optional[Dict[str, Any]]
+    # 理由以内容寻址方式存储时，日志行中以哈希引用代替理由本身
+    logical_reason_ref: str
+    social_reason_ref: str
     hover_count: int
     total_hover_time_ms: int
     click_count: int
@@ -36,26 +100,182 @@ class QueryLogRecord(TypedDict, total=False):
     books: List[BookLogRecord]
 
 
+class SessionEventsSaveResult(TypedDict):
+    """批量保存Session事件的结果"""
+    file_path: Optional[Path]
+    accepted: List[int]
+    accepted_event_types: List[str]
+    rejected: List[Dict[str, Any]]
+    duplicate_batch: bool
+    duplicates: List[int]
+
+
+def _saved_timestamp() -> str:
+    """服务器保存时间戳，格式：YYYY-MM-DD HH:MM:SS.mmm"""
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
 class StatsManager:
     """统计管理器类"""
     
-    def __init__(self):
+    def __init__(self, buffered_writes: bool = BUFFERED_EVENT_WRITES,
+                 storage_backend: str = STATS_STORAGE_BACKEND,
+                 reason_storage: str = QUERY_LOG_REASON_STORAGE,
+                 coalesce_events: bool = COALESCE_SESSION_EVENTS):
         self.base_dir = Path("interaction_stats")
         self.search_dir = self.base_dir / "search_results"
         self.panel_dir = self.base_dir / "panel_interactions"
         self.session_dir = self.base_dir / "sessions"
         self.daily_dir = self.base_dir / "daily"
         self.report_dir = self.base_dir / "summary_reports"
+        self.index_dir = self.base_dir / "session_index"
         
-        # 确保目录存在
-        for dir_path in [self.search_dir, self.panel_dir, self.session_dir, 
-                        self.daily_dir, self.report_dir]:
-            dir_path.mkdir(parents=True, exist_ok=True)
+        # 确保会话目录存在；其余输出目录在第一次写入时创建
+        self.session_dir.mkdir(parents=True, exist_ok=True)
+
+        # 会话日志分段：轮转后的只读压缩分段，读取时与活跃文件拼接为连续的逻辑流
+        self.segments = SessionSegmentStore(self.session_dir)
+        for session_file in self.segments.session_files_with_segments():
+            segments = self.segments.manifest(session_file)['segments']
+            if segments and not segments[-1].get('compressed'):
+                # 上次轮转在压缩完成前中断
+                self.segments.recover(session_file)
+        # 上次进程在写入中途退出留下的不完整末尾行：移入 sessions/quarantine/ 并截断
+        # （各旁路索引只处理以换行结尾的完整行，截断不影响它们已覆盖的进度）
+        self.recovered_session_files: List[Path] = self._recover_torn_session_tails()
+
+        # 本实例的追加写入监听器（写入会话文件并释放文件锁后按写入顺序通知）；
+        # 轮转前先送达尚未送达的通知，监听器换算逻辑偏移时用的仍是轮转前的已轮转字节数
+        self.append_listeners = AppendListeners()
+        self.segments.add_before_rotate_listener(self.append_listeners.drain)
+
+        # 会话摘要旁路索引：追加写入时增量更新，列出会话时不再重读JSONL
+        self.session_index = SessionSummaryIndex(self.session_dir, self.index_dir, self.segments)
+        self.append_listeners.add(self.session_index.on_append)
+        # 会话字节偏移行索引：支持按行号分页读取和读取末尾若干行（只覆盖活跃文件，轮转后重建）
+        self.offset_index = SessionOffsetIndex(self.session_dir, self.index_dir)
+        self.append_listeners.add(self.offset_index.on_append)
+        self.segments.add_rotate_listener(self.offset_index.invalidate)
+        # 可选的存储后端：同样通过追加写入监听器导入新记录
+        self.storage: Optional[StatsStorageBackend] = create_storage_backend(
+            storage_backend, self.session_dir, self.base_dir / SQLITE_DB_FILENAME, self.segments
+        )
+        if self.storage is not None:
+            self.append_listeners.add(self.storage.on_append)
+        # 按天增量维护的统计汇总（存储后端自带索引查询时不需要）；与图书聚合一样按间隔写回，
+        # 退出回调在缓冲写入器之前注册
+        self.rollup_dir = self.base_dir / "daily_rollups"
+        self.rollups: Optional[DailyRollupStore] = None
+        if self.storage is None:
+            self.rollups = DailyRollupStore(self.session_dir, self.rollup_dir, self.segments)
+            self.append_listeners.add(self.rollups.on_append)
+            atexit.register(self.rollups.flush)
+        # 按 ISBN 增量维护的图书交互聚合；在缓冲写入器之前注册退出回调，
+        # 保证退出时写出的剩余事件先累加、再写回磁盘
+        self.book_stats = BookStatsStore(self.session_dir, self.base_dir / "book_stats", self.segments)
+        self.append_listeners.add(self.book_stats.on_append)
+        atexit.register(self.book_stats.flush)
+        self._book_stats_synced = False
+        # 检索词 / ISBN / 事件类型 -> (会话, 偏移) 的倒排索引
+        self.search_index = SearchLogIndex(self.session_dir, self.base_dir / "search_index", self.segments)
+        self.append_listeners.add(self.search_index.on_append)
+
+        # 会话JSONL的缓冲写入器（关闭缓冲时为None，直接同步追加写入）
+        self.event_writer: Optional[BufferedEventWriter] = None
+        if buffered_writes:
+            self.event_writer = BufferedEventWriter(
+                max_batch_events=EVENT_FLUSH_MAX_EVENTS,
+                flush_interval_seconds=EVENT_FLUSH_INTERVAL_SECONDS,
+                fsync_policy=EVENT_FSYNC_POLICY,
+                listeners=self.append_listeners,
+            )
+        # 事件批次幂等键的已见集合（重启后从会话日志末尾恢复）
+        self.idempotency = IdempotencyCache(self.tail_session_events)
+        # 检索日志中推荐理由的内容寻址存储（读取时总会还原引用，与写入方式无关）
+        self.reason_storage = reason_storage
+        self.reason_store = ReasonBlobStore(self.base_dir / "reason_blobs", writer=self.event_writer)
+        # 写入前的事件合并（原始模式时为None）；退出时写出仍暂存的活动区间和悬停
+        self.coalescer: Optional[EventCoalescer] = EventCoalescer() if coalesce_events else None
+        self._coalesce_stop = threading.Event()
+        if self.coalescer is not None:
+            atexit.register(self.flush_coalesced_events, False)
+            threading.Thread(target=self._drain_coalesced_loop, name="event-coalescer", daemon=True).start()
+
+    def _session_file(self, session_id: str) -> Path:
+        """
+        将Session ID转换为会话JSONL文件路径（替换空格为下划线，保持中文字符）
+        例如：被试_001 -> 被试_001.jsonl
+        例如：交互 01_20250905 -> 交互_01_20250905.jsonl
+        """
+        return self.session_dir / (session_id.replace(' ', '_') + '.jsonl')
+
+    def _append_session_lines(self, session_file: Path, text: str, count: int = 1) -> None:
+        """追加写入会话JSONL：启用缓冲时只入队，否则同步写入"""
+        if self.event_writer is not None:
+            self.event_writer.submit(session_file, text, count)
+        else:
+            append_text(session_file, text, listeners=self.append_listeners)
+
+    def flush_pending_writes(self) -> None:
+        """写出缓冲队列中的全部事件并送达追加写入通知，读取会话文件 / 派生数据前调用以保证读到最新数据"""
+        self.flush_coalesced_events()
+        if self.event_writer is not None:
+            self.event_writer.flush()
+        self.append_listeners.drain_all()
+
+    def flush_coalesced_events(self, idle_only: bool = True) -> int:
+        """
+        写出事件合并器中暂存的记录
+
+        Args:
+            idle_only: 为 True 时只写出已经结束（超时）的活动区间和悬停；False 时全部写出（如退出时）
+
+        Returns:
+            写出的记录数
+        """
+        if self.coalescer is None:
+            return 0
+        written = 0
+        for session_id, records in self.coalescer.drain(_saved_timestamp(), idle_only).items():
+            text = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+            try:
+                self._append_session_lines(self._session_file(session_id), text, count=len(records))
+                written += len(records)
+            except Exception as e:
+                print(f"写出合并事件失败 {session_id}: {str(e)}")
+        return written
+
+    def _drain_coalesced_loop(self) -> None:
+        """后台线程：定期写出空闲超时的合并暂存记录，直到 close()"""
+        while not self._coalesce_stop.wait(COALESCE_DRAIN_INTERVAL_SECONDS):
+            self.flush_coalesced_events()
+
+    def close(self) -> None:
+        """
+        写出暂存 / 缓冲中的事件，移除本实例的追加写入监听器和退出回调并释放存储后端；
+        关闭后全局对象不再引用本实例，本实例也不应再使用
+        """
+        self._coalesce_stop.set()
+        self.flush_coalesced_events(False)
+        if self.coalescer is not None:
+            atexit.unregister(self.flush_coalesced_events)
+        if self.event_writer is not None:
+            self.event_writer.close()
+        self.append_listeners.drain_all()
+        self.append_listeners.clear()
+        self.book_stats.flush()
+        atexit.unregister(self.book_stats.flush)
+        if self.rollups is not None:
+            self.rollups.flush()
+            atexit.unregister(self.rollups.flush)
+        if self.storage is not None:
+            self.storage.close()
     
     def save_session_event(self, session_id: str, event: Dict[str, Any]) -> Optional[Path]:
         """
         保存Session事件到文件
         使用JSON Lines格式，一个Session一个文件，事件追加写入
+        启用缓冲写入时，事件进入内存队列后立即返回，由后台线程写出
 
         Args:
             session_id: 会话ID（格式：被试_001 或 交互 XX_YYYYMMDD）
@@ -65,22 +285,17 @@ class StatsManager:
             保存的文件路径，如果保存失败返回None
         """
         try:
-            # 将Session ID转换为文件名格式（替换空格为下划线，保持中文字符）
-            # 例如：被试_001 -> 被试_001.jsonl
-            # 例如：交互 01_20250905 -> 交互_01_20250905.jsonl
-            filename = session_id.replace(' ', '_') + '.jsonl'
-            session_file = self.session_dir / filename
+            session_file = self._session_file(session_id)
 
             # 添加事件记录时间
             event_with_metadata = {
                 **event,
-                'saved_timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+                'saved_timestamp': _saved_timestamp(),
                 'session_id': session_id
             }
 
             # 追加写入到JSON Lines文件
-            with open(session_file, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(event_with_metadata, ensure_ascii=False) + '\n')
+            self._append_session_lines(session_file, json.dumps(event_with_metadata, ensure_ascii=False) + '\n')
 
             return session_file
 
@@ -88,6 +303,119 @@ class StatsManager:
             print(f"保存Session事件失败: {str(e)}")
             return None
 
+    def save_session_events(self, session_id: str, events: List[Any],
+                            extra_fields: Optional[Dict[str, Any]] = None,
+                            batch_id: Optional[str] = None) -> SessionEventsSaveResult:
+        """
+        批量保存Session事件
+        整批事件只校验、打时间戳、序列化一次，并通过一次写入追加到会话文件
+
+        带幂等键（batch_id 或事件的 event_id）时，同一会话的检查与写入串行进行：
+        已写入过的批次整批确认而不再写入，已写入过的事件被跳过
+
+        Args:
+            session_id: 会话ID
+            events: 事件列表（每个事件必须是包含 event_type 的字典）
+            extra_fields: 附加到每个事件上的字段（如服务器接收时间戳）
+            batch_id: 批次幂等键（客户端重发同一批次时保持不变）
+
+        Returns:
+            保存结果：文件路径、被接受的事件下标及类型、被拒绝的事件下标及原因、
+            是否为重复批次、因重复被跳过的事件下标
+        """
+        result: SessionEventsSaveResult = {
+            'file_path': None,
+            'accepted': [],
+            'accepted_event_types': [],
+            'rejected': [],
+            'duplicate_batch': False,
+            'duplicates': [],
+        }
+        if not session_id:
+            result['rejected'] = [{'index': i, 'reason': '缺少session_id'} for i in range(len(events))]
+            return result
+
+        has_event_ids = any(isinstance(event, dict) and event.get('event_id') for event in events)
+        if not batch_id and not has_event_ids:
+            self._save_session_events(session_id, events, extra_fields, None, None, result)
+            return result
+
+        with self.idempotency.session(session_id) as seen:
+            if batch_id and seen.contains(batch_key(batch_id)):
+                result['duplicate_batch'] = True
+                result['duplicates'] = list(range(len(events)))
+                return result
+            self._save_session_events(session_id, events, extra_fields, batch_id, seen, result)
+            if result['file_path'] is not None:
+                if batch_id:
+                    seen.add(batch_key(batch_id))
+                for index in result['accepted']:
+                    if events[index].get('event_id'):
+                        seen.add(event_key(str(events[index]['event_id'])))
+        return result
+
+    def _save_session_events(self, session_id: str, events: List[Any],
+                             extra_fields: Optional[Dict[str, Any]], batch_id: Optional[str],
+                             seen: Optional[SessionSeenSet], result: SessionEventsSaveResult) -> None:
+        """
+        校验、序列化并写入一批事件，结果记入 result；seen 不为空时跳过已见过的事件
+        启用事件合并时，心跳和悬停事件先经过合并器，可能暂存到后续批次再写出
+        """
+        metadata: Dict[str, Any] = {
+            **(extra_fields or {}),
+            'saved_timestamp': _saved_timestamp(),
+            'session_id': session_id,
+        }
+        if batch_id:
+            metadata['batch_id'] = batch_id
+        entries: List[Tuple[Dict[str, Any], str]] = []
+        batch_event_ids = set()
+        for index, event in enumerate(events):
+            if not isinstance(event, dict) or 'event_type' not in event:
+                result['rejected'].append({'index': index, 'reason': '事件格式无效或缺少event_type'})
+                continue
+            event_id = event.get('event_id')
+            if seen is not None and event_id:
+                event_id = str(event_id)
+                if event_id in batch_event_ids or seen.contains(event_key(event_id)):
+                    result['duplicates'].append(index)
+                    continue
+                batch_event_ids.add(event_id)
+            record = {**event, **metadata}
+            try:
+                entries.append((record, json.dumps(record, ensure_ascii=False)))
+            except (TypeError, ValueError) as e:
+                result['rejected'].append({'index': index, 'reason': f'序列化失败: {str(e)}'})
+                continue
+            result['accepted'].append(index)
+            result['accepted_event_types'].append(event['event_type'])
+
+        if self.coalescer is not None and entries:
+            # 合并心跳和悬停：原样通过的记录复用已序列化的行，合并产生的记录重新序列化
+            serialized = {id(record): line for record, line in entries}
+            coalesced = self.coalescer.process(session_id, [record for record, _ in entries],
+                                               metadata['saved_timestamp'])
+            lines = [serialized.get(id(record)) or json.dumps(record, ensure_ascii=False)
+                     for record in coalesced]
+        else:
+            lines = [line for _, line in entries]
+
+        session_file = self._session_file(session_id)
+        if not lines:
+            # 全部被暂存在合并器中（或没有有效事件）
+            if entries:
+                result['file_path'] = session_file
+            return
+
+        try:
+            self._append_session_lines(session_file, '\n'.join(lines) + '\n', count=len(lines))
+            result['file_path'] = session_file
+        except Exception as e:
+            print(f"批量保存Session事件失败: {str(e)}")
+            result['rejected'].extend({'index': i, 'reason': '写入失败'} for i in result['accepted'])
+            result['accepted'] = []
+            result['accepted_event_types'] = []
+
     def save_query_log_record(self, record: QueryLogRecord) -> Optional[Path]:
         """
         保存聚合后的检索日志记录（QueryLogRecord）到JSONL文件
@@ -107,22 +435,75 @@ class StatsManager:
             if not session_id:
                 raise ValueError("缺少 session_id 字段，无法保存聚合检索日志")
 
-            filename = session_id.replace(" ", "_") + ".jsonl"
-            session_file = self.session_dir / filename
+            session_file = self._session_file(session_id)
 
             record_with_metadata: Dict[str, Any] = {
                 **record,
-                "saved_timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                "saved_timestamp": _saved_timestamp(),
             }
+            if self.reason_storage == "blob" and "books" in record:
+                # 理由只写入一次内容寻址存储，日志行中只保留哈希引用
+                record_with_metadata["books"] = self.reason_store.dehydrate_books(record["books"])
 
-            with open(session_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(record_with_metadata, ensure_ascii=False) + "\n")
+            self._append_session_lines(session_file, json.dumps(record_with_metadata, ensure_ascii=False) + "\n")
 
             return session_file
         except Exception as e:
             print(f"保存聚合检索日志失败: {str(e)}")
             return None
     
+    def _recover_torn_session_tails(self) -> List[Path]:
+        """启动时检查各会话文件的最后一个字节，不以换行结尾的加锁后隔离末尾的半行"""
+        recovered = []
+        for session_file in sorted(self.session_dir.glob("*.jsonl")):
+            try:
+                with open(session_file, 'rb') as f:
+                    size = f.seek(0, os.SEEK_END)
+                    if size == 0:
+                        continue
+                    f.seek(size - 1)
+                    if f.read(1) == b'\n':
+                        continue
+                if repair_torn_tail(session_file) is not None:
+                    recovered.append(session_file)
+            except OSError as e:
+                print(f"检查会话文件末尾失败 {session_file}: {str(e)}")
+        return recovered
+
+    def iter_session_events(self, session_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        逐条读取指定Session的事件（流式，不把整个会话加载到内存）
+
+        Args:
+            session_id: 会话ID（格式：交互 XX_YYYYMMDD）
+
+        Yields:
+            事件字典
+        """
+        self.flush_pending_writes()
+        session_file = self._session_file(session_id)
+
+        if not session_file.exists():
+            return
+
+        # 逐行解析：损坏的行单独跳过，不影响其后的事件
+        try:
+            # 先按顺序读取已轮转的压缩分段，再读取活跃文件
+            for line in self.segments.iter_segment_lines(session_file):
+                event = self._parse_event_line(line)
+                if event is not None:
+                    yield event
+            with open(session_file, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # 没有换行的末尾行尚未写完（或写入中断，下次追加 / 启动时隔离）
+                        break
+                    event = self._parse_event_line(line)
+                    if event is not None:
+                        yield event
+        except OSError as e:
+            print(f"加载Session事件失败: {str(e)}")
+
     def load_session_events(self, session_id: str) -> List[Dict[str, Any]]:
         """
         加载指定Session的所有事件
@@ -133,29 +514,263 @@ class StatsManager:
         Returns:
             事件列表
         """
-        # 将Session ID转换为文件名格式
-        filename = session_id.replace(' ', '_') + '.jsonl'
-        session_file = self.session_dir / filename
+        return list(self.iter_session_events(session_id))
 
+    def _parse_event_line(self, line: bytes) -> Optional[Dict[str, Any]]:
+        """解析一行原始JSONL（还原理由引用）；空行、无法解析或不是对象的行返回 None"""
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            print(f"跳过无法解析的Session事件行: {str(e)}")
+            return None
+        if not isinstance(record, dict):
+            print(f"跳过不是JSON对象的Session事件行: {line[:80]!r}")
+            return None
+        return self.reason_store.rehydrate_record(record)
+
+    def _parse_event_lines(self, lines: List[bytes]) -> List[Dict[str, Any]]:
+        """解析原始JSONL行（还原理由引用），跳过空行和无法解析的行"""
+        events = []
+        for line in lines:
+            event = self._parse_event_line(line)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def count_session_events(self, session_id: str) -> int:
+        """通过分段清单和偏移索引获取Session的记录行数（不解析事件）"""
+        self.flush_pending_writes()
+        session_file = self._session_file(session_id)
+        _, rotated_lines = self.segments.rotated(session_file)
+        return rotated_lines + self.offset_index.ensure_current(session_file)
+
+    def read_session_events(self, session_id: str, start: int, count: int) -> List[Dict[str, Any]]:
+        """
+        按行号分页读取Session事件
+        活跃文件部分通过偏移索引直接定位，耗时与会话长度无关；
+        已轮转部分只解压覆盖该页的分段
+
+        Args:
+            session_id: 会话ID
+            start: 起始行号（从0开始，跨分段和活跃文件连续编号）
+            count: 读取行数
+        """
+        self.flush_pending_writes()
+        session_file = self._session_file(session_id)
         if not session_file.exists():
             return []
+        start = max(start, 0)
+        _, rotated_lines = self.segments.rotated(session_file)
+        lines: List[bytes] = []
+        if start < rotated_lines:
+            lines = list(islice(self.segments.iter_segment_lines(session_file, start),
+                                min(count, rotated_lines - start)))
+        remaining = count - len(lines)
+        if remaining > 0:
+            lines.extend(self.offset_index.read_lines(session_file, max(start - rotated_lines, 0), remaining))
+        return self._parse_event_lines(lines)
 
-        events = []
+    def tail_session_events(self, session_id: str, n: int) -> List[Dict[str, Any]]:
+        """读取Session的最后 n 条事件（活跃文件不足 n 行时从末尾分段补足）"""
+        self.flush_pending_writes()
+        session_file = self._session_file(session_id)
+        if not session_file.exists():
+            return []
+        lines = self.offset_index.tail_lines(session_file, n)
+        if len(lines) < n:
+            lines = self.segments.tail_segment_lines(session_file, n - len(lines)) + lines
+        return self._parse_event_lines(lines)
+    
+    @staticmethod
+    def parse_since(since: Optional[str]) -> Optional[str]:
+        """
+        将 since 参数（ISO 日期或日期时间）规范化为与 saved_timestamp 相同的格式，便于直接按字符串比较
+
+        Raises:
+            ValueError: since 不是合法的 ISO 日期/时间
+        """
+        if not since:
+            return None
+        since_dt = datetime.fromisoformat(since.strip().replace('Z', '+00:00'))
+        if since_dt.tzinfo is not None:
+            # saved_timestamp 为服务器本地时间
+            since_dt = since_dt.astimezone().replace(tzinfo=None)
+        return since_dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+    @staticmethod
+    def _line_saved_before(line: bytes, since_key: str) -> bool:
+        """判断一行记录的保存时间是否早于 since_key（无法解析的行视为更早）"""
         try:
-            with open(session_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        event = json.loads(line)
-                        events.append(event)
-        except Exception as e:
-            print(f"加载Session事件失败: {str(e)}")
+            record = json.loads(line)
+        except ValueError:
+            return True
+        if not isinstance(record, dict):
+            return True
+        saved = record.get('saved_timestamp') or str(record.get('timestamp') or '').replace('T', ' ')
+        return saved < since_key
+
+    def iter_session_ndjson(self, session_id: str, since: Optional[str] = None,
+                            chunk_size: int = EXPORT_STREAM_CHUNK_SIZE,
+                            resolve_reasons: bool = True) -> Iterator[bytes]:
+        """
+        以原始字节块流式读取Session的JSONL内容（不解析、不重新序列化），内存占用与会话长度无关
+
+        - 只输出调用时已完整写入的行，不会输出正在写入的半行
+        - since 为规范化后的时间（见 parse_since）：记录按 saved_timestamp 顺序追加，
+          通过偏移索引二分定位第一条不早于 since 的记录，只读取 O(log n) 行
+
+        Args:
+            session_id: 会话ID
+            since: 规范化后的起始时间，None 表示导出全部
+            chunk_size: 每次读取的字节数
+            resolve_reasons: 是否把检索日志中的理由引用还原为原内容（只重新序列化含引用的行）
+        """
+        self.flush_pending_writes()
+        session_file = self._session_file(session_id)
+        if not session_file.exists():
+            return
+        chunks = self._iter_session_file_bytes(session_file, since, chunk_size)
+        yield from (self._rehydrate_ndjson(chunks) if resolve_reasons else chunks)
+
+    def iter_export_ndjson(self, since: Optional[str] = None,
+                           chunk_size: int = EXPORT_STREAM_CHUNK_SIZE,
+                           resolve_reasons: bool = True) -> Iterator[bytes]:
+        """
+        依次流式输出所有Session的JSONL内容（每行记录都带有 session_id）
+        修改时间早于 since 的会话文件直接跳过，不打开文件
+
+        Args:
+            since: 规范化后的起始时间（见 parse_since），None 表示导出全部
+            chunk_size: 每次读取的字节数
+            resolve_reasons: 是否把检索日志中的理由引用还原为原内容
+        """
+        self.flush_pending_writes()
+        since_timestamp = None
+        if since:
+            since_timestamp = datetime.strptime(since, '%Y-%m-%d %H:%M:%S.%f').timestamp()
+
+        for session_file in sorted(self.session_dir.glob("*.jsonl")):
+            try:
+                if since_timestamp is not None and session_file.stat().st_mtime < since_timestamp:
+                    continue
+            except FileNotFoundError:
+                continue
+            chunks = self._iter_session_file_bytes(session_file, since, chunk_size)
+            yield from (self._rehydrate_ndjson(chunks) if resolve_reasons else chunks)
+
+    def iter_all_session_records(self, since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        依次流式解析所有Session的记录（按会话文件逐个读取，同一会话的记录连续出现）
+        按块读取、逐行解析，内存占用与数据量无关；理由引用不还原（统计只需要交互字段）
+
+        Args:
+            since: 规范化后的起始时间（见 parse_since），None 表示全部
+        """
+        pending = b''
+        for chunk in self.iter_export_ndjson(since=since, resolve_reasons=False):
+            data = pending + chunk
+            cut = data.rfind(b'\n') + 1
+            pending = data[cut:]
+            for line in data[:cut].splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    print(f"跳过无法解析的Session事件行: {str(e)}")
+                    continue
+                if isinstance(record, dict):
+                    yield record
+
+    def _rehydrate_ndjson(self, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """把字节块流中含理由引用的行还原为内联理由，其余行原样输出"""
+        pending = b''
+        for chunk in chunks:
+            data = pending + chunk
+            cut = data.rfind(b'\n') + 1
+            pending = data[cut:]
+            if not cut:
+                continue
+            complete = data[:cut]
+            if not line_has_reason_refs(complete):
+                yield complete
+                continue
+            out = []
+            for line in complete.splitlines(keepends=True):
+                if line_has_reason_refs(line):
+                    try:
+                        record = self.reason_store.rehydrate_record(json.loads(line))
+                        line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+                    except ValueError:
+                        pass
+                out.append(line)
+            yield b''.join(out)
+        if pending:
+            yield pending
+
+    def _iter_session_file_bytes(self, session_file: Path, since: Optional[str],
+                                 chunk_size: int) -> Iterator[bytes]:
+        """按字节块读取会话（已轮转分段 + 活跃文件）中从 since 起的完整行"""
+        try:
+            rotated_bytes, _ = self.segments.rotated(session_file)
+            if rotated_bytes:
+                segment_start = self._segment_offset_since(session_file, since) if since else 0
+                if segment_start < rotated_bytes:
+                    yield from self.segments.iter_segment_bytes(session_file, segment_start, chunk_size)
+                    # since 落在分段中时，活跃文件中的记录都不早于 since
+                    since = None
+
+            line_count = self.offset_index.ensure_current(session_file)
+            start_line = 0
+            if since:
+                start_line = self.offset_index.bisect_lines(
+                    session_file, lambda line: not self._line_saved_before(line, since)
+                )
+            if start_line >= line_count:
+                return
+            begin = self.offset_index.line_start(session_file, start_line)
+            end = self.offset_index.line_start(session_file, line_count)
+
+            with open(session_file, 'rb') as f:
+                f.seek(begin)
+                remaining = end - begin
+                while remaining > 0:
+                    chunk = f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+        except FileNotFoundError:
+            return
+
+    def _segment_offset_since(self, session_file: Path, since: str) -> int:
+        """
+        已轮转数据中第一条不早于 since 的记录的逻辑偏移（全部更早时返回已轮转字节数）
+        依据清单中各分段的最后记录时间跳过整段，只逐行扫描 since 所在的分段
+        """
+        manifest = self.segments.manifest(session_file)
+        segment_start = 0
+        for segment in manifest['segments']:
+            if segment.get('last_time') and segment['last_time'] < since:
+                segment_start += segment['raw_bytes']
+                continue
+            position = segment_start
+            for line in self.segments.iter_segment_lines(session_file, segment['first_line']):
+                if not self._line_saved_before(line, since):
+                    return position
+                position += len(line) + 1
+                if position >= segment_start + segment['raw_bytes']:
+                    break
+            segment_start += segment['raw_bytes']
+        return manifest['rotated_bytes']
 
-        return events
-    
     def list_sessions(self, days: int = 7) -> List[Dict[str, Any]]:
         """
         列出最近几天的Session
+        基于会话摘要索引，开销与会话数量成正比，而不是与全部事件字节数成正比
 
         Args:
             days: 天数
@@ -163,13 +778,18 @@ class StatsManager:
         Returns:
             Session摘要列表
         """
+        self.flush_pending_writes()
+        if self.storage is not None:
+            return self.storage.list_sessions(days)
+
         sessions = []
-        cutoff_date = datetime.now() - timedelta(days=days)
+        cutoff_timestamp = (datetime.now() - timedelta(days=days)).timestamp()
 
         for session_file in self.session_dir.glob("*.jsonl"):
             try:
                 # 从文件修改时间判断是否在时间范围内
-                if datetime.fromtimestamp(session_file.stat().st_mtime) < cutoff_date:
+                stat_result = session_file.stat()
+                if stat_result.st_mtime < cutoff_timestamp:
                     continue
 
                 # 从文件名解析Session ID（将下划线转换回空格）
@@ -177,40 +797,19 @@ class StatsManager:
                 filename = session_file.stem
                 session_id = filename.replace('_', ' ', 1)  # 只替换第一个下划线
 
-                events = self.load_session_events(session_id)
+                summary = self.session_index.get(session_file, stat_result)
 
-                if not events:
+                if not summary['total_events']:
                     continue
 
-                # 分析Session基本信息
-                session_start = None
-                session_end = None
-                event_types = {}
-                search_sessions = []
-
-                for event in events:
-                    event_type = event.get('event_type', 'unknown')
-                    event_types[event_type] = event_types.get(event_type, 0) + 1
-
-                    if event_type == 'session_start' and not session_start:
-                        session_start = event.get('timestamp')
-                    elif event_type == 'session_end':
-                        session_end = event.get('timestamp')
-                    elif event_type == 'search_session_start':
-                        search_sessions.append({
-                            'search_id': event.get('search_id'),
-                            'query': event.get('query'),
-                            'timestamp': event.get('timestamp')
-                        })
-
                 sessions.append({
                     'session_id': session_id,
-                    'session_start': session_start,
-                    'session_end': session_end,
-                    'total_events': len(events),
-                    'event_types': event_types,
-                    'search_sessions_count': len(search_sessions),
-                    'search_sessions': search_sessions[:5],  # 只显示前5个
+                    'session_start': summary['session_start'],
+                    'session_end': summary['session_end'],
+                    'total_events': summary['total_events'],
+                    'event_types': dict(summary['event_types']),
+                    'search_sessions_count': summary['search_sessions_count'],
+                    'search_sessions': list(summary['search_sessions']),  # 只显示前5个
                     'file_path': str(session_file)
                 })
 
@@ -219,9 +818,54 @@ class StatsManager:
                 continue
 
         # 按开始时间排序
-        sessions.sort(key=lambda x: x.get('session_start', ''), reverse=True)
+        sessions.sort(key=lambda x: x.get('session_start') or '', reverse=True)
         return sessions
     
+    def rotate_session_logs(self, max_bytes: int = SESSION_ROTATE_MAX_BYTES,
+                            max_idle_seconds: int = SESSION_ROTATE_MAX_IDLE_SECONDS) -> List[Dict[str, Any]]:
+        """
+        轮转会话日志：活跃文件超过 max_bytes，或最后一次写入距今超过 max_idle_seconds 时，
+        整体转为 gzip 压缩分段；之后的读取会透明地跨分段进行
+
+        Returns:
+            新生成的分段列表（含会话ID）
+        """
+        self.flush_pending_writes()
+        rotated = []
+        now = time.time()
+        for session_file in sorted(self.session_dir.glob("*.jsonl")):
+            try:
+                stat_result = session_file.stat()
+                if stat_result.st_size == 0:
+                    continue
+                if stat_result.st_size < max_bytes and now - stat_result.st_mtime < max_idle_seconds:
+                    continue
+                segment = self.segments.rotate(session_file)
+                if segment is not None:
+                    rotated.append({'session_id': session_file.stem, **segment})
+            except Exception as e:
+                print(f"轮转会话日志失败 {session_file}: {str(e)}")
+        return rotated
+
+    def compact_session_segments(self, min_segment_bytes: int = SEGMENT_COMPACT_MIN_BYTES,
+                                 target_segment_bytes: int = SEGMENT_COMPACT_TARGET_BYTES) -> Dict[str, int]:
+        """
+        压实会话分段：合并相邻的小分段，并清理中断的轮转 / 压实留下的残留文件
+
+        Returns:
+            会话ID -> 被合并掉的分段数
+        """
+        merged = {}
+        for session_file in self.segments.session_files_with_segments():
+            try:
+                self.segments.recover(session_file)
+                count = self.segments.compact(session_file, min_segment_bytes, target_segment_bytes)
+                if count:
+                    merged[session_file.stem] = count
+            except Exception as e:
+                print(f"压实会话分段失败 {session_file}: {str(e)}")
+        return merged
+
     def get_session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
         """
         获取特定Session的详细摘要
@@ -232,28 +876,21 @@ class StatsManager:
         Returns:
             Session摘要字典
         """
-        events = self.load_session_events(session_id)
-        
-        if not events:
-            return None
-        
-        # 分析Session数据
+        if self.storage is not None:
+            return self._get_session_summary_from_storage(session_id)
+
+        # 分析Session数据（流式遍历，不保留完整事件列表和时间线）
         session_start = None
         session_end = None
         search_sessions = []
         book_interactions = {}
-        event_timeline = []
+        total_events = 0
         
-        for event in events:
+        for event in self.iter_session_events(session_id):
+            total_events += 1
             event_type = event.get('event_type', 'unknown')
             timestamp = event.get('timestamp')
             
-            event_timeline.append({
-                'timestamp': timestamp,
-                'event_type': event_type,
-                'summary': self._get_event_summary(event)
-            })
-            
             if event_type == 'session_start':
                 session_start = timestamp
             elif event_type == 'session_end':
@@ -276,7 +913,7 @@ class StatsManager:
                             'end_reason': event.get('end_reason')
                         })
                         break
-            elif event_type in ['book_clicked', 'book_hover_start', 'book_hover_end']:
+            elif event_type in BOOK_EVENT_TYPES:
                 book_isbn = event.get('book_isbn', 'unknown')
                 book_title = event.get('book_title', 'unknown')
                 
@@ -291,28 +928,69 @@ class StatsManager:
                 
                 if event_type == 'book_clicked':
                     book_interactions[book_isbn]['click_count'] += 1
-                elif event_type == 'book_hover_start':
+                if event_type in HOVER_START_EVENT_TYPES:
                     book_interactions[book_isbn]['hover_count'] += 1
-                elif event_type == 'book_hover_end':
+                if event_type in HOVER_END_EVENT_TYPES:
                     hover_duration = event.get('hover_duration_ms', 0)
                     book_interactions[book_isbn]['total_hover_time'] += hover_duration
         
-        session_duration = None
-        if session_start and session_end:
-            start_dt = datetime.fromisoformat(session_start.replace('Z', '+00:00'))
-            end_dt = datetime.fromisoformat(session_end.replace('Z', '+00:00'))
-            session_duration = int((end_dt - start_dt).total_seconds() * 1000)
+        if not total_events:
+            return None
+        
+        # 时间线只需要最近20个事件：通过偏移索引直接读取文件末尾
+        event_timeline = [
+            {
+                'timestamp': event.get('timestamp'),
+                'event_type': event.get('event_type', 'unknown'),
+                'summary': self._get_event_summary(event)
+            }
+            for event in self.tail_session_events(session_id, SESSION_TIMELINE_LENGTH)
+        ]
         
         return {
             'session_id': session_id,
             'session_start': session_start,
             'session_end': session_end,
-            'session_duration_ms': session_duration,
-            'total_events': len(events),
+            'session_duration_ms': self._session_duration_ms(session_start, session_end),
+            'total_events': total_events,
             'search_sessions': search_sessions,
             'book_interactions': list(book_interactions.values()),
-            'event_timeline': event_timeline[-20:]  # 最近20个事件
+            'event_timeline': event_timeline  # 最近20个事件
+        }
+
+    def _get_session_summary_from_storage(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """通过存储后端的索引查询获取Session摘要（结构与JSONL扫描结果相同）"""
+        self.flush_pending_writes()
+        summary = self.storage.get_session_summary(self._session_file(session_id), SESSION_TIMELINE_LENGTH)
+        if summary is None:
+            return None
+
+        return {
+            'session_id': session_id,
+            'session_start': summary['session_start'],
+            'session_end': summary['session_end'],
+            'session_duration_ms': self._session_duration_ms(summary['session_start'], summary['session_end']),
+            'total_events': summary['total_events'],
+            'search_sessions': summary['search_sessions'],
+            'book_interactions': summary['book_interactions'],
+            'event_timeline': [
+                {
+                    'timestamp': event.get('timestamp'),
+                    'event_type': event.get('event_type', 'unknown'),
+                    'summary': self._get_event_summary(event)
+                }
+                for event in summary['event_timeline']
+            ]
         }
+
+    @staticmethod
+    def _session_duration_ms(session_start: Optional[str], session_end: Optional[str]) -> Optional[int]:
+        """根据会话开始 / 结束时间戳计算会话时长（毫秒）"""
+        if not (session_start and session_end):
+            return None
+        start_dt = datetime.fromisoformat(session_start.replace('Z', '+00:00'))
+        end_dt = datetime.fromisoformat(session_end.replace('Z', '+00:00'))
+        return int((end_dt - start_dt).total_seconds() * 1000)
     
     def _get_event_summary(self, event: Dict[str, Any]) -> str:
         """生成事件的简短摘要"""
@@ -330,8 +1008,13 @@ class StatsManager:
         elif event_type == 'book_hover_end':
             duration = event.get('hover_duration_ms', 0)
             return f"离开书籍: {event.get('book_title', 'N/A')}, 停留: {duration}ms"
+        elif event_type == 'book_hover':
+            duration = event.get('hover_duration_ms', 0)
+            return f"悬停书籍: {event.get('book_title', 'N/A')}, 停留: {duration}ms"
         elif event_type == 'heartbeat':
             return "心跳事件"
+        elif event_type == 'activity_span':
+            return f"活动区间: {event.get('span_start')} ~ {event.get('span_end')}, 心跳{event.get('heartbeat_count', 0)}次"
         else:
             return event_type
     
@@ -355,17 +1038,188 @@ class StatsManager:
                 all_files.extend(dir_path.glob("*.json"))
             return all_files
     
+    def list_archived_files(self, file_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        列出已被保留策略合并进归档的原始输出（file_type 为 search / panel，None 表示两者）
+        每项为归档条目 {'name', 'mtime', 'data' 或 'text'} 加上 'type'，按修改时间从早到晚排序
+        """
+        directories = {'search': self.search_dir, 'panel': self.panel_dir}
+        if file_type is not None and file_type not in directories:
+            return []
+        entries: List[Dict[str, Any]] = []
+        for type_key, directory in directories.items():
+            if file_type is None or file_type == type_key:
+                entries.extend(dict(entry, type=type_key) for entry in latest_archive_entries(directory))
+        entries.sort(key=lambda entry: entry.get('mtime') or '')
+        return entries
+
+    def apply_retention(self, archive_after_days: Optional[float] = RETENTION_ARCHIVE_AFTER_DAYS,
+                        report_max_age_days: Optional[float] = RETENTION_REPORT_MAX_AGE_DAYS,
+                        max_dir_bytes: Optional[int] = RETENTION_MAX_DIR_BYTES,
+                        dry_run: bool = False) -> Dict[str, RetentionResult]:
+        """
+        压实统计输出目录：search_results / panel_interactions 中过期或超出预算的文件合并进按月归档，
+        daily / summary_reports 中过期或超出预算的派生报告直接删除（可随时从日汇总重新生成）
+
+        Args:
+            archive_after_days: 原始输出保留天数，None 表示不按天数归档
+            report_max_age_days: 派生报告保留天数，None 表示不按天数删除
+            max_dir_bytes: 每个目录的大小预算，None 表示不限
+            dry_run: 只统计将被处理的文件
+        """
+        rules: List[RetentionRule] = [
+            {'directory': self.search_dir, 'action': RETENTION_ARCHIVE,
+             'max_age_days': archive_after_days, 'max_bytes': max_dir_bytes},
+            {'directory': self.panel_dir, 'action': RETENTION_ARCHIVE,
+             'max_age_days': archive_after_days, 'max_bytes': max_dir_bytes},
+            {'directory': self.daily_dir, 'action': RETENTION_DELETE,
+             'max_age_days': report_max_age_days, 'max_bytes': max_dir_bytes},
+            {'directory': self.report_dir, 'action': RETENTION_DELETE,
+             'max_age_days': report_max_age_days, 'max_bytes': max_dir_bytes},
+        ]
+        return apply_retention(rules, dry_run=dry_run)
+
+    def rebuild_daily_rollups(self, workers: int = 1) -> None:
+        """从全部会话记录重建日汇总（使用存储后端时统计直接由后端查询，无需重建）"""
+        if self.rollups is None:
+            return
+        self.flush_pending_writes()
+        self.rollups.rebuild(workers)
+
+    def get_book_stats(self, isbns: Optional[List[str]] = None,
+                       groups: Optional[Dict[str, List[str]]] = None,
+                       refresh: bool = False) -> Dict[str, Any]:
+        """
+        读取图书交互聚合
+
+        进程内第一次读取（或 refresh=True）时补齐历史数据 / 其他进程写入的记录，
+        之后只做字典查找，与会话数量无关
+
+        Args:
+            isbns: 只返回这些 ISBN 的聚合，None 表示全部图书
+            groups: 分组名 -> ISBN 列表（如按任务 / role_type 分组），返回每组合并后的聚合
+            refresh: 是否先写出缓冲队列并补齐全部会话
+        """
+        if refresh or not self._book_stats_synced:
+            if refresh:
+                self.flush_pending_writes()
+            self.book_stats.sync_all()
+            self._book_stats_synced = True
+
+        result: Dict[str, Any] = {}
+        if isbns is not None or not groups:
+            result['books'] = {isbn: with_derived_metrics(entry)
+                               for isbn, entry in self.book_stats.get(isbns).items()}
+        if groups:
+            wanted = {isbn for group_isbns in groups.values() for isbn in group_isbns}
+            entries = self.book_stats.get(wanted)
+            result['groups'] = {
+                name: merge_book_stats(entries[isbn] for isbn in dict.fromkeys(group_isbns) if isbn in entries)
+                for name, group_isbns in groups.items()
+            }
+        return result
+
+    def search_session_logs(self, query_text: Optional[str] = None,
+                            isbns: Optional[List[str]] = None,
+                            clicked_isbns: Optional[List[str]] = None,
+                            event_types: Optional[List[str]] = None,
+                            scope: str = 'record', limit: int = 100,
+                            include_records: bool = True,
+                            refresh: bool = False) -> Dict[str, Any]:
+        """
+        通过倒排索引查找会话记录，所有条件同时满足（AND）
+
+        只读取倒排索引（由追加写入监听器随写入增量维护）并求交集，不在查询中补齐会话或加载分词器；
+        索引建立之前已有的记录需先通过 sync_search_index() 补齐（服务启动时在后台进行）
+
+        Args:
+            query_text: 检索词（jieba 分词后每个词都要出现）
+            isbns: 展示过 / 涉及这些图书
+            clicked_isbns: 点击过这些图书
+            event_types: 事件类型（聚合检索日志为 query_log）
+            scope: "record" 要求同一条记录满足全部条件；"session" 只要求同一会话中出现过各个条件
+            limit: 最多返回的记录数（scope="session" 时为会话数）
+            include_records: 是否读出命中的记录（按偏移直接定位，只读取返回的部分）
+            refresh: 是否先写出缓冲队列并补齐全部会话（即 sync_search_index()）
+        """
+        if scope not in ('record', 'session'):
+            raise ValueError(f"不支持的查询范围: {scope}")
+        if refresh:
+            self.sync_search_index()
+        terms = self.search_index.lookup_query_terms(query_text)
+        terms += [f"isbn:{isbn}" for isbn in isbns or []]
+        terms += [f"click:{isbn}" for isbn in clicked_isbns or []]
+        terms += [f"type:{event_type}" for event_type in event_types or []]
+        if not terms:
+            raise ValueError("至少需要一个查询条件")
+
+        if scope == 'record':
+            postings = self.search_index.search(terms)
+            matches = [{'session_id': stem, 'offset': offset} for stem, offset in postings[:limit]]
+            total = len(postings)
+        else:
+            sessions = self.search_index.search_sessions(terms)
+            matches = [{'session_id': stem, 'offsets': offsets} for stem, offsets in islice(sessions.items(), limit)]
+            total = len(sessions)
+        if include_records:
+            for match in matches:
+                session_file = self.session_dir / f"{match['session_id']}.jsonl"
+                if scope == 'record':
+                    match['record'] = self._read_record_at(session_file, match['offset'])
+                else:
+                    match['records'] = [self._read_record_at(session_file, offset) for offset in match['offsets']]
+        return {'terms': terms, 'scope': scope, 'total': total, 'matches': matches}
+
+    def _read_record_at(self, session_file: Path, offset: int) -> Optional[Dict[str, Any]]:
+        """读取会话逻辑字节流中指定偏移处的一条记录（活跃文件直接定位，已轮转部分解压所在分段）"""
+        rotated_bytes, _ = self.segments.rotated(session_file)
+        try:
+            if offset >= rotated_bytes:
+                with open(session_file, 'rb') as f:
+                    f.seek(offset - rotated_bytes)
+                    line = f.readline()
+            else:
+                _, chunk = next(self.segments.iter_logical_chunks(session_file, offset), (offset, b''))
+                line = chunk.split(b'\n', 1)[0]
+            records = self._parse_event_lines([line])
+        except OSError as e:
+            print(f"读取会话记录失败 {session_file}@{offset}: {str(e)}")
+            return None
+        return records[0] if records else None
+
+    def sync_search_index(self) -> int:
+        """
+        补齐倒排索引中尚未索引的记录（索引建立前已有的 / 其他进程写入的），返回补齐后的索引项数；
+        服务启动时在后台调用，也可通过 `python view_stats.py search-index` 单独执行
+        """
+        self.flush_pending_writes()
+        self.search_index.sync_all()
+        return self.search_index.term_count()
+
+    def rebuild_search_index(self) -> int:
+        """从全部会话记录重建倒排索引，返回索引项数"""
+        self.flush_pending_writes()
+        self.search_index.rebuild()
+        return self.search_index.term_count()
+
+    def rebuild_book_stats(self) -> None:
+        """从全部会话记录重建图书交互聚合"""
+        self.flush_pending_writes()
+        self.book_stats.rebuild()
+        self._book_stats_synced = True
+
     def save_daily_summary(self, target_date: date) -> Path:
-        """保存日统计总结"""
+        """
+        保存日统计总结
+        日统计基于增量维护的日汇总生成，开销与数据量无关，因此每次都重新生成，
+        当天（以及之后又有数据写入的日期）的统计总是最新的
+        """
         date_str = target_date.strftime('%Y-%m-%d')
         daily_file = self.daily_dir / f"daily_summary_{date_str}.json"
         
-        # 如果文件已存在，直接返回
-        if daily_file.exists():
-            return daily_file
-        
         # 收集当天的数据
         daily_stats = self._collect_daily_data(target_date)
+        self.daily_dir.mkdir(parents=True, exist_ok=True)
         
         # 保存到文件
         with open(daily_file, 'w', encoding='utf-8') as f:
@@ -373,19 +1227,26 @@ class StatsManager:
         
         return daily_file
     
-    def generate_comprehensive_report(self, days: int = 7) -> Path:
-        """生成综合报告"""
+    def generate_comprehensive_report(self, days: int = 7, workers: int = 1,
+                                      rebuild: bool = False) -> Path:
+        """
+        生成综合报告（逐日读取日汇总，开销与天数成正比，每次都重新生成）
+
+        Args:
+            days: 报告天数
+            workers: 补齐 / 重建日汇总时使用的进程数，大于1时按会话文件分组并行累加
+            rebuild: 是否先从全部会话记录重建日汇总
+        """
+        if rebuild:
+            self.rebuild_daily_rollups(workers)
         end_date = date.today()
         start_date = end_date - timedelta(days=days-1)
         
         report_file = self.report_dir / f"comprehensive_report_{start_date.strftime('%Y-%m-%d')}_to_{end_date.strftime('%Y-%m-%d')}.json"
         
-        # 如果文件已存在，直接返回
-        if report_file.exists():
-            return report_file
-        
         # 收集多天数据
-        report_data = self._collect_comprehensive_data(start_date, end_date)
+        report_data = self._collect_comprehensive_data(start_date, end_date, workers)
+        self.report_dir.mkdir(parents=True, exist_ok=True)
         
         # 保存到文件
         with open(report_file, 'w', encoding='utf-8') as f:
@@ -395,104 +1256,27 @@ class StatsManager:
     
     def _collect_daily_data(self, target_date: date) -> Dict[str, Any]:
         """收集指定日期的数据"""
-        date_str = target_date.strftime('%Y-%m-%d')
-        
-        # 收集搜索数据
-        search_files = [f for f in self.search_dir.glob("*.json") 
-                       if date_str in f.name]
-        search_details = []
-        total_searches = 0
-        total_search_duration = 0
-        unique_queries = set()
-        
-        for file_path in search_files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    search_details.append({
-                        'query': data.get('user_query', ''),
-                        'duration_ms': data.get('search_stats', {}).get('duration_ms', 0)
-                    })
-                    total_searches += 1
-                    total_search_duration += data.get('search_stats', {}).get('duration_ms', 0)
-                    unique_queries.add(data.get('user_query', ''))
-            except Exception:
-                continue
-        
-        # 收集面板交互数据
-        panel_files = [f for f in self.panel_dir.glob("*.json") 
-                      if date_str in f.name]
-        panel_details = []
-        total_panel_interactions = 0
-        total_panel_duration = 0
-        unique_books = set()
-        
-        for file_path in panel_files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    panel_details.append({
-                        'book_title': data.get('panel_stats', {}).get('book_title', ''),
-                        'duration_ms': data.get('panel_stats', {}).get('duration_ms', 0)
-                    })
-                    total_panel_interactions += 1
-                    total_panel_duration += data.get('panel_stats', {}).get('duration_ms', 0)
-                    unique_books.add(data.get('panel_stats', {}).get('book_title', ''))
-            except Exception:
-                continue
-        
-        # 收集会话数据
-        session_files = [f for f in self.session_dir.glob("*.json") 
-                        if date_str in f.name]
-        total_sessions = len(session_files)
-        
-        # 生成统计摘要
-        summary = {
-            'total_search_duration_ms': total_search_duration,
-            'average_search_duration_ms': total_search_duration / max(total_searches, 1),
-            'unique_queries': len(unique_queries),
-            'total_panel_duration_ms': total_panel_duration,
-            'unique_books_viewed': len(unique_books)
-        }
-        
-        return {
-            'date': date_str,
-            'daily_statistics': {
-                'total_searches': total_searches,
-                'total_panel_interactions': total_panel_interactions,
-                'total_sessions': total_sessions,
-                'search_details': search_details[:10],  # 只保留前10个
-                'panel_details': panel_details[:10],    # 只保留前10个
-                'summary': summary
-            }
-        }
+        self.flush_pending_writes()
+        if self.storage is not None:
+            return self.storage.collect_daily_data(target_date)
+
+        # 补齐其他进程写入的 / 尚未累加的会话记录，然后直接读取当天的汇总
+        self.rollups.sync_all()
+        return self.rollups.daily_data(target_date)
     
-    def _collect_comprehensive_data(self, start_date: date, end_date: date) -> Dict[str, Any]:
+    def _collect_comprehensive_data(self, start_date: date, end_date: date,
+                                    workers: int = 1) -> Dict[str, Any]:
         """收集综合数据"""
-        daily_summaries = []
-        total_searches = 0
-        total_sessions = 0
-        total_panel_interactions = 0
-        
-        current_date = start_date
-        while current_date <= end_date:
-            daily_file = self.save_daily_summary(current_date)
-            try:
-                with open(daily_file, 'r', encoding='utf-8') as f:
-                    daily_data = json.load(f)
-                    daily_stats = daily_data.get('daily_statistics', {})
-                    daily_summaries.append({
-                        'date': current_date.strftime('%Y-%m-%d'),
-                        'total_searches': daily_stats.get('total_searches', 0),
-                        'total_sessions': daily_stats.get('total_sessions', 0),
-                        'total_panel_interactions': daily_stats.get('total_panel_interactions', 0)
-                    })
-                    total_searches += daily_stats.get('total_searches', 0)
-                    total_sessions += daily_stats.get('total_sessions', 0)
-                    total_panel_interactions += daily_stats.get('total_panel_interactions', 0)
-            except Exception:
-                pass
-            current_date += timedelta(days=1)
+        self.flush_pending_writes()
+        if self.storage is not None:
+            return self.storage.collect_comprehensive_data(start_date, end_date)
+
+        self.rollups.sync_all(workers)
+        days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        daily_summaries = self.rollups.day_counts(days)
+        total_searches = sum(d['total_searches'] for d in daily_summaries)
+        total_sessions = sum(d['total_sessions'] for d in daily_summaries)
+        total_panel_interactions = sum(d['total_panel_interactions'] for d in daily_summaries)
         
         days_count = (end_date - start_date).days + 1
         
@@ -0,0 +1,655 @@
+#!/usr/bin/env python3
+"""
+交互统计的可插拔存储后端
+会话JSONL始终是原始数据（分页读取、NDJSON导出、兼容旧工具都依赖它），
+存储后端通过追加写入监听器同步导入新写入的记录，为列出会话、会话摘要、
+日统计和综合报告提供索引查询，避免每次分析都全量扫描JSONL。
+
+- "jsonl"：不启用额外后端，StatsManager 直接扫描JSONL（默认）
+- "sqlite"：SQLite（WAL模式），按批导入，按会话 / 事件类型 / 时间 / ISBN 建索引
+"""
+
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from interaction_append_tracking import AppendProgressTracker
+from interaction_event_writer import locked_file
+from interaction_session_segments import SessionSegmentStore
+
+# 补齐（导入历史数据 / 其他进程写入的数据）时每次读取的字节数
+SQLITE_IMPORT_CHUNK_SIZE = 4 * 1024 * 1024
+# 日统计中保留的明细条数
+DAILY_DETAILS_LIMIT = 10
+# 会话列表中保留的检索会话数量
+SESSION_LIST_MAX_SEARCH_SESSIONS = 5
+
+# 记录类型：前端上报的事件 / 聚合检索日志
+RECORD_KIND_EVENT = "event"
+RECORD_KIND_QUERY_LOG = "query_log"
+
+BOOK_EVENT_TYPES = ('book_clicked', 'book_hover_start', 'book_hover_end', 'book_hover')
+# 写入前合并后，一条 book_hover 同时代表悬停开始和结束（见 interaction_event_coalescer）
+HOVER_START_EVENT_TYPES = ('book_hover_start', 'book_hover')
+HOVER_END_EVENT_TYPES = ('book_hover_end', 'book_hover')
+
+
+def record_time(record: Dict[str, Any]) -> Optional[str]:
+    """
+    记录的时间键：优先使用服务器保存时间（saved_timestamp，服务器本地时间），
+    缺失时退化为客户端时间戳（ISO 格式的 T 替换为空格，便于按字符串比较）
+    """
+    saved = record.get('saved_timestamp')
+    if saved:
+        return str(saved)
+    timestamp = record.get('timestamp')
+    if timestamp:
+        return str(timestamp).replace('T', ' ')
+    return None
+
+
+class StatsStorageBackend(ABC):
+    """
+    存储后端接口
+
+    后端通过 on_append 接收会话JSONL的追加写入（在写入线程中、持有文件锁时调用，
+    一次调用即一批记录），其余方法供 StatsManager 查询；
+    子类必须实现全部抽象方法，close 可选
+    """
+
+    @abstractmethod
+    def on_append(self, session_file: Path, start_offset: int, data: bytes) -> None:
+        """追加写入监听器：导入新写入的完整行"""
+
+    @abstractmethod
+    def list_sessions(self, days: int) -> List[Dict[str, Any]]:
+        """列出最近 days 天内有记录的会话（结构与 StatsManager.list_sessions 相同）"""
+
+    @abstractmethod
+    def get_session_summary(self, session_file: Path, timeline_length: int) -> Optional[Dict[str, Any]]:
+        """
+        会话摘要（结构与 StatsManager.get_session_summary 相同，
+        但 event_timeline 为最近 timeline_length 条原始事件，由调用方格式化）
+        """
+
+    @abstractmethod
+    def collect_daily_data(self, target_date: date) -> Dict[str, Any]:
+        """指定日期的统计数据（结构与 StatsManager._collect_daily_data 相同）"""
+
+    @abstractmethod
+    def collect_comprehensive_data(self, start_date: date, end_date: date) -> Dict[str, Any]:
+        """日期范围内的综合统计（结构与 StatsManager._collect_comprehensive_data 相同）"""
+
+    def close(self) -> None:
+        """释放资源"""
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    session_key TEXT NOT NULL,          -- 会话文件名（不含扩展名）
+    file_offset INTEGER NOT NULL,       -- 该行在会话逻辑字节流（分段 + 活跃文件）中的起始偏移
+    record_kind TEXT NOT NULL,          -- event / query_log
+    session_id TEXT,
+    event_type TEXT NOT NULL,
+    timestamp TEXT,                     -- 客户端时间戳（原样）
+    record_time TEXT,                   -- 服务器保存时间（缺失时取客户端时间）
+    isbn TEXT,
+    book_title TEXT,
+    search_id TEXT,
+    query TEXT,
+    duration_ms INTEGER,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (session_key, file_offset)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_records_session_type ON records(session_key, event_type);
+CREATE INDEX IF NOT EXISTS idx_records_event_type ON records(event_type, record_time);
+CREATE INDEX IF NOT EXISTS idx_records_time ON records(record_time);
+CREATE INDEX IF NOT EXISTS idx_records_isbn ON records(isbn) WHERE isbn IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS query_log_books (
+    session_key TEXT NOT NULL,
+    file_offset INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    isbn TEXT,
+    title TEXT,
+    hover_count INTEGER,
+    total_hover_time_ms INTEGER,
+    click_count INTEGER,
+    rating REAL,
+    PRIMARY KEY (session_key, file_offset, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_query_log_books_isbn ON query_log_books(isbn);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    session_key TEXT PRIMARY KEY,
+    session_start TEXT,
+    session_end TEXT,
+    total_events INTEGER NOT NULL DEFAULT 0,
+    last_record_time TEXT,
+    byte_length INTEGER NOT NULL DEFAULT 0   -- 已导入的逻辑字节数
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_last_record_time ON sessions(last_record_time);
+
+CREATE TABLE IF NOT EXISTS session_event_types (
+    session_key TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (session_key, event_type)
+) WITHOUT ROWID;
+"""
+
+
+class SqliteStorageBackend(StatsStorageBackend, AppendProgressTracker):
+    """
+    SQLite 存储后端
+
+    - WAL 模式：写入（后台写入线程）与查询（Flask请求线程）互不阻塞
+    - 一次追加写入（缓冲写入器的一次批量刷新）在一个事务中用 executemany 导入
+    - sessions.byte_length 记录每个会话已导入的逻辑字节数（已轮转的分段 + 活跃文件）：
+      追加写入起点与之相符才直接导入，否则查询前按逻辑长度补齐，
+      因此已有的JSONL、其他进程写入的数据都会被自动导入且不会重复；
+      records.file_offset 同样是逻辑偏移，轮转前后保持不变
+    """
+
+    def __init__(self, session_dir: Path, db_path: Path,
+                 segments: Optional[SessionSegmentStore] = None):
+        self.session_dir = session_dir
+        self.db_path = db_path
+        self.segments = segments
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._write_lock = threading.Lock()
+        self._write_conn = self._connect()
+        self._write_conn.executescript(_SQLITE_SCHEMA)
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), isolation_level=None,
+                               check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _read_conn(self) -> sqlite3.Connection:
+        """每个线程一个只读查询连接（WAL 模式下读取不阻塞写入）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # 导入
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _rows_from_bytes(session_key: str, start_offset: int, data: bytes
+                         ) -> Tuple[List[tuple], List[tuple], Dict[str, Any], int]:
+        """
+        将一段JSONL字节解析为待插入的行（只处理以换行结尾的完整行）
+
+        Returns:
+            (records 行, query_log_books 行, 会话统计增量, 实际消费的字节数)
+        """
+        record_rows: List[tuple] = []
+        book_rows: List[tuple] = []
+        delta: Dict[str, Any] = {
+            'session_start': None,
+            'session_end': None,
+            'last_record_time': None,
+            'event_types': {},
+        }
+        consumed = data.rfind(b'\n') + 1
+        offset = start_offset
+        for raw_line in data[:consumed].split(b'\n')[:-1]:
+            line_offset = offset
+            offset += len(raw_line) + 1
+            line = raw_line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict):
+                continue
+
+            is_query_log = 'event_type' not in record and 'query_text' in record
+            event_type = str(record.get('event_type', 'unknown'))
+            time_key = record_time(record)
+            if event_type in HOVER_START_EVENT_TYPES + HOVER_END_EVENT_TYPES:
+                duration = record.get('hover_duration_ms')
+            else:
+                duration = record.get('duration_ms')
+            record_rows.append((
+                session_key,
+                line_offset,
+                RECORD_KIND_QUERY_LOG if is_query_log else RECORD_KIND_EVENT,
+                record.get('session_id'),
+                event_type,
+                record.get('timestamp'),
+                time_key,
+                record.get('book_isbn'),
+                record.get('book_title'),
+                record.get('search_id'),
+                record.get('query_text') if is_query_log else record.get('query'),
+                duration if isinstance(duration, (int, float)) else None,
+                line.decode('utf-8'),
+            ))
+
+            if is_query_log:
+                for position, book in enumerate(record.get('books') or []):
+                    if not isinstance(book, dict):
+                        continue
+                    book_rows.append((
+                        session_key, line_offset, position,
+                        book.get('isbn'), book.get('title'),
+                        book.get('hover_count'), book.get('total_hover_time_ms'),
+                        book.get('click_count'), book.get('rating'),
+                    ))
+
+            delta['event_types'][event_type] = delta['event_types'].get(event_type, 0) + 1
+            if event_type == 'session_start' and not delta['session_start']:
+                delta['session_start'] = record.get('timestamp')
+            elif event_type == 'session_end':
+                delta['session_end'] = record.get('timestamp')
+            if time_key and (delta['last_record_time'] is None or time_key > delta['last_record_time']):
+                delta['last_record_time'] = time_key
+        return record_rows, book_rows, delta, consumed
+
+    def _ingest_locked(self, session_key: str, start_offset: int, data: bytes) -> int:
+        """在已开启的写事务中导入一段字节，返回实际消费的字节数"""
+        record_rows, book_rows, delta, consumed = self._rows_from_bytes(session_key, start_offset, data)
+        conn = self._write_conn
+        if record_rows:
+            conn.executemany(
+                "INSERT OR REPLACE INTO records (session_key, file_offset, record_kind, session_id, event_type,"
+                " timestamp, record_time, isbn, book_title, search_id, query, duration_ms, payload)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                record_rows,
+            )
+        if book_rows:
+            conn.executemany(
+                "INSERT OR REPLACE INTO query_log_books (session_key, file_offset, position, isbn, title,"
+                " hover_count, total_hover_time_ms, click_count, rating) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                book_rows,
+            )
+        if delta['event_types']:
+            conn.executemany(
+                "INSERT INTO session_event_types (session_key, event_type, count) VALUES (?, ?, ?)"
+                " ON CONFLICT(session_key, event_type) DO UPDATE SET count = count + excluded.count",
+                [(session_key, event_type, count) for event_type, count in delta['event_types'].items()],
+            )
+        conn.execute(
+            "INSERT INTO sessions (session_key, session_start, session_end, total_events, last_record_time, byte_length)"
+            " VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(session_key) DO UPDATE SET"
+            "   session_start = COALESCE(sessions.session_start, excluded.session_start),"
+            "   session_end = COALESCE(excluded.session_end, sessions.session_end),"
+            "   total_events = sessions.total_events + excluded.total_events,"
+            "   last_record_time = MAX(COALESCE(sessions.last_record_time, ''), COALESCE(excluded.last_record_time, '')),"
+            "   byte_length = excluded.byte_length",
+            (session_key, delta['session_start'], delta['session_end'], len(record_rows),
+             delta['last_record_time'], start_offset + consumed),
+        )
+        return consumed
+
+    def _covered_bytes(self, conn: sqlite3.Connection, session_key: str) -> int:
+        row = conn.execute("SELECT byte_length FROM sessions WHERE session_key = ?", (session_key,)).fetchone()
+        return row[0] if row else 0
+
+    def on_append(self, session_file: Path, start_offset: int, data: bytes) -> None:
+        """追加写入监听器：导入起点与已导入位置相符时，一个事务导入整批新行"""
+        # 活跃文件内的偏移换算为逻辑偏移（轮转后活跃文件从0开始）
+        start_offset = self._append_start(session_file, start_offset)
+        if start_offset is None:
+            return
+        session_key = session_file.stem
+        with self._write_lock:
+            conn = self._write_conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._covered_bytes(conn, session_key) == start_offset:
+                    self._ingest_locked(session_key, start_offset, data)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _delete_session_locked(self, session_key: str) -> None:
+        for table in ('records', 'query_log_books', 'session_event_types', 'sessions'):
+            self._write_conn.execute(f"DELETE FROM {table} WHERE session_key = ?", (session_key,))
+
+    def sync_file(self, session_file: Path, size: Optional[int] = None) -> None:
+        """
+        补齐单个会话：导入尚未导入的部分（包括已轮转的分段）；
+        逻辑长度比已导入的部分短（文件被截断 / 改写）时重新导入
+        """
+        session_key = session_file.stem
+        if size is None:
+            try:
+                size = session_file.stat().st_size
+            except FileNotFoundError:
+                return
+        if self._covered_bytes(self._read_conn(), session_key) == self._logical_offset(session_file, size):
+            return
+
+        with locked_file(session_file):
+            with self._write_lock:
+                conn = self._write_conn
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    logical_size = self._logical_offset(session_file, session_file.stat().st_size)
+                    covered = self._covered_bytes(conn, session_key)
+                    if covered > logical_size:
+                        self._delete_session_locked(session_key)
+                        covered = 0
+                    if covered < logical_size:
+                        for position, chunk in self._iter_logical_chunks(session_file, covered,
+                                                                         SQLITE_IMPORT_CHUNK_SIZE):
+                            self._ingest_locked(session_key, position, chunk)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+
+    def sync_all(self) -> None:
+        """补齐会话目录下的所有会话（只对比逻辑长度，未变化的会话不读取）"""
+        covered = dict(self._read_conn().execute("SELECT session_key, byte_length FROM sessions").fetchall())
+        for session_file, size in self._logical_sizes().items():
+            if covered.get(session_file.stem, 0) != size:
+                try:
+                    self.sync_file(session_file)
+                except Exception as e:
+                    print(f"导入会话文件到SQLite失败 {session_file}: {str(e)}")
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def list_sessions(self, days: int) -> List[Dict[str, Any]]:
+        self.sync_all()
+        conn = self._read_conn()
+        cutoff = (date.today() - timedelta(days=days)).strftime('%Y-%m-%d')
+        rows = conn.execute(
+            "SELECT session_key, session_start, session_end, total_events FROM sessions"
+            " WHERE last_record_time >= ? AND total_events > 0",
+            (cutoff,),
+        ).fetchall()
+
+        sessions = []
+        for row in rows:
+            session_key = row['session_key']
+            event_types = dict(conn.execute(
+                "SELECT event_type, count FROM session_event_types WHERE session_key = ?", (session_key,)
+            ).fetchall())
+            search_sessions = [
+                {'search_id': r['search_id'], 'query': r['query'], 'timestamp': r['timestamp']}
+                for r in conn.execute(
+                    "SELECT search_id, query, timestamp FROM records"
+                    " WHERE session_key = ? AND event_type = 'search_session_start'"
+                    " ORDER BY file_offset LIMIT ?",
+                    (session_key, SESSION_LIST_MAX_SEARCH_SESSIONS),
+                )
+            ]
+            sessions.append({
+                # 与JSONL扫描保持一致：从文件名解析Session ID（只替换第一个下划线）
+                'session_id': session_key.replace('_', ' ', 1),
+                'session_start': row['session_start'],
+                'session_end': row['session_end'],
+                'total_events': row['total_events'],
+                'event_types': event_types,
+                'search_sessions_count': event_types.get('search_session_start', 0),
+                'search_sessions': search_sessions,
+                'file_path': str(self.session_dir / (session_key + '.jsonl')),
+            })
+
+        sessions.sort(key=lambda x: x.get('session_start') or '', reverse=True)
+        return sessions
+
+    def get_session_summary(self, session_file: Path, timeline_length: int) -> Optional[Dict[str, Any]]:
+        if session_file.exists():
+            self.sync_file(session_file)
+        conn = self._read_conn()
+        session_key = session_file.stem
+        session = conn.execute(
+            "SELECT session_start, session_end, total_events FROM sessions WHERE session_key = ?", (session_key,)
+        ).fetchone()
+        if session is None or not session['total_events']:
+            return None
+
+        # 与JSONL扫描保持一致：会话摘要取最后一次 session_start / session_end 的时间戳
+        boundaries = {
+            event_type: conn.execute(
+                "SELECT timestamp FROM records WHERE session_key = ? AND event_type = ?"
+                " ORDER BY file_offset DESC LIMIT 1",
+                (session_key, event_type),
+            ).fetchone()
+            for event_type in ('session_start', 'session_end')
+        }
+
+        search_sessions: List[Dict[str, Any]] = []
+        for row in conn.execute(
+            "SELECT event_type, search_id, query, timestamp, duration_ms,"
+            " json_extract(payload, '$.books_clicked_count') AS books_clicked_count,"
+            " json_extract(payload, '$.end_reason') AS end_reason"
+            " FROM records WHERE session_key = ? AND event_type IN ('search_session_start', 'search_session_end')"
+            " ORDER BY file_offset",
+            (session_key,),
+        ):
+            if row['event_type'] == 'search_session_start':
+                search_sessions.append({
+                    'search_id': row['search_id'],
+                    'query': row['query'],
+                    'start_time': row['timestamp']
+                })
+                continue
+            for search in search_sessions:
+                if search['search_id'] == row['search_id']:
+                    search.update({
+                        'end_time': row['timestamp'],
+                        'duration_ms': row['duration_ms'],
+                        'books_clicked_count': row['books_clicked_count'] or 0,
+                        'end_reason': row['end_reason']
+                    })
+                    break
+
+        # SQLite 中与 MIN() 一起出现的裸列取自最小值所在的行，即该书第一次出现时的书名
+        book_interactions = [
+            {
+                'isbn': row['isbn'],
+                'title': row['title'],
+                'click_count': row['click_count'],
+                'hover_count': row['hover_count'],
+                'total_hover_time': row['total_hover_time'],
+            }
+            for row in conn.execute(
+                "SELECT COALESCE(isbn, 'unknown') AS isbn, COALESCE(book_title, 'unknown') AS title,"
+                " MIN(file_offset) AS first_offset,"
+                " SUM(event_type = 'book_clicked') AS click_count,"
+                " SUM(event_type IN ('book_hover_start', 'book_hover')) AS hover_count,"
+                " SUM(CASE WHEN event_type IN ('book_hover_end', 'book_hover')"
+                "   THEN COALESCE(duration_ms, 0) ELSE 0 END) AS total_hover_time"
+                " FROM records WHERE session_key = ? AND event_type IN (?, ?, ?, ?)"
+                " GROUP BY COALESCE(isbn, 'unknown') ORDER BY first_offset",
+                (session_key, *BOOK_EVENT_TYPES),
+            )
+        ]
+
+        recent_events = [
+            json.loads(row['payload'])
+            for row in conn.execute(
+                "SELECT payload FROM records WHERE session_key = ? ORDER BY file_offset DESC LIMIT ?",
+                (session_key, timeline_length),
+            )
+        ]
+        recent_events.reverse()
+
+        return {
+            'session_start': boundaries['session_start'][0] if boundaries['session_start'] else None,
+            'session_end': boundaries['session_end'][0] if boundaries['session_end'] else None,
+            'total_events': session['total_events'],
+            'search_sessions': search_sessions,
+            'book_interactions': book_interactions,
+            'event_timeline': recent_events,
+        }
+
+    @staticmethod
+    def _day_range(start_date: date, end_date: date) -> Tuple[str, str]:
+        """[start_date, end_date] 对应的 record_time 字符串区间（左闭右开）"""
+        return start_date.strftime('%Y-%m-%d'), (end_date + timedelta(days=1)).strftime('%Y-%m-%d')
+
+    def collect_daily_data(self, target_date: date) -> Dict[str, Any]:
+        """
+        日统计口径（均按服务器保存时间落在当天的会话记录计算）：
+        - 检索：聚合检索日志 + search_session_start 事件，耗时取同一检索的 search_session_end
+        - 面板交互：book_hover_end / book_hover 事件（悬停展开图书详情面板），耗时为悬停时长
+        - 会话：当天有记录的会话数
+        """
+        self.sync_all()
+        conn = self._read_conn()
+        day_start, day_end = self._day_range(target_date, target_date)
+
+        search_rows = conn.execute(
+            "SELECT s.query AS query, COALESCE(e.duration_ms, 0) AS duration_ms"
+            " FROM records s LEFT JOIN records e"
+            "   ON e.session_key = s.session_key AND e.event_type = 'search_session_end'"
+            "   AND e.search_id = s.search_id AND s.event_type = 'search_session_start'"
+            " WHERE s.record_time >= ? AND s.record_time < ?"
+            "   AND (s.event_type = 'search_session_start' OR s.record_kind = ?)"
+            " GROUP BY s.session_key, s.file_offset"
+            " ORDER BY s.record_time",
+            (day_start, day_end, RECORD_KIND_QUERY_LOG),
+        ).fetchall()
+        total_search_duration = sum(row['duration_ms'] for row in search_rows)
+        unique_queries = {row['query'] or '' for row in search_rows}
+
+        panel = conn.execute(
+            "SELECT COUNT(*) AS total, COALESCE(SUM(duration_ms), 0) AS duration,"
+            " COUNT(DISTINCT COALESCE(book_title, '')) AS unique_books"
+            " FROM records WHERE event_type IN ('book_hover_end', 'book_hover')"
+            " AND record_time >= ? AND record_time < ?",
+            (day_start, day_end),
+        ).fetchone()
+        panel_details = [
+            {'book_title': row['book_title'] or '', 'duration_ms': row['duration_ms'] or 0}
+            for row in conn.execute(
+                "SELECT book_title, duration_ms FROM records"
+                " WHERE event_type IN ('book_hover_end', 'book_hover') AND record_time >= ? AND record_time < ?"
+                " ORDER BY record_time LIMIT ?",
+                (day_start, day_end, DAILY_DETAILS_LIMIT),
+            )
+        ]
+        total_sessions = conn.execute(
+            "SELECT COUNT(DISTINCT session_key) FROM records WHERE record_time >= ? AND record_time < ?",
+            (day_start, day_end),
+        ).fetchone()[0]
+
+        total_searches = len(search_rows)
+        summary = {
+            'total_search_duration_ms': total_search_duration,
+            'average_search_duration_ms': total_search_duration / max(total_searches, 1),
+            'unique_queries': len(unique_queries),
+            'total_panel_duration_ms': panel['duration'],
+            'unique_books_viewed': panel['unique_books']
+        }
+
+        return {
+            'date': target_date.strftime('%Y-%m-%d'),
+            'daily_statistics': {
+                'total_searches': total_searches,
+                'total_panel_interactions': panel['total'],
+                'total_sessions': total_sessions,
+                'search_details': [
+                    {'query': row['query'] or '', 'duration_ms': row['duration_ms']}
+                    for row in search_rows[:DAILY_DETAILS_LIMIT]
+                ],
+                'panel_details': panel_details,
+                'summary': summary
+            }
+        }
+
+    def collect_comprehensive_data(self, start_date: date, end_date: date) -> Dict[str, Any]:
+        """按天分组的一次索引范围查询，不再逐日生成日统计文件"""
+        self.sync_all()
+        conn = self._read_conn()
+        range_start, range_end = self._day_range(start_date, end_date)
+
+        per_day: Dict[str, Dict[str, int]] = {}
+        for row in conn.execute(
+            "SELECT substr(record_time, 1, 10) AS day,"
+            " SUM(event_type = 'search_session_start' OR record_kind = ?) AS searches,"
+            " SUM(event_type IN ('book_hover_end', 'book_hover')) AS panels,"
+            " COUNT(DISTINCT session_key) AS sessions"
+            " FROM records WHERE record_time >= ? AND record_time < ?"
+            " GROUP BY day",
+            (RECORD_KIND_QUERY_LOG, range_start, range_end),
+        ):
+            per_day[row['day']] = {
+                'total_searches': row['searches'],
+                'total_sessions': row['sessions'],
+                'total_panel_interactions': row['panels'],
+            }
+
+        daily_summaries = []
+        current_date = start_date
+        while current_date <= end_date:
+            day = current_date.strftime('%Y-%m-%d')
+            daily_summaries.append({
+                'date': day,
+                **per_day.get(day, {'total_searches': 0, 'total_sessions': 0, 'total_panel_interactions': 0})
+            })
+            current_date += timedelta(days=1)
+
+        total_searches = sum(d['total_searches'] for d in daily_summaries)
+        total_sessions = sum(d['total_sessions'] for d in daily_summaries)
+        total_panel_interactions = sum(d['total_panel_interactions'] for d in daily_summaries)
+        days_count = (end_date - start_date).days + 1
+
+        return {
+            'report_period': {
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'end_date': end_date.strftime('%Y-%m-%d'),
+                'days': days_count
+            },
+            'overall_statistics': {
+                'total_searches': total_searches,
+                'total_sessions': total_sessions,
+                'total_panel_interactions': total_panel_interactions,
+                'average_searches_per_day': total_searches / max(days_count, 1),
+                'average_sessions_per_day': total_sessions / max(days_count, 1)
+            },
+            'daily_summaries': daily_summaries
+        }
+
+    def close(self) -> None:
+        with self._write_lock:
+            self._write_conn.close()
+
+
+# 可用的存储后端：名称 -> 类（"jsonl" 表示不启用额外后端）
+STORAGE_BACKENDS: Dict[str, Optional[Type[StatsStorageBackend]]] = {
+    'jsonl': None,
+    'sqlite': SqliteStorageBackend,
+}
+
+
+def register_storage_backend(name: str, backend_cls: Type[StatsStorageBackend]) -> None:
+    """注册自定义存储后端（构造参数为 session_dir, db_path, segments）"""
+    STORAGE_BACKENDS[name] = backend_cls
+
+
+def create_storage_backend(name: str, session_dir: Path, db_path: Path,
+                           segments: Optional[SessionSegmentStore] = None) -> Optional[StatsStorageBackend]:
+    """按名称创建存储后端；"jsonl" 返回 None"""
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"不支持的存储后端: {name}，支持的选项: {', '.join(STORAGE_BACKENDS)}")
+    backend_cls = STORAGE_BACKENDS[name]
+    if backend_cls is None:
+        return None
+    return backend_cls(session_dir, db_path, segments)
@@ -4,6 +4,7 @@ import logging
 import json
 import concurrent.futures
 import time
+from experimental_book_library import book_to_dict
 
 # 配置日志
 logging.basicConfig(
@@ -166,7 +167,7 @@ def get_qwen_books_with_reasons(books: list, user_query: str) -> dict:
                 reason_data = _apply_trap_focus_override(book, reason_data)
                 
                 # 组合书籍信息和推荐理由
-                book_with_reason = book.copy() # 复制基础信息
+                book_with_reason = book_to_dict(book) # 复制基础信息（JSON边界转换为dict）
                 book_with_reason.update(reason_data) # 添加理由
                 book_with_reason["cover_url"] = f"https://example.com/cover{len(final_books)+1}.jpg" # 模拟封面
                 # 确保星级数据被保留
@@ -184,7 +185,7 @@ def get_qwen_books_with_reasons(books: list, user_query: str) -> dict:
             except Exception as exc:
                 logger.error(f"处理书籍《{book.get('title')}》时产生异常: {exc}")
                 # 即使单个请求失败，也添加带有默认理由的书籍，保证返回数量
-                book_with_reason = book.copy()
+                book_with_reason = book_to_dict(book)
                 book_with_reason.update(create_default_reasons(user_query, book.get('title')))
                 book_with_reason["cover_url"] = f"https://example.com/cover{len(final_books)+1}.jpg"
                 # 确保星级数据被保留
@@ -232,7 +233,7 @@ def get_qwen_books_with_reasons_progressive(books: list, user_query: str, task_i
                 reason_data = _apply_trap_focus_override(book, reason_data)
                 
                 # 组合书籍信息和推荐理由
-                book_with_reason = book.copy() # 复制基础信息
+                book_with_reason = book_to_dict(book) # 复制基础信息（JSON边界转换为dict）
                 book_with_reason.update(reason_data) # 添加理由
                 book_with_reason["cover_url"] = f"https://example.com/cover{len(final_books)+1}.jpg" # 模拟封面
                 # 确保星级数据被保留
@@ -262,7 +263,7 @@ def get_qwen_books_with_reasons_progressive(books: list, user_query: str, task_i
             except Exception as exc:
                 logger.error(f"处理书籍《{book.get('title')}》时产生异常: {exc}")
                 # 即使单个请求失败，也添加带有默认理由的书籍，保证返回数量
-                book_with_reason = book.copy()
+                book_with_reason = book_to_dict(book)
                 book_with_reason.update(create_default_reasons(user_query, book.get('title')))
                 book_with_reason["cover_url"] = f"https://example.com/cover{len(final_books)+1}.jpg"
                 # 确保星级数据被保留
@@ -0,0 +1,156 @@
+"""
+本地语义匹配器（字符 n-gram TF-IDF + NumPy）
+
+用于 find_books_by_task 的第三阶段匹配：当严格匹配与字符包含匹配都失败时，
+将用户 query 与每个任务的「关键词 + 书名 + 借阅趋势(trend)」文本做余弦相似度，
+返回得分最高的任务。
+
+- 纯 CPU、离线运行，不依赖任何外部服务
+- 只能匹配与任务文档有公共字符的表达；没有公共字符的同义词需由调用方以任务别名补充
+- 任务文档矩阵在书库加载时一次性预计算并做 L2 归一化
+- 每次查询只做一次向量化的矩阵乘法 + top-k
+- NumPy 为可选依赖：未安装时 HAS_NUMPY 为 False，调用方应跳过该阶段
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY: bool = True
+except ImportError:  # pragma: no cover - 取决于运行环境
+    np = None  # type: ignore[assignment]
+    HAS_NUMPY = False
+
+
+def _clean_chars(text: str) -> str:
+    """只保留汉字、字母和数字（统一小写），与书库的字符归一化规则保持一致"""
+    return "".join(
+        ch.lower() for ch in text
+        if '\u4e00' <= ch <= '\u9fff' or ch.isalpha() or ch.isdigit()
+    )
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = (1, 2)) -> List[str]:
+    """
+    提取字符 n-gram 列表（保留重复，用于词频统计）。
+    中文没有天然分词边界，字符 n-gram 对短查询和近义表达更稳健。
+    按空白切分后逐段提取，避免拼接文档时产生跨段的无意义 n-gram。
+    """
+    min_n, max_n = ngram_range
+    grams: List[str] = []
+    for segment in text.split():
+        cleaned: str = _clean_chars(segment)
+        for n in range(min_n, max_n + 1):
+            for i in range(len(cleaned) - n + 1):
+                grams.append(cleaned[i:i + n])
+    return grams
+
+
+class CharNgramTfidfIndex:
+    """
+    预计算的字符 n-gram TF-IDF 索引。
+
+    Args:
+        documents: 文档键 -> 文档文本（此处键为任务关键词）
+        ngram_range: n-gram 长度范围
+    """
+
+    def __init__(self, documents: Dict[str, str], ngram_range: Tuple[int, int] = (1, 2)) -> None:
+        if not HAS_NUMPY:
+            raise RuntimeError("CharNgramTfidfIndex 需要安装 numpy")
+
+        self.ngram_range: Tuple[int, int] = ngram_range
+        self.keys: List[str] = list(documents.keys())
+        self.vocabulary: Dict[str, int] = {}
+
+        doc_grams: List[List[int]] = []
+        for key in self.keys:
+            indices: List[int] = []
+            for gram in char_ngrams(documents[key], ngram_range):
+                index: int = self.vocabulary.setdefault(gram, len(self.vocabulary))
+                indices.append(index)
+            doc_grams.append(indices)
+
+        vocab_size: int = max(len(self.vocabulary), 1)
+        doc_count: int = len(self.keys)
+
+        # 词频矩阵（任务数量有限，直接使用稠密矩阵，乘法即一次 BLAS 调用）
+        term_freq = np.zeros((doc_count, vocab_size), dtype=np.float32)
+        for row, indices in enumerate(doc_grams):
+            if indices:
+                term_freq[row] = np.bincount(indices, minlength=vocab_size)
+
+        # 平滑 IDF：log((1 + N) / (1 + df)) + 1
+        doc_freq = (term_freq > 0).sum(axis=0)
+        self.idf = (np.log((1.0 + doc_count) / (1.0 + doc_freq)) + 1.0).astype(np.float32)
+
+        # 亚线性 TF，避免 trend 中的模板化长句主导向量
+        weights = np.zeros_like(term_freq)
+        nonzero = term_freq > 0
+        weights[nonzero] = 1.0 + np.log(term_freq[nonzero])
+        weights *= self.idf
+        norms = np.linalg.norm(weights, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = weights / norms
+
+    def vectorize(self, text: str) -> Optional["np.ndarray"]:
+        """将查询文本向量化；不包含任何已知 n-gram 时返回 None"""
+        indices: List[int] = [
+            self.vocabulary[gram]
+            for gram in char_ngrams(text, self.ngram_range)
+            if gram in self.vocabulary
+        ]
+        if not indices:
+            return None
+
+        counts = np.bincount(indices, minlength=self.matrix.shape[1]).astype(np.float32)
+        vector = np.zeros_like(counts)
+        nonzero = counts > 0
+        vector[nonzero] = (1.0 + np.log(counts[nonzero])) * self.idf[nonzero]
+        norm: float = float(np.linalg.norm(vector))
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def query(self, text: str, top_k: int = 3, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """
+        返回与 text 最相似的 top_k 个文档键及其余弦相似度（降序）。
+        低于 min_score 的结果会被过滤。
+        """
+        vector = self.vectorize(text)
+        if vector is None or not self.keys:
+            return []
+
+        scores = self.matrix @ vector
+        k: int = min(top_k, len(self.keys))
+        if k < len(self.keys):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(self.keys))
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        results: List[Tuple[str, float]] = []
+        for index in ranked:
+            score: float = float(scores[index])
+            if score < min_score:
+                break
+            results.append((self.keys[int(index)], score))
+        return results
+
+
+def build_task_document(task_keyword: str, titles: Sequence[str], trends: Sequence[str],
+                        keyword_weight: int = 3, aliases: Sequence[str] = ()) -> str:
+    """
+    拼接任务文档文本：任务关键词重复 keyword_weight 次以提高其权重，
+    再拼接任务别名（同样按 keyword_weight 加权）、该任务下所有书名与去重后的借阅趋势描述。
+
+    字符 n-gram 无法关联没有公共字符的近义词（如「焦虑」与「心理健康」），
+    这类同义表达需要通过 aliases 显式补充到任务文档中。
+    """
+    parts: List[str] = [task_keyword] * keyword_weight
+    for alias in aliases:
+        parts.extend([alias] * keyword_weight)
+    parts.extend(titles)
+    parts.extend(dict.fromkeys(trend for trend in trends if trend))
+    return " ".join(parts)
+
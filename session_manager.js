@@ -23,6 +23,7 @@
             this.searchTimeoutId = null; // 搜索会话超时ID
             this.bookInteractions = new Map(); // 书籍交互记录 Map<bookISBN, {展开次数, 停留时间等}>
             this.pendingEvents = []; // 待发送的事件队列
+            this.retryBatches = []; // 发送失败、等待按原 batch_id 重发的批次
             
             this.init();
         }
@@ -118,6 +119,18 @@
             return this.sessionId;
         }
         
+        /**
+         * 生成幂等键（事件的 event_id / 批次的 batch_id），服务器据此丢弃重发造成的重复
+         * @param {string} prefix - 键前缀
+         * @returns {string} 幂等键
+         */
+        generateIdempotencyKey(prefix) {
+            const random = (window.crypto && window.crypto.randomUUID)
+                ? window.crypto.randomUUID()
+                : `${Date.now().toString(36)}_${Math.random().toString(36).substr(2, 10)}`;
+            return `${prefix}_${random}`;
+        }
+        
         /**
          * 记录交互事件的通用方法
          * @param {string} eventType - 事件类型 
@@ -127,6 +140,7 @@
         recordEvent(eventType, eventData = {}, immediate = false) {
             const event = {
                 session_id: this.sessionId,
+                event_id: this.generateIdempotencyKey('evt'),
                 event_type: eventType,
                 timestamp: this.getFormattedTimestamp(new Date()),
                 timestamp_since_session_start: Date.now() - new Date(this.sessionStartTime).getTime(),
@@ -445,20 +459,39 @@
          * 批量发送待处理的事件到服务器
          */
         async flushPendingEvents() {
+            // 先按原 batch_id 依次重发之前失败的批次：服务器可能其实已经写入，
+            // 相同的 batch_id / event_id 会被服务器识别为重复，直接确认而不会再次写入
+            while (this.retryBatches.length > 0) {
+                const batch = this.retryBatches[0];
+                try {
+                    await this.sendEventsToServer(batch.events, batch.batch_id);
+                    if (this.retryBatches[0] === batch) {
+                        this.retryBatches.shift();
+                    }
+                    console.log(`📤 重发批次 ${batch.batch_id} 成功 (${batch.events.length} 个事件)`);
+                } catch (error) {
+                    console.error('❌ 重发事件批次失败:', error);
+                    return;
+                }
+            }
+            
             if (this.pendingEvents.length === 0) {
                 return;
             }
             
-            const eventsToSend = [...this.pendingEvents];
+            const batch = {
+                batch_id: this.generateIdempotencyKey('batch'),
+                events: [...this.pendingEvents]
+            };
             this.pendingEvents = [];
             
             try {
-                await this.sendEventsToServer(eventsToSend);
-                console.log(`📤 成功发送 ${eventsToSend.length} 个事件到服务器`);
+                await this.sendEventsToServer(batch.events, batch.batch_id);
+                console.log(`📤 成功发送 ${batch.events.length} 个事件到服务器`);
             } catch (error) {
                 console.error('❌ 发送事件到服务器失败:', error);
-                // 将失败的事件重新加入队列
-                this.pendingEvents.unshift(...eventsToSend);
+                // 整批保留原 batch_id 等待重发
+                this.retryBatches.push(batch);
             }
         }
         
@@ -473,8 +506,9 @@
         /**
          * 发送事件数组到服务器
          * @param {Array} events - 事件数组
+         * @param {string} batchId - 批次幂等键（重发同一批次时必须相同）
          */
-        async sendEventsToServer(events) {
+        async sendEventsToServer(events, batchId = this.generateIdempotencyKey('batch')) {
             try {
                 const response = await fetch('http://localhost:5001/api/interaction_events', {
                     method: 'POST',
@@ -483,6 +517,7 @@
                     },
                     body: JSON.stringify({
                         session_id: this.sessionId,
+                        batch_id: batchId,
                         events: events,
                         timestamp: this.getFormattedTimestamp(new Date())
                     })
@@ -512,6 +547,7 @@
                 session_duration_ms: Date.now() - new Date(this.sessionStartTime).getTime(),
                 current_search_session: this.currentSearchSession,
                 pending_events_count: this.pendingEvents.length,
+                retry_batches_count: this.retryBatches.length,
                 book_interactions_count: this.bookInteractions.size,
                 book_interactions: Array.from(this.bookInteractions.values())
             };
@@ -6,8 +6,12 @@
 
 import json
 import argparse
+import time
 from pathlib import Path
 from datetime import datetime, date
+from interaction_columnar_export import EXPORT_CHUNK_ROWS, EXPORT_FORMATS, export_session_records
+from interaction_log_analysis import QUERY_SORT_FIELDS, SessionLogAnalyzer, analyze_sessions
+from interaction_log_follower import RollingMinuteCounter, SessionLogFollower
 from interaction_stats_manager import stats_manager
 
 def view_latest_files(file_type=None, count=5):
@@ -15,14 +19,19 @@ def view_latest_files(file_type=None, count=5):
     print(f"📊 最新的{count}个{file_type or '所有类型'}统计文件:")
     print("-" * 60)
     
-    files = stats_manager.list_files_by_type(file_type)
-    # 按修改时间排序，最新的在前
-    files.sort(key=lambda f: f.stat().st_mtime, reverse=True)
+    # 每个文件只 stat() 一次，按修改时间排序，最新的在前
+    files = []
+    for file_path in stats_manager.list_files_by_type(file_type):
+        try:
+            files.append((file_path, file_path.stat()))
+        except FileNotFoundError:
+            continue
+    files.sort(key=lambda item: item[1].st_mtime, reverse=True)
     
-    for i, file_path in enumerate(files[:count], 1):
+    for i, (file_path, stat_result) in enumerate(files[:count], 1):
         try:
-            mod_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-            file_size = file_path.stat().st_size
+            mod_time = datetime.fromtimestamp(stat_result.st_mtime)
+            file_size = stat_result.st_size
             
             print(f"{i}. {file_path.name}")
             print(f"   📅 修改时间: {mod_time.strftime('%Y-%m-%d %H:%M:%S')}")
@@ -33,12 +42,7 @@ def view_latest_files(file_type=None, count=5):
                 with open(file_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     
-                if 'user_query' in data:
-                    print(f"   🔍 查询: {data['user_query']}")
-                if 'search_stats' in data and 'duration_ms' in data['search_stats']:
-                    print(f"   ⏱️  耗时: {data['search_stats']['duration_ms']}ms")
-                if 'panel_stats' in data and 'book_title' in data['panel_stats']:
-                    print(f"   📖 书籍: {data['panel_stats']['book_title']}")
+                _print_record_brief(data)
                     
             except Exception as e:
                 print(f"   ⚠️ 读取内容失败: {e}")
@@ -48,6 +52,43 @@ def view_latest_files(file_type=None, count=5):
         except Exception as e:
             print(f"   ❌ 处理文件失败: {e}")
 
+def _print_record_brief(data):
+    """显示统计文件内容的简要信息"""
+    if 'user_query' in data:
+        print(f"   🔍 查询: {data['user_query']}")
+    if 'search_stats' in data and 'duration_ms' in data['search_stats']:
+        print(f"   ⏱️  耗时: {data['search_stats']['duration_ms']}ms")
+    if 'panel_stats' in data and 'book_title' in data['panel_stats']:
+        print(f"   📖 书籍: {data['panel_stats']['book_title']}")
+
+def view_archived_files(file_type=None, count=5, name=None):
+    """查看已被保留策略合并进归档的统计文件"""
+    entries = stats_manager.list_archived_files(file_type)
+    if name is not None:
+        matched = [entry for entry in entries if entry['name'] == name]
+        if not matched:
+            print(f"❌ 归档中没有文件: {name}")
+            return
+        entry = matched[-1]
+        print(f"📦 归档文件内容: {entry['name']} ({entry['type']}, 修改时间 {entry.get('mtime')})")
+        print("=" * 60)
+        if 'data' in entry:
+            print(json.dumps(entry['data'], ensure_ascii=False, indent=2))
+        else:
+            print(entry.get('text', ''))
+        return
+    
+    print(f"📦 归档中最新的{count}个{file_type or '所有类型'}统计文件（共 {len(entries)} 个）:")
+    print("-" * 60)
+    for i, entry in enumerate(reversed(entries[-count:] if count > 0 else []), 1):
+        print(f"{i}. {entry['name']} ({entry['type']})")
+        print(f"   📅 修改时间: {entry.get('mtime')}")
+        if isinstance(entry.get('data'), dict):
+            _print_record_brief(entry['data'])
+        elif 'text' in entry:
+            print(f"   ⚠️ 原文件不是合法JSON（{len(entry['text'])} 个字符）")
+        print()
+
 def view_file_content(file_path):
     """查看指定文件的详细内容"""
     try:
@@ -115,12 +156,16 @@ def view_daily_summary(target_date=None):
     except Exception as e:
         print(f"❌ 读取日统计失败: {e}")
 
-def view_comprehensive_report(days=7):
+def view_comprehensive_report(days=7, workers=1, rebuild=False):
     """查看综合报告"""
     print(f"📈 最近{days}天的综合报告:")
     print("-" * 60)
     
-    report_file = stats_manager.generate_comprehensive_report(days)
+    start_time = time.perf_counter()
+    report_file = stats_manager.generate_comprehensive_report(days, workers=workers, rebuild=rebuild)
+    elapsed = time.perf_counter() - start_time
+    if workers > 1 or rebuild:
+        print(f"⏱️ 生成耗时 {elapsed:.2f}s（{workers}个进程{'，已重建日汇总' if rebuild else ''}）")
     
     try:
         with open(report_file, 'r', encoding='utf-8') as f:
@@ -166,6 +211,248 @@ def list_all_files():
         for file_path in files[-3:]:  # 显示最新的3个
             mod_time = datetime.fromtimestamp(file_path.stat().st_mtime)
             print(f"   📄 {file_path.name} ({mod_time.strftime('%m-%d %H:%M')})")
+        if cat_key in ('search', 'panel'):
+            archived = stats_manager.list_archived_files(cat_key)
+            if archived:
+                print(f"   📦 另有 {len(archived)}个文件已归档（view_stats.py archive --type {cat_key} 查看）")
+
+def rotate_session_logs(max_mb=None, max_idle_hours=None):
+    """轮转会话日志为压缩分段"""
+    kwargs = {}
+    if max_mb is not None:
+        kwargs['max_bytes'] = int(max_mb * 1024 * 1024)
+    if max_idle_hours is not None:
+        kwargs['max_idle_seconds'] = int(max_idle_hours * 3600)
+    
+    print("🗜️  轮转会话日志:")
+    print("-" * 60)
+    rotated = stats_manager.rotate_session_logs(**kwargs)
+    if not rotated:
+        print("   没有需要轮转的会话日志")
+        return
+    for segment in rotated:
+        ratio = segment['raw_bytes'] / max(segment['stored_bytes'], 1)
+        print(f"   📦 {segment['session_id']}: {segment['lines']}行, "
+              f"{segment['raw_bytes']} -> {segment['stored_bytes']} bytes (压缩比 {ratio:.1f}x)")
+
+def compact_session_segments():
+    """合并会话日志中的小分段"""
+    print("🧹 压实会话分段:")
+    print("-" * 60)
+    merged = stats_manager.compact_session_segments()
+    if not merged:
+        print("   没有需要合并的分段")
+        return
+    for session_id, count in merged.items():
+        print(f"   🔗 {session_id}: 合并了 {count} 个分段")
+
+def _record_brief(record):
+    """会话记录的一行简要说明"""
+    if not record:
+        return "⚠️ 记录不可读"
+    event_type = record.get('event_type')
+    when = record.get('saved_timestamp') or record.get('timestamp')
+    suffix = f" @ {when}" if when else ""
+    if event_type is None:
+        books = record.get('books') or []
+        clicked = [b.get('title') for b in books if isinstance(b, dict) and (b.get('click_count') or 0) > 0]
+        brief = f"🔍 '{record.get('query_text', '')}' ({len(books)}本图书"
+        return brief + (f"，点击: {', '.join(map(str, clicked))})" if clicked else ")") + suffix
+    detail = record.get('query') or record.get('book_title')
+    return f"📝 {event_type}{f' {detail}' if detail else ''}{suffix}"
+
+def search_logs(query=None, isbns=None, clicked=None, event_types=None, scope='record',
+                limit=20, refresh=False):
+    """通过倒排索引查找会话记录"""
+    print("🔎 检索会话记录:")
+    print("-" * 60)
+    start_time = time.perf_counter()
+    try:
+        result = stats_manager.search_session_logs(
+            query_text=query, isbns=isbns, clicked_isbns=clicked, event_types=event_types,
+            scope=scope, limit=limit, refresh=refresh
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    elapsed = (time.perf_counter() - start_time) * 1000
+    
+    print(f"   条件: {' AND '.join(result['terms'])}")
+    unit = '条记录' if scope == 'record' else '个会话'
+    print(f"   命中 {result['total']}{unit}，耗时 {elapsed:.1f}ms\n")
+    for i, match in enumerate(result['matches'], 1):
+        if scope == 'record':
+            print(f"{i}. {match['session_id']} @ {match['offset']}")
+            print(f"   {_record_brief(match['record'])}")
+        else:
+            print(f"{i}. {match['session_id']} ({len(match['offsets'])}条相关记录)")
+            for record in match['records'][:5]:
+                print(f"   {_record_brief(record)}")
+    if result['total'] > len(result['matches']):
+        print(f"\n   ……仅显示前{len(result['matches'])}{unit}")
+    if not result['total'] and not stats_manager.search_index.term_count():
+        print("💡 倒排索引为空，请先运行: python view_stats.py search-index")
+
+def build_search_index(rebuild=False):
+    """补齐（或重建）检索倒排索引，查询时不再补齐"""
+    print(f"🗂️ {'重建' if rebuild else '补齐'}检索倒排索引:")
+    print("-" * 60)
+    start_time = time.perf_counter()
+    if rebuild:
+        term_count = stats_manager.rebuild_search_index()
+    else:
+        term_count = stats_manager.sync_search_index()
+    elapsed = time.perf_counter() - start_time
+    print(f"✅ 共 {term_count} 个索引项，耗时 {elapsed:.2f}s")
+
+def _parse_since_arg(since):
+    """解析 --since 参数，格式无效时输出提示并返回 False"""
+    try:
+        return stats_manager.parse_since(since)
+    except ValueError:
+        print(f"❌ --since 格式无效，应为ISO日期或时间: {since}")
+        return False
+
+def view_sessions(since=None, limit=None):
+    """单遍流式统计每个会话的事件、检索、悬停和点击次数"""
+    since_key = _parse_since_arg(since)
+    if since_key is False:
+        return
+    print(f"📋 会话统计{f' (自 {since} 起)' if since else ''}:")
+    print("-" * 60)
+    
+    start_time = time.perf_counter()
+    analyzer = SessionLogAnalyzer()
+    totals = {'sessions': 0, 'events': 0, 'query_logs': 0, 'search_sessions': 0, 'hovers': 0, 'clicks': 0}
+    for session in analyze_sessions(stats_manager.iter_all_session_records(since_key), analyzer):
+        totals['sessions'] += 1
+        for field in ('events', 'query_logs', 'search_sessions', 'hovers', 'clicks'):
+            totals[field] += session[field]
+        if limit is None or totals['sessions'] <= limit:
+            print(f"{totals['sessions']}. {session['session_id']} "
+                  f"({session['first_time'] or '?'} ~ {session['last_time'] or '?'})")
+            print(f"   📝 {session['events']}个事件, 🔍 {session['query_logs']}次检索"
+                  f"（{session['unique_queries']}个不同检索词）, {session['search_sessions']}个搜索会话")
+            print(f"   👆 悬停 {session['hovers']}次 / {session['hover_ms']}ms, 点击 {session['clicks']}次, "
+                  f"图书事件 {session['book_events']}个")
+    
+    elapsed = time.perf_counter() - start_time
+    if limit is not None and totals['sessions'] > limit:
+        print(f"   ……仅显示前{limit}个会话")
+    print(f"\n📊 合计: {totals['sessions']}个会话, {totals['events']}个事件, {totals['query_logs']}次检索, "
+          f"{totals['search_sessions']}个搜索会话, 悬停 {totals['hovers']}次, 点击 {totals['clicks']}次 "
+          f"(耗时 {elapsed:.2f}s)")
+
+def view_queries(since=None, top=20, sort_by='searches', min_searches=1):
+    """单遍流式汇总聚合检索日志：热门检索词及其悬停 / 点击情况"""
+    since_key = _parse_since_arg(since)
+    if since_key is False:
+        return
+    print(f"🔍 检索词汇总{f' (自 {since} 起)' if since else ''}，按 {sort_by} 排序:")
+    print("-" * 60)
+    
+    start_time = time.perf_counter()
+    analyzer = SessionLogAnalyzer()
+    session_count = sum(1 for _ in analyze_sessions(stats_manager.iter_all_session_records(since_key), analyzer))
+    elapsed = time.perf_counter() - start_time
+    
+    rows = analyzer.top_queries(top, sort_by, min_searches)
+    for i, row in enumerate(rows, 1):
+        print(f"{i}. '{row['query']}' - {row['searches']}次检索, {row['sessions']}个会话")
+        print(f"   📚 展示 {row['books_shown']}本次, 👆 悬停 {row['hovers']}次 "
+              f"(平均 {row['avg_hover_ms']:.0f}ms), 点击 {row['clicks']}次, "
+              f"有点击的检索占 {row['click_rate']:.1%}")
+    
+    total_searches = sum(query['searches'] for query in analyzer.queries.values())
+    print(f"\n📊 共 {len(analyzer.queries)}个不同检索词, {total_searches}次检索, "
+          f"{session_count}个会话, {analyzer.total_records}条记录 (耗时 {elapsed:.2f}s)")
+
+def export_columnar(fmt='parquet', output=None, since=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """将会话记录流式导出为列式文件（检索 / 检索图书 / 事件三张表）"""
+    since_key = _parse_since_arg(since)
+    if since_key is False:
+        return
+    if output is None:
+        output = stats_manager.base_dir / "exports" / f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    print(f"📤 导出会话记录为 {fmt}{f' (自 {since} 起)' if since else ''}: {output}")
+    print("-" * 60)
+    
+    start_time = time.perf_counter()
+    try:
+        summary = export_session_records(
+            stats_manager.iter_all_session_records(since_key), Path(output), fmt, chunk_rows
+        )
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        return
+    elapsed = time.perf_counter() - start_time
+    
+    for table, info in summary.items():
+        size = info['path'].stat().st_size
+        print(f"   📄 {info['path'].name}: {info['rows']}行, {size} bytes")
+    print(f"\n✅ 导出完成 (耗时 {elapsed:.2f}s)")
+
+def _is_query_record(record):
+    """检索次数的口径与日汇总一致：聚合检索日志 + search_session_start"""
+    if record.get('event_type') is None:
+        return bool(record.get('query_text'))
+    return record.get('event_type') == 'search_session_start'
+
+def tail_sessions(interval=10, window=5, from_start=False, quiet=False, poll=False):
+    """实时跟踪全部会话日志的新增记录，定期输出每分钟事件数和检索数"""
+    follower = SessionLogFollower(stats_manager.session_dir, stats_manager.segments,
+                                  from_start=from_start, use_inotify=not poll)
+    counter = RollingMinuteCounter(window)
+    print(f"👀 跟踪会话日志 ({follower.mode}): {stats_manager.session_dir}，按 Ctrl+C 退出")
+    print("-" * 60)
+    
+    next_report = time.monotonic() + interval
+    try:
+        for lines in follower.follow(timeout=min(interval, 1.0)):
+            events = queries = 0
+            for session_id, line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                events += 1
+                queries += _is_query_record(record)
+                if not quiet:
+                    print(f"   [{session_id}] {_record_brief(record)}")
+            if events:
+                counter.add(time.time(), events, queries)
+            
+            if time.monotonic() >= next_report:
+                next_report = time.monotonic() + interval
+                snapshot = counter.snapshot(time.time())
+                print(f"📈 {datetime.now().strftime('%H:%M:%S')} "
+                      f"本分钟 {snapshot['minute_events']}个事件 / {snapshot['minute_queries']}次检索；"
+                      f"最近{window}分钟平均 {snapshot['events_per_minute']:.1f}事件/分钟, "
+                      f"{snapshot['queries_per_minute']:.1f}检索/分钟")
+    except KeyboardInterrupt:
+        print("\n👋 停止跟踪")
+
+def apply_retention(archive_after_days=None, report_max_age_days=None, max_mb=None, dry_run=False):
+    """按保留策略压实统计输出目录"""
+    kwargs = {'dry_run': dry_run}
+    if archive_after_days is not None:
+        kwargs['archive_after_days'] = archive_after_days
+    if report_max_age_days is not None:
+        kwargs['report_max_age_days'] = report_max_age_days
+    if max_mb is not None:
+        kwargs['max_dir_bytes'] = int(max_mb * 1024 * 1024)
+    
+    print(f"🧹 压实统计输出目录{'（预演，不做修改）' if dry_run else ''}:")
+    print("-" * 60)
+    results = stats_manager.apply_retention(**kwargs)
+    for name, result in results.items():
+        action = '归档' if result['action'] == 'archive' else '删除'
+        print(f"   📁 {name}: {action} {result['expired_files']}个文件 ({result['expired_bytes']} bytes)，"
+              f"保留 {result['kept_files']}个 ({result['kept_bytes']} bytes)")
+        for archive in result['archives']:
+            print(f"      📦 写入归档 {archive}")
 
 def main():
     parser = argparse.ArgumentParser(description='交互统计文件查看工具')
@@ -177,6 +464,12 @@ def main():
                               help='文件类型')
     latest_parser.add_argument('--count', type=int, default=5, help='显示文件数量')
     
+    # archive 命令
+    archive_parser = subparsers.add_parser('archive', help='查看已归档的搜索结果 / 面板交互统计文件')
+    archive_parser.add_argument('--type', choices=['search', 'panel'], help='文件类型')
+    archive_parser.add_argument('--count', type=int, default=5, help='显示文件数量')
+    archive_parser.add_argument('--name', help='显示归档中指定文件名的完整内容')
+    
     # view 命令
     view_parser = subparsers.add_parser('view', help='查看指定文件')
     view_parser.add_argument('file_path', help='文件路径')
@@ -188,22 +481,106 @@ def main():
     # report 命令
     report_parser = subparsers.add_parser('report', help='查看综合报告')
     report_parser.add_argument('--days', type=int, default=7, help='报告天数')
+    report_parser.add_argument('--workers', type=int, default=1, help='补齐日汇总使用的进程数')
+    report_parser.add_argument('--rebuild', action='store_true', help='先从全部会话记录重建日汇总')
     
     # list 命令
     list_parser = subparsers.add_parser('list', help='列出所有文件')
     
+    # rotate 命令
+    rotate_parser = subparsers.add_parser('rotate', help='将会话日志轮转为压缩分段')
+    rotate_parser.add_argument('--max-mb', type=float, help='活跃文件大小上限（MB）')
+    rotate_parser.add_argument('--max-idle-hours', type=float, help='最后一次写入距今超过该小时数即轮转')
+    
+    # compact 命令
+    compact_parser = subparsers.add_parser('compact', help='合并会话日志中的小分段')
+    
+    # retention 命令
+    retention_parser = subparsers.add_parser('retention', help='按保留策略归档 / 删除过期的统计输出文件')
+    retention_parser.add_argument('--archive-after-days', type=float,
+                                  help='search_results / panel_interactions 保留天数，更早的合并进归档')
+    retention_parser.add_argument('--report-max-age-days', type=float,
+                                  help='daily / summary_reports 保留天数，更早的直接删除')
+    retention_parser.add_argument('--max-mb', type=float, help='每个目录的大小预算（MB）')
+    retention_parser.add_argument('--dry-run', action='store_true', help='只统计将被处理的文件')
+    
+    # search 命令
+    search_parser = subparsers.add_parser('search', help='通过倒排索引查找会话记录')
+    search_parser.add_argument('query', nargs='?', help='检索词（分词后每个词都要出现）')
+    search_parser.add_argument('--isbn', action='append', help='展示过 / 涉及该图书（可重复）')
+    search_parser.add_argument('--clicked', action='append', help='点击过该图书（可重复）')
+    search_parser.add_argument('--event-type', action='append', help='事件类型，聚合检索日志为 query_log（可重复）')
+    search_parser.add_argument('--sessions', action='store_true',
+                               help='按会话匹配：各条件出现在同一会话即可，不要求同一条记录')
+    search_parser.add_argument('--limit', type=int, default=20, help='显示数量')
+    search_parser.add_argument('--refresh', action='store_true', help='先补齐尚未索引的记录')
+    
+    # search-index 命令
+    search_index_parser = subparsers.add_parser('search-index', help='补齐 / 重建检索倒排索引（查询前的单独步骤）')
+    search_index_parser.add_argument('--rebuild', action='store_true', help='从全部会话记录重建')
+    
+    # sessions 命令
+    sessions_parser = subparsers.add_parser('sessions', help='统计每个会话的事件 / 检索 / 悬停 / 点击次数')
+    sessions_parser.add_argument('--since', help='只统计保存时间不早于该时间的记录（ISO日期或时间）')
+    sessions_parser.add_argument('--limit', type=int, help='最多显示的会话数（合计仍覆盖全部会话）')
+    
+    # queries 命令
+    queries_parser = subparsers.add_parser('queries', help='汇总聚合检索日志中的检索词')
+    queries_parser.add_argument('--since', help='只统计保存时间不早于该时间的记录（ISO日期或时间）')
+    queries_parser.add_argument('--top', type=int, default=20, help='显示的检索词数量')
+    queries_parser.add_argument('--sort', choices=QUERY_SORT_FIELDS, default='searches', help='排序字段')
+    queries_parser.add_argument('--min-searches', type=int, default=1, help='只显示检索次数不少于该值的检索词')
+    
+    # export 命令
+    export_parser = subparsers.add_parser('export', help='将会话记录导出为列式文件')
+    export_parser.add_argument('--format', choices=EXPORT_FORMATS, default='parquet',
+                               help='导出格式（parquet / arrow 需要 pyarrow）')
+    export_parser.add_argument('--output', help='输出目录（默认 interaction_stats/exports/export_<时间>）')
+    export_parser.add_argument('--since', help='只导出保存时间不早于该时间的记录（ISO日期或时间）')
+    export_parser.add_argument('--chunk-rows', type=int, default=EXPORT_CHUNK_ROWS,
+                               help='每张表每次写出的行数（行组 / 记录批次大小）')
+    
+    # tail 命令
+    tail_parser = subparsers.add_parser('tail', help='实时跟踪会话日志的新增记录')
+    tail_parser.add_argument('--interval', type=float, default=10, help='输出速率统计的间隔（秒）')
+    tail_parser.add_argument('--window', type=int, default=5, help='滚动平均的窗口（分钟）')
+    tail_parser.add_argument('--from-start', action='store_true', help='从各会话文件开头读起')
+    tail_parser.add_argument('--quiet', action='store_true', help='只输出速率统计，不逐条输出记录')
+    tail_parser.add_argument('--poll', action='store_true', help='不使用 inotify，定时轮询文件状态')
+    
     args = parser.parse_args()
     
     if args.command == 'latest':
         view_latest_files(args.type, args.count)
+    elif args.command == 'archive':
+        view_archived_files(args.type, args.count, args.name)
     elif args.command == 'view':
         view_file_content(args.file_path)
     elif args.command == 'daily':
         view_daily_summary(args.date)
     elif args.command == 'report':
-        view_comprehensive_report(args.days)
+        view_comprehensive_report(args.days, args.workers, args.rebuild)
     elif args.command == 'list':
         list_all_files()
+    elif args.command == 'rotate':
+        rotate_session_logs(args.max_mb, args.max_idle_hours)
+    elif args.command == 'compact':
+        compact_session_segments()
+    elif args.command == 'retention':
+        apply_retention(args.archive_after_days, args.report_max_age_days, args.max_mb, args.dry_run)
+    elif args.command == 'search':
+        search_logs(args.query, args.isbn, args.clicked, args.event_type,
+                    'session' if args.sessions else 'record', args.limit, args.refresh)
+    elif args.command == 'search-index':
+        build_search_index(args.rebuild)
+    elif args.command == 'sessions':
+        view_sessions(args.since, args.limit)
+    elif args.command == 'queries':
+        view_queries(args.since, args.top, args.sort, args.min_searches)
+    elif args.command == 'export':
+        export_columnar(args.format, args.output, args.since, args.chunk_rows)
+    elif args.command == 'tail':
+        tail_sessions(args.interval, args.window, args.from_start, args.quiet, args.poll)
     else:
         # 默认显示最新文件
         view_latest_files(count=5)
@@ -4,7 +4,7 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import json
 import time
@@ -13,9 +13,19 @@ import requests
 import logging
 import re
 import uuid
+import zlib
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
-from experimental_book_library import find_books_by_task
+from experimental_book_library import (
+    BOOK_GROUP_FIELDS,
+    MULTI_TASK_MAX_BOOKS,
+    find_books_by_task,
+    find_books_by_tasks,
+    find_matching_tasks,
+    get_book_groups,
+    get_match_memo_stats,
+    reload_catalog,
+)
 
 # ===========================================
 # 异步任务管理
@@ -78,6 +88,43 @@ def start_cleanup_timer():
     timer.daemon = True
     timer.start()
 
+# 会话日志维护间隔（秒）：轮转大文件 / 长时间未写入的会话日志并合并小分段
+LOG_MAINTENANCE_INTERVAL_SECONDS: int = 3600
+# 是否由服务定时自动轮转会话日志（默认关闭）：轮转后 sessions/<会话>.jsonl 只保留新记录，
+# 直接读取该文件的分析面板需改为通过 /api/sessions/<id>/events.ndjson 读取；
+# 未开启时可用 `python view_stats.py rotate` / `compact` 手动维护
+SESSION_LOG_ROTATION_ENABLED: bool = False
+
+def start_log_maintenance_timer():
+    """
+    启动会话日志维护定时器
+    """
+    try:
+        from interaction_stats_manager import stats_manager
+        rotated = stats_manager.rotate_session_logs()
+        merged = stats_manager.compact_session_segments()
+        if rotated or merged:
+            logger.info(f"会话日志维护完成: 轮转 {len(rotated)} 个, 合并 {sum(merged.values())} 个分段")
+    except Exception as e:
+        logger.error(f"会话日志维护失败: {str(e)}")
+    timer = threading.Timer(LOG_MAINTENANCE_INTERVAL_SECONDS, start_log_maintenance_timer)
+    timer.daemon = True
+    timer.start()
+
+def start_search_index_sync():
+    """
+    在后台补齐会话检索倒排索引（启动前已有的记录），之后由追加写入监听器随写入增量维护，
+    /api/search_logs 查询时不再补齐
+    """
+    def sync():
+        try:
+            from interaction_stats_manager import stats_manager
+            term_count = stats_manager.sync_search_index()
+            logger.info(f"检索倒排索引已补齐: {term_count} 个索引项")
+        except Exception as e:
+            logger.error(f"补齐检索倒排索引失败: {str(e)}")
+    threading.Thread(target=sync, name="search-index-sync", daemon=True).start()
+
 # ===========================================
 # API 配置区域 - 在这里切换不同的后端API
 # ===========================================
@@ -169,6 +216,39 @@ def normalize_query(query: str) -> str:
     normalized = re.sub(r'\s+', ' ', normalized)
     return normalized
 
+def parse_positive_int(value, default: int) -> "int | None":
+    """
+    解析请求中的正整数参数：未提供时返回 default，
+    不是正整数（非数字、小数、布尔值、0 或负数）时返回 None
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if value > 0 else None
+    if isinstance(value, str) and value.strip().isdigit():
+        parsed = int(value.strip())
+        return parsed if parsed > 0 else None
+    return None
+
+def parse_bool_flag(value, default: bool) -> "bool | None":
+    """
+    解析请求中的布尔参数：未提供时返回 default，
+    接受 JSON 布尔值以及字符串 1/true/yes、0/false/no（不区分大小写），其他值返回 None
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in ('1', 'true', 'yes'):
+            return True
+        if lowered in ('0', 'false', 'no'):
+            return False
+    return None
+
 def get_matched_books_signature(books: list) -> str:
     """
     生成书籍列表的唯一签名，用于判断匹配结果是否相同
@@ -241,12 +321,24 @@ def get_books_with_reasons_api():
     """
     新的API端点：立即返回基本书籍信息，异步生成推荐理由
     第三阶段：快速响应 + 后台异步处理 + 去重优化
+
+    可选参数：
+    - multi_task: 为 true 时合并 query 命中的所有任务的书籍（按 ISBN 去重），只启动一个LLM任务
+      （布尔值或 "true"/"false"/"1"/"0" 等字符串，其他值返回400）
+    - max_books: 多任务模式下的书籍数量上限（正整数，默认 MULTI_TASK_MAX_BOOKS；无效时返回400）
     """
     try:
         data = request.json
         user_query = data.get('query', '')
+        multi_task = parse_bool_flag(data.get('multi_task'), False)
         logger.info(f"收到书籍推荐请求: {user_query}")
         
+        if multi_task is None:
+            return jsonify({
+                "status": "error",
+                "error": "multi_task 必须为布尔值"
+            }), 400
+        
         if not user_query or len(user_query.strip()) < 2:
             return jsonify({
                 "status": "error", 
@@ -259,7 +351,23 @@ def get_books_with_reasons_api():
         
         # 第二步：从本地实验书库匹配书籍（快速0延迟最好是）
         logger.info(f"在本地书库中搜索匹配: {user_query}")
-        matched_books = find_books_by_task(user_query)
+        # 多任务模式下在响应中附带命中的任务及得分
+        match_fields: dict = {}
+        if multi_task:
+            max_books = parse_positive_int(data.get('max_books'), MULTI_TASK_MAX_BOOKS)
+            if max_books is None:
+                return jsonify({
+                    "status": "error",
+                    "error": "max_books 必须为正整数"
+                }), 400
+            matched_tasks = find_matching_tasks(user_query)
+            matched_books = find_books_by_tasks(user_query, max_books)
+            match_fields['matched_tasks'] = [
+                {"task": task_keyword, "score": round(score, 4)} for task_keyword, score in matched_tasks
+            ]
+            logger.info(f"多任务模式命中任务: {[task for task, _ in matched_tasks]}")
+        else:
+            matched_books = find_books_by_task(user_query)
         
         if matched_books:
             logger.info(f"本地书库匹配成功，找到 {len(matched_books)} 本书")
@@ -301,7 +409,8 @@ def get_books_with_reasons_api():
                             "task_id": cached_task_id,
                             "reasons_loading": True,
                             "from_cache": True,
-                            "message": "检测到相同书籍集合，复用已有任务"
+                            "message": "检测到相同书籍集合，复用已有任务",
+                            **match_fields
                         })
             
             # 第四步：检查缓存，判断是否为重复请求
@@ -348,7 +457,8 @@ def get_books_with_reasons_api():
                         "task_id": cached_task_id,
                         "reasons_loading": True,
                         "from_cache": True,
-                        "message": "检测到重复请求，使用缓存结果"
+                        "message": "检测到重复请求，使用缓存结果",
+                        **match_fields
                     }
                     
                     return jsonify(response)
@@ -403,7 +513,8 @@ def get_books_with_reasons_api():
                 "task_id": task_id,
                 "reasons_loading": True,
                 "from_cache": False,
-                "message": "书籍基本信息已加载，推荐理由正在后台生成中..."
+                "message": "书籍基本信息已加载，推荐理由正在后台生成中...",
+                **match_fields
             }
             
             logger.info(f"立即返回基本书籍信息，任务ID: {task_id}")
@@ -481,16 +592,55 @@ def get_task_status(task_id):
         logger.error(f"获取任务状态时发生错误: {str(e)}")
         return jsonify({"status": "error", "error": str(e)}), 500
 
+@app.route('/api/match_cache_stats', methods=['GET'])
+def get_match_cache_stats():
+    """
+    API端点：查看书库匹配记忆化缓存的命中率统计
+    """
+    try:
+        return jsonify({
+            "status": "success",
+            "match_cache": get_match_memo_stats()
+        })
+    except Exception as e:
+        logger.error(f"获取匹配缓存统计时发生错误: {str(e)}")
+        return jsonify({"status": "error", "error": str(e)}), 500
+
+@app.route('/api/catalog/reload', methods=['POST'])
+def reload_book_catalog():
+    """
+    API端点：从 experimental_book_library.py 重新读取书库（修改书目后无需重启服务），
+    重建匹配索引并清空匹配记忆化缓存
+    """
+    try:
+        catalog_version = reload_catalog()
+        logger.info(f"书库已重新加载，版本号: {catalog_version}")
+        return jsonify({
+            "status": "success",
+            "catalog_version": catalog_version,
+            "match_cache": get_match_memo_stats()
+        })
+    except (SyntaxError, ValueError) as e:
+        # 书库源文件被改坏：保持当前书库不变
+        logger.error(f"重新加载书库失败: {str(e)}")
+        return jsonify({"status": "error", "error": f"重新加载书库失败: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"重新加载书库时发生错误: {str(e)}")
+        return jsonify({"status": "error", "error": str(e)}), 500
+
 @app.route('/api/interaction_events', methods=['POST'])
 def handle_interaction_events():
     """
     新的API端点：接收前端发送的交互事件数据
     支持Session ID和批量事件处理
+    批次幂等键取自请求体的 batch_id（或 Idempotency-Key 请求头），事件幂等键为各事件的 event_id：
+    重发的批次 / 事件直接确认，不会再次写入
     """
     try:
         data = request.json
         session_id = data.get('session_id', '')
         events = data.get('events', [])
+        batch_id = data.get('batch_id') or request.headers.get('Idempotency-Key')
         
         if not session_id:
             return jsonify({
@@ -509,27 +659,32 @@ def handle_interaction_events():
         # 导入统计管理器
         from interaction_stats_manager import stats_manager
         
-        # 处理每个事件
-        processed_events = []
-        for event in events:
-            try:
-                # 验证事件格式
-                if not isinstance(event, dict) or 'event_type' not in event:
-                    logger.warning(f"跳过无效事件: {event}")
-                    continue
-                
-                # 添加服务器接收时间戳
-                event['server_received_timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-                
-                # 保存事件到文件系统
-                saved_file = stats_manager.save_session_event(session_id, event)
-                if saved_file:
-                    processed_events.append(event['event_type'])
-                    logger.debug(f"事件已保存: {event['event_type']} -> {saved_file}")
-                
-            except Exception as e:
-                logger.error(f"处理单个事件时发生错误: {str(e)}, 事件: {event}")
-                continue
+        # 整批校验、打时间戳并一次写入（启用缓冲写入时仅入队，由后台线程写入文件系统）
+        save_result = stats_manager.save_session_events(
+            session_id,
+            events,
+            extra_fields={
+                'server_received_timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+            },
+            batch_id=str(batch_id) if batch_id else None,
+        )
+        if save_result['duplicate_batch']:
+            logger.info(f"重复的事件批次，直接确认: Session ID={session_id}, batch_id={batch_id}")
+            return jsonify({
+                "status": "success",
+                "session_id": session_id,
+                "duplicate_batch": True,
+                "events_received": len(events),
+                "events_processed": 0,
+                "message": "该批次已处理过，未重复写入"
+            })
+        if save_result['duplicates']:
+            logger.info(f"跳过 {len(save_result['duplicates'])} 个已写入的重复事件: Session ID={session_id}")
+        processed_events = save_result['accepted_event_types']
+        for rejected in save_result['rejected']:
+            logger.warning(f"跳过无效事件: 下标={rejected['index']}, 原因={rejected['reason']}")
+        if save_result['file_path']:
+            logger.debug(f"{len(processed_events)}个事件已提交 -> {save_result['file_path']}")
         
         # 返回处理结果
         response = {
@@ -538,6 +693,9 @@ def handle_interaction_events():
             "events_received": len(events),
             "events_processed": len(processed_events),
             "processed_event_types": processed_events,
+            "rejected_events": save_result['rejected'],
+            "duplicate_batch": False,
+            "duplicate_events": save_result['duplicates'],
             "message": f"成功处理 {len(processed_events)}/{len(events)} 个事件"
         }
         
@@ -660,10 +818,44 @@ def list_sessions():
 def get_session_detail(session_id):
     """
     API端点：获取特定Session的详细信息
+
+    可选分页参数（通过偏移索引直接定位，不解析整个会话文件）：
+    - start + count: 读取第 start 行起的 count 条事件
+    - tail: 读取最后 tail 条事件
+    不带分页参数时返回完整的Session摘要
     """
     try:
         # 导入统计管理器
-        from interaction_stats_manager import stats_manager
+        from interaction_stats_manager import stats_manager, SESSION_PAGE_MAX_COUNT
+        
+        start = request.args.get('start', type=int)
+        count = request.args.get('count', type=int)
+        tail = request.args.get('tail', type=int)
+        if start is not None or count is not None or tail is not None:
+            total_events = stats_manager.count_session_events(session_id)
+            if total_events == 0:
+                return jsonify({
+                    "status": "error",
+                    "error": f"Session {session_id} 不存在"
+                }), 404
+            
+            if tail is not None:
+                count = min(max(tail, 0), SESSION_PAGE_MAX_COUNT)
+                start = max(total_events - count, 0)
+            else:
+                start = max(start or 0, 0)
+                count = min(max(count if count is not None else 50, 0), SESSION_PAGE_MAX_COUNT)
+            events = stats_manager.read_session_events(session_id, start, count)
+            
+            return jsonify({
+                "status": "success",
+                "session_id": session_id,
+                "total_events": total_events,
+                "start": start,
+                "count": len(events),
+                "has_more": start + count < total_events,
+                "events": events
+            })
         
         session_summary = stats_manager.get_session_summary(session_id)
         
@@ -682,6 +874,189 @@ def get_session_detail(session_id):
         logger.error(f"获取Session详情时发生错误: {str(e)}")
         return jsonify({"status": "error", "error": str(e)}), 500
 
+def _client_accepts_gzip() -> bool:
+    """客户端声明支持 gzip 且未通过 ?gzip=0 关闭压缩"""
+    if request.args.get('gzip', '1').lower() in ('0', 'false', 'no'):
+        return False
+    return 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+
+def _gzip_stream(chunks):
+    """将字节块流逐块进行 gzip 压缩（流式，不缓存完整内容）"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def _ndjson_response(chunks, filename: str) -> Response:
+    """构造 NDJSON 流式响应（生成器逐块输出，可选 gzip）"""
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if _client_accepts_gzip():
+        chunks = _gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    return Response(chunks, mimetype='application/x-ndjson', headers=headers)
+
+@app.route('/api/sessions/<session_id>/events.ndjson', methods=['GET'])
+def export_session_events_ndjson(session_id):
+    """
+    API端点：以 NDJSON 流式导出特定Session的原始事件
+    直接按块读取磁盘上的JSONL，内存占用与事件数量无关
+
+    可选参数：
+    - since: ISO 日期/时间，只导出保存时间不早于该时间的记录
+    - gzip=0: 即使客户端支持也不压缩
+    - reasons=ref: 检索日志中的推荐理由保留为哈希引用（可通过 /api/reason_blobs/<hash> 获取）
+    """
+    try:
+        from interaction_stats_manager import stats_manager
+        
+        try:
+            since = stats_manager.parse_since(request.args.get('since'))
+        except ValueError:
+            return jsonify({"status": "error", "error": "since 参数格式无效，应为ISO日期或时间"}), 400
+        
+        if not stats_manager.count_session_events(session_id):
+            return jsonify({
+                "status": "error",
+                "error": f"Session {session_id} 不存在"
+            }), 404
+        
+        chunks = stats_manager.iter_session_ndjson(
+            session_id, since=since, resolve_reasons=request.args.get('reasons') != 'ref'
+        )
+        return _ndjson_response(chunks, f"{session_id.replace(' ', '_')}.ndjson")
+        
+    except Exception as e:
+        logger.error(f"导出Session事件时发生错误: {str(e)}")
+        return jsonify({"status": "error", "error": str(e)}), 500
+
+@app.route('/api/export.ndjson', methods=['GET'])
+def export_all_sessions_ndjson():
+    """
+    API端点：以 NDJSON 流式导出所有Session的原始记录（每行带 session_id）
+
+    可选参数：
+    - since: ISO 日期/时间，只导出保存时间不早于该时间的记录
+    - gzip=0: 即使客户端支持也不压缩
+    - reasons=ref: 检索日志中的推荐理由保留为哈希引用（可通过 /api/reason_blobs/<hash> 获取）
+    """
+    try:
+        from interaction_stats_manager import stats_manager
+        
+        try:
+            since = stats_manager.parse_since(request.args.get('since'))
+        except ValueError:
+            return jsonify({"status": "error", "error": "since 参数格式无效，应为ISO日期或时间"}), 400
+        
+        chunks = stats_manager.iter_export_ndjson(
+            since=since, resolve_reasons=request.args.get('reasons') != 'ref'
+        )
+        return _ndjson_response(chunks, "interaction_export.ndjson")
+        
+    except Exception as e:
+        logger.error(f"导出交互记录时发生错误: {str(e)}")
+        return jsonify({"status": "error", "error": str(e)}), 500
+
+@app.route('/api/reason_blobs/<blob_hash>', methods=['GET'])
+def get_reason_blob(blob_hash):
+    """API端点：按哈希获取检索日志中以内容寻址方式存储的推荐理由"""
+    try:
+        from interaction_stats_manager import stats_manager
+        
+        blob = stats_manager.reason_store.get(blob_hash)
+        if blob is None:
+            return jsonify({"status": "error", "error": f"理由 {blob_hash} 不存在"}), 404
+        return jsonify({"status": "success", "hash": blob_hash, "blob": blob})
+        
+    except Exception as e:
+        logger.error(f"读取推荐理由时发生错误: {str(e)}")
+        return jsonify({"status": "error", "error": str(e)}), 500
+
+@app.route('/api/book_stats', methods=['GET'])
+def get_book_stats():
+    """
+    API端点：图书交互聚合（曝光、悬停次数、悬停总时长、点击、评分分布）
+    聚合在写入时增量维护，这里只做字典查找
+
+    可选参数：
+    - isbn: 只返回这些图书（可重复）
+    - task: 只返回该任务下的图书，并附带任务整体的合并聚合
+    - group_by: task / role_type / fault_type，按书库分组返回合并聚合（用于比较不同类型的图书）
+    - refresh=1: 先补齐尚未累加的记录（如其他进程写入的）
+
+    books 中的 impressions / hovers / hover_ms / clicks / ratings 来自聚合检索日志，
+    events 来自会话事件，两者可能记录的是同一次交互，不应相加
+    """
+    try:
+        from interaction_stats_manager import stats_manager
+        
+        group_by = request.args.get('group_by')
+        if group_by is not None and group_by not in BOOK_GROUP_FIELDS:
+            return jsonify({
+                "status": "error",
+                "error": f"group_by 参数无效，应为 {' / '.join(BOOK_GROUP_FIELDS)}"
+            }), 400
+        
+        isbns = request.args.getlist('isbn') or None
+        groups = get_book_groups(group_by) if group_by else None
+        task = request.args.get('task')
+        if task is not None:
+            task_isbns = get_book_groups('task').get(task)
+            if task_isbns is None:
+                return jsonify({"status": "error", "error": f"任务 {task} 不存在"}), 404
+            isbns = (isbns or []) + task_isbns
+            groups = {**(groups or {}), task: task_isbns}
+        
+        stats = stats_manager.get_book_stats(
+            isbns=isbns, groups=groups,
+            refresh=request.args.get('refresh', '0').lower() in ('1', 'true', 'yes')
+        )
+        return jsonify({"status": "success", "group_by": group_by, "task": task, **stats})
+        
+    except Exception as e:
+        logger.error(f"读取图书交互聚合时发生错误: {str(e)}")
+        return jsonify({"status": "error", "error": str(e)}), 500
+
+@app.route('/api/search_logs', methods=['GET'])
+def search_logs():
+    """
+    API端点：通过倒排索引查找会话记录（各条件同时满足）
+
+    参数（至少一个条件）：
+    - q: 检索词，按索引词表切分后每个词都要出现在 query_text / query 中
+    - isbn: 展示过 / 涉及该图书（可重复）
+    - clicked: 点击过该图书（可重复）
+    - event_type: 事件类型，聚合检索日志为 query_log（可重复）
+    - scope: record（默认，同一条记录满足全部条件）/ session（同一会话中出现过各个条件即可）
+    - limit: 最多返回的记录数 / 会话数（默认100）
+    - records=0: 只返回 (session_id, offset)，不读取记录内容
+    - refresh=1: 先补齐尚未索引的记录（如其他进程写入的）
+    """
+    try:
+        from interaction_stats_manager import stats_manager
+        
+        limit = min(max(request.args.get('limit', 100, type=int), 0), 1000)
+        try:
+            result = stats_manager.search_session_logs(
+                query_text=request.args.get('q'),
+                isbns=request.args.getlist('isbn'),
+                clicked_isbns=request.args.getlist('clicked'),
+                event_types=request.args.getlist('event_type'),
+                scope=request.args.get('scope', 'record'),
+                limit=limit,
+                include_records=request.args.get('records', '1').lower() not in ('0', 'false', 'no'),
+                refresh=request.args.get('refresh', '0').lower() in ('1', 'true', 'yes'),
+            )
+        except ValueError as e:
+            return jsonify({"status": "error", "error": str(e)}), 400
+        return jsonify({"status": "success", **result})
+        
+    except Exception as e:
+        logger.error(f"检索会话记录时发生错误: {str(e)}")
+        return jsonify({"status": "error", "error": str(e)}), 500
+
 # ===========================================
 # 原有的 /input 端点保持不变
 # ===========================================
@@ -820,6 +1195,16 @@ if __name__ == "__main__":
     start_cleanup_timer()
     logger.info("任务清理定时器已启动")
     
+    # 启动会话日志维护定时器
+    if SESSION_LOG_ROTATION_ENABLED:
+        start_log_maintenance_timer()
+        logger.info("会话日志维护定时器已启动")
+    else:
+        logger.info("会话日志自动轮转未开启，可通过 view_stats.py rotate 手动轮转")
+    
+    # 在后台补齐检索倒排索引
+    start_search_index_sync()
+    
     # 启动Flask服务
     flask_thread = threading.Thread(target=lambda: app.run(host='0.0.0.0', port=5001, debug=False))
     flask_thread.daemon = True